@@ -4,31 +4,13 @@ cd $(dirname $0)
 
 . deleteENV/bin/activate
 
-# generate lists
-./phase0_generateuserlist_alt.py
-
-# notify users next to expire
-./phase0b_notify_users.py
-
-# change type of expired users
-./phase0c_change_category.py
-
-# stop servers of expired users
-if [ -f users_to_delete.txt ] ; then
-./phase1_generate_trust_ids.py
-./phase2_stopvms.py
-rm users_trusted_ids.txt
-
-fi
-
-# delete resources of users who expired days ago (i.e. accounts that were
-# processed by the phase2_stopvms some days ago)
-if [ -f users_to_delete_phase3.txt ] ; then
-./phase1_generate_trust_ids.py users_to_delete_phase3.txt
-# remove special ports
-mv users_to_delete_phase3.txt users_to_delete.txt
-./phase2c_deletespecialports.py
-rm users_to_delete.txt
-./phase3_delete.py
-rm users_trusted_ids.txt
-fi
+cd fiwareskuld/phase
+
+# Run all the phases: generate lists, notify users next to expire, change the
+# type of the expired users, stop their servers (if STOP_BEFORE_DELETE is not
+# 0) and delete the resources of the users who expired days ago.
+#
+# The progress is saved in pipeline_checkpoint.jsonl; if the process is
+# interrupted, the next invocation resumes it skipping the users already
+# processed.
+./phase_pipeline.py
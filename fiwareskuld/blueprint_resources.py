@@ -22,7 +22,6 @@
 # For those usages not covered by the Apache version 2.0 License please
 # contact with opensource@tid.es
 #
-import requests
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 from requests.packages.urllib3.exceptions import InsecurePlatformWarning
 from urllib import quote
@@ -31,6 +30,8 @@ import xml.etree.ElementTree as et
 import logging
 import warnings
 
+from fiwareskuld.utils.httpsession import get_http_session
+
 __author__ = 'chema'
 
 
@@ -75,8 +76,8 @@ class BluePrintResources(object):
         err_msg = 'Obtaining blueprint instances from tenant {0} failed. '\
                   'Reason: {1}'
         try:
-            response = requests.get(self.url_blue, headers=self.headers,
-                                    verify=False)
+            response = get_http_session().get(
+                self.url_blue, headers=self.headers, verify=False)
         except Exception, e:
             self.logger.error(err_msg.format(self.tenant_id, str(e)))
             return None
@@ -95,9 +96,9 @@ class BluePrintResources(object):
         err_msg = 'Deleting blueprint instance {1} from tenant {0} failed. '\
                   'Reason: {2}'
         try:
-            response = requests.delete(self.url_blue + '/' +
-                                       quote(blueinstance_id),
-                                       headers=self.headers, verify=False)
+            response = get_http_session().delete(
+                self.url_blue + '/' + quote(blueinstance_id),
+                headers=self.headers, verify=False)
         except Exception, e:
             msg = err_msg.format(self.tenant_id, blueinstance_id, str(e))
             self.logger.error(msg)
@@ -112,12 +113,15 @@ class BluePrintResources(object):
         else:
             return True
 
-    def delete_tenant_blueprints(self):
+    def delete_tenant_blueprints(self, blueprints=None):
         """Delete all the blueprint instances of the tenant
+        :param blueprints: the names of the blueprint instances, already
+          obtained with get_tenant_blueprints. If None, they are obtained.
         :return: True if success
         """
         err_msg = 'Deleting blueprint instances from tenant {0} failed.'
-        blueprints = self.get_tenant_blueprints()
+        if blueprints is None:
+            blueprints = self.get_tenant_blueprints()
         if blueprints is None:
             self.logger.error(err_msg.format(self.tenant_id))
             return False
@@ -135,8 +139,8 @@ class BluePrintResources(object):
         err_msg = 'Obtaining blueprint templates from tenant {0} failed. '\
                   'Reason: {1}'
         try:
-            response = requests.get(self.url_temp, headers=self.headers,
-                                    verify=False)
+            response = get_http_session().get(
+                self.url_temp, headers=self.headers, verify=False)
         except Exception, e:
             self.logger.error(err_msg.format(self.tenant_id, str(e)))
             return None
@@ -154,9 +158,9 @@ class BluePrintResources(object):
         err_msg = 'Deleting blueprint template {1} from tenant {0} failed. '\
                   'Reason: {2}'
         try:
-            response = requests.delete(self.url_temp + '/' +
-                                       quote(environment_id),
-                                       headers=self.headers, verify=False)
+            response = get_http_session().delete(
+                self.url_temp + '/' + quote(environment_id),
+                headers=self.headers, verify=False)
         except Exception, e:
             msg = err_msg.format(self.tenant_id, environment_id, str(e))
             self.logger.error(msg)
@@ -171,12 +175,15 @@ class BluePrintResources(object):
         else:
             return True
 
-    def delete_tenant_templates(self):
+    def delete_tenant_templates(self, templates=None):
         """Delete all the templates from the tenant.
+        :param templates: the names of the templates, already obtained with
+          get_tenant_templates. If None, they are obtained.
         :return: True if success
         """
         err_msg = 'Deleting blueprint templates from tenant {0} failed.'
-        templates = self.get_tenant_templates()
+        if templates is None:
+            templates = self.get_tenant_templates()
         if templates is None:
             self.logger.error(err_msg.format(self.tenant_id))
             return False
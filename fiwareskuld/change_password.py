@@ -28,6 +28,7 @@ import argparse
 import base64
 
 from utils import osclients
+from utils.pagination import iterate_users
 import os
 
 
@@ -47,7 +48,7 @@ class PasswordChanger(object):
 
         self.keystone = osclients_o.get_keystoneclient()
         self.users_by_id = dict()
-        for user in self.keystone.users.list():
+        for user in iterate_users(self.keystone):
             self.users_by_id[user.id] = user
 
     def change_password(self, userobj, newpassword):
@@ -42,44 +42,62 @@ class CinderResources(object):
         """Method invoked when the region is changed"""
         self.cinder = self.osclients.get_cinderclient()
 
-    def get_tenant_volumes(self):
+    def get_tenant_volumes(self, volumes=None):
         """Return a list with all the volumes of the tenant
+        :param volumes: the volumes already listed. If None, they are obtained
+          from cinder.
         :return: a list of volume_id
         """
-        volumes = list()
-        for volume in self.cinder.volumes.list():
-            volumes.append(volume.id)
-        return volumes
+        if volumes is None:
+            volumes = self.cinder.volumes.list()
+        return list(volume.id for volume in volumes)
 
-    def delete_tenant_volumes(self):
-        """Delete all the tenant's volumes"""
-        for volume in self.cinder.volumes.list():
+    def delete_tenant_volumes(self, volumes=None):
+        """Delete all the tenant's volumes
+        :param volumes: the volumes already listed. If None, they are obtained
+          from cinder.
+        """
+        if volumes is None:
+            volumes = self.cinder.volumes.list()
+        for volume in volumes:
             volume.delete()
 
-    def get_tenant_backup_volumes(self):
+    def get_tenant_backup_volumes(self, backups=None):
         """Return a list with all the volume backups of the tenant
+        :param backups: the backups already listed. If None, they are obtained
+          from cinder.
         :return: a list of volume_id
         """
-        volumes = list()
-        for volume in self.cinder.backups.list():
-            volumes.append(volume.id)
-        return volumes
+        if backups is None:
+            backups = self.cinder.backups.list()
+        return list(volume.id for volume in backups)
 
-    def delete_tenant_backup_volumes(self):
-        """Delete all the volume backups of the tenant"""
-        for volume in self.cinder.backups.list():
+    def delete_tenant_backup_volumes(self, backups=None):
+        """Delete all the volume backups of the tenant
+        :param backups: the backups already listed. If None, they are obtained
+          from cinder.
+        """
+        if backups is None:
+            backups = self.cinder.backups.list()
+        for volume in backups:
             volume.delete()
 
-    def get_tenant_volume_snapshots(self):
+    def get_tenant_volume_snapshots(self, snapshots=None):
         """Return a list with all the volume backups of the tenant
+        :param snapshots: the snapshots already listed. If None, they are
+          obtained from cinder.
         :return: a list of snaphost ids.
         """
-        snapshots = list()
-        for snapshot in self.cinder.volume_snapshots.list():
-            snapshots.append(snapshot.id)
-        return snapshots
+        if snapshots is None:
+            snapshots = self.cinder.volume_snapshots.list()
+        return list(snapshot.id for snapshot in snapshots)
 
-    def delete_tenant_volume_snapshots(self):
-        """Delete all volume snapshot of the tenant"""
-        for snapshot in self.cinder.volume_snapshots.list():
+    def delete_tenant_volume_snapshots(self, snapshots=None):
+        """Delete all volume snapshot of the tenant
+        :param snapshots: the snapshots already listed. If None, they are
+          obtained from cinder.
+        """
+        if snapshots is None:
+            snapshots = self.cinder.volume_snapshots.list()
+        for snapshot in snapshots:
             snapshot.delete()
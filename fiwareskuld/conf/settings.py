@@ -36,6 +36,16 @@ NOTIFY_BEFORE_TRIAL_EXPIRED = 7  # days
 NOTIFY_BEFORE_COMMUNITY_EXPIRED = 30  # days
 STOP_BEFORE_DELETE = 0  # days
 TRUSTID_VALIDITY = 36000  # seconds
+TRUST_MAX_WORKERS = 8  # trust ids generated simultaneously
+PHASE3_MAX_WORKERS = 8  # users whose resources are freed simultaneously
+VM_DELETION_TIMEOUT = 600  # seconds
+DEPENDENCY_WAIT_TIMEOUT = 120  # seconds
+INVENTORY_MAX_WORKERS = 4  # collections listed simultaneously for a tenant
+REGION_MAX_WORKERS = 4  # regions of a user processed simultaneously
+KEYSTONE_PAGE_SIZE = 0  # users/projects per request; 0 is not paginated
+HTTP_POOL_SIZE = 16  # connections kept alive to each host
+HTTP_POOL_HOSTS = 32  # hosts (endpoints) whose connections are kept alive
+AUTH_CACHE_SIZE = 256  # credentials whose token and catalog are reused
 TRIAL_ROLE_ID = "trial_id"
 COMMUNITY_ROLE_ID = "community_id"
 BASIC_ROLE_ID = "basic_id"
@@ -29,6 +29,23 @@ from fiwareskuld.conf import settings
 from fiwareskuld.utils.log import logger
 from fiwareskuld.utils import osclients
 from fiwareskuld.utils import rotated_files
+from fiwareskuld.utils.pagination import iterate_users, \
+    iterate_role_assignments
+
+# The dates already parsed by parse_date. Many users share the same dates.
+_parsed_dates = dict()
+
+
+def parse_date(date_string):
+    """Parse a date with the format of trial_started_at and
+    community_started_at (e.g. 2016-02-25). The result is cached.
+    :param date_string: the date
+    :return: a date object
+    """
+    if date_string not in _parsed_dates:
+        _parsed_dates[date_string] = datetime.datetime.strptime(
+            date_string, "%Y-%m-%d").date()
+    return _parsed_dates[date_string]
 
 
 class ExpiredUsers:
@@ -44,6 +61,9 @@ class ExpiredUsers:
         self.COMMUNITY_MAX_NUMBER_OF_DAYS = settings.COMMUNITY_MAX_NUMBER_OF_DAYS
         self.keystoneclient = clients.get_keystoneclientv3()
         self.protected = set()
+        # caches of get_role_names and get_roles_by_user
+        self.__role_names = None
+        self.__roles_by_user = None
 
     def get_trial_user_ids(self):
         """Get a set of trial users; only the ids
@@ -51,8 +71,8 @@ class ExpiredUsers:
         """
         k = self.keystoneclient
         role = k.roles.find(name="trial")
-        return set(e.user['id'] for e in k.role_assignments.list(
-            role=role.id))
+        return set(e.user['id'] for e in iterate_role_assignments(
+            k, role=role.id))
 
     def get_roles_user(self, user):
         return self.get_roles_user_id(user.id)
@@ -65,11 +85,40 @@ class ExpiredUsers:
             roles.append(self.get_role_name_by_id(us.role["id"]))
         return roles
 
+    def get_role_names(self):
+        """Get a dictionary with the name of each role, by id. The roles are
+        requested only the first time.
+        :return: a dictionary role id -> role name
+        """
+        if self.__role_names is None:
+            self.__role_names = dict(
+                (role.id, role.name) for role in self.keystoneclient.roles.list())
+        return self.__role_names
+
     def get_role_name_by_id(self, role_id):
-        roles = self.keystoneclient.roles.list()
-        for role in roles:
-            if role_id == role.id:
-                return role.name
+        return self.get_role_names().get(role_id)
+
+    def get_roles_by_user(self, refresh=False):
+        """Get the names of the roles of all the users, obtained with a single
+        pass over the role assignments. The index is built only the first
+        time, unless refresh is True.
+        :param refresh: if True, the role assignments are requested again.
+        :return: a dictionary user id -> list of role names
+        """
+        if self.__roles_by_user is None or refresh:
+            role_names = self.get_role_names()
+            roles_by_user = dict()
+            for assignment in iterate_role_assignments(self.keystoneclient):
+                user = getattr(assignment, 'user', None)
+                if not user:
+                    # roles assigned to groups
+                    continue
+                if user['id'] not in roles_by_user:
+                    roles_by_user[user['id']] = list()
+                roles_by_user[user['id']].append(
+                    role_names.get(assignment.role['id']))
+            self.__roles_by_user = roles_by_user
+        return self.__roles_by_user
 
     def get_community_user_ids(self):
         """Get a set of community users; only the ids
@@ -77,8 +126,8 @@ class ExpiredUsers:
         """
         k = self.keystoneclient
         role = k.roles.find(name="community")
-        return set(e.user['id'] for e in k.role_assignments.list(
-            role=role.id))
+        return set(e.user['id'] for e in iterate_role_assignments(
+            k, role=role.id))
 
     def get_basic_users_ids(self):
         """Get a set of basic users; only the ids
@@ -86,22 +135,22 @@ class ExpiredUsers:
         """
         k = self.keystoneclient
         role = k.roles.find(name="basic")
-        return set(e.user['id'] for e in k.role_assignments.list(
-            role=role.id))
+        return set(e.user['id'] for e in iterate_role_assignments(
+            k, role=role.id))
 
     def get_basic_users(self):
         """Get the list of basic users; the full objects are included.
         :return: a list of basic users
         """
         user_ids = self.get_basic_users_ids()
-        return list(user for user in self.keystoneclient.users.list() if user.id in user_ids)
+        return list(user for user in iterate_users(self.keystoneclient) if user.id in user_ids)
 
     def get_trial_users(self):
         """Get the list of trial users; the full objects are included.
         :return: a list of trial users
         """
         user_ids = self.get_trial_user_ids()
-        return list(user for user in self.keystoneclient.users.list() if user.id in user_ids)
+        return list(user for user in iterate_users(self.keystoneclient) if user.id in user_ids)
 
     def get_community_users(self):
         """Get the list of community users; the full objects are included.
@@ -109,14 +158,14 @@ class ExpiredUsers:
         """
         user_ids = self.get_community_user_ids()
 
-        d = list(user for user in self.keystoneclient.users.list() if user.id in user_ids)
+        d = list(user for user in iterate_users(self.keystoneclient) if user.id in user_ids)
         return d
 
     def get_users(self):
         """Get the list of users; the full objects are included.
         :return: a list of users
         """
-        return self.keystoneclient.users.list()
+        return list(iterate_users(self.keystoneclient))
 
     def get_yellow_red_trial_users(self):
 
@@ -127,34 +176,77 @@ class ExpiredUsers:
         return self._get_red_yellow(users)
 
     def _get_red_yellow(self, users):
-        finalList = []
-        yellowList = []
-        # Extract the list of user_ids
-        for user in users:
+        (finalList, yellowList, green, remaining) = self.classify_users(users)
 
-            notify = 0
-            role = self.get_role_trial_or_community(user)
+        logger.info("Number of expired Users found: {0}".format(len(finalList)))
+        logger.info("Number of users to expire in the following days: {0}".format(len(yellowList)))
+
+        return yellowList, finalList
+
+    def classify_users(self, users, today=None):
+        """
+        Classify the trial and community users by their remaining time, in a
+        single pass: the roles of all the users are obtained at once (see
+        get_roles_by_user), the dates are parsed only once (see parse_date)
+        and the same date is used as today for all the users.
+
+        The users without the trial or community role are ignored, and also
+        (with a warning) the users without the date of the start of the role.
+        :param users: the users to classify
+        :param today: the current date; by default, today.
+        :return: a tuple with three lists of users: red (expired), yellow
+          (to expire before the notification period ends) and green (the
+          others); and a dictionary with the remaining days of each user.
+        """
+        if today is None:
+            today = datetime.date.today()
+        roles_by_user = self.get_roles_by_user()
+        red = []
+        yellow = []
+        green = []
+        remaining_by_user = dict()
+        for user in users:
+            role = self.get_role_trial_or_community(
+                user, roles_by_user.get(user.id, []))
             if not role:
                 continue
             if role == "trial":
                 notify = settings.NOTIFY_BEFORE_TRIAL_EXPIRED
-            elif role == "community":
+            else:
                 notify = settings.NOTIFY_BEFORE_COMMUNITY_EXPIRED
 
-            remaining = self.get_remaining_time(user)
+            (started_at, duration) = self._get_start_and_duration(user, role)
+            if not started_at:
+                logger.warning("User {0} has the role {1} but not its start date".format(user.id, role))
+                continue
 
+            remaining = duration - (today - parse_date(started_at)).days
+            remaining_by_user[user.id] = remaining
             if remaining < 0:
                 # It means that the user trial period has expired
-                finalList.append(user)
+                red.append(user)
             elif remaining <= notify:
                 # It means that the user trial period is going to expire in
                 # a week or less.
-                yellowList.append(user)
+                yellow.append(user)
+            else:
+                green.append(user)
 
-        logger.info("Number of {0} expired Users found: {0}".format(role, len(finalList)))
-        logger.info("Number of {0} users to expire in the following days: {0}".format(role, len(yellowList)))
+        return red, yellow, green, remaining_by_user
 
-        return yellowList, finalList
+    def _get_start_and_duration(self, user, role):
+        """
+        Return the start date and the duration of the role of a user
+        :param user: the user
+        :param role: trial or community
+        :return: a tuple with the date (a string) and the days
+        """
+        if role == "trial":
+            return (getattr(user, 'trial_started_at', None),
+                    getattr(user, 'trial_duration', self.TRIAL_MAX_NUMBER_OF_DAYS))
+        else:
+            return (getattr(user, 'community_started_at', None),
+                    getattr(user, 'community_duration', self.COMMUNITY_MAX_NUMBER_OF_DAYS))
 
     def get_yellow_red_community_users(self):
 
@@ -164,6 +256,31 @@ class ExpiredUsers:
         users = self.get_community_users()
         return self._get_red_yellow(users)
 
+    def get_yellow_red_users_by_role(self):
+        """
+        Get the users to notify and the expired users of both the trial and
+        the community roles, with a single request of the users and a single
+        pass over the role assignments (instead of one of each per role).
+
+        A user with both roles is considered only as a trial user, as in
+        get_role_trial_or_community.
+        :return: a dictionary role -> (yellow list, red list), with the roles
+          trial and community.
+        """
+        roles_by_user = self.get_roles_by_user()
+        users_by_role = {'trial': [], 'community': []}
+        for user in iterate_users(self.keystoneclient):
+            role = self.get_role_trial_or_community(
+                user, roles_by_user.get(user.id, []))
+            if role:
+                users_by_role[role].append(user)
+
+        result = dict()
+        for role in users_by_role:
+            logger.info("Classifying {0} users".format(role))
+            result[role] = self._get_red_yellow(users_by_role[role])
+        return result
+
     def get_list_expired_trial_users(self):
         """
         For each users id that have the Trial role, we need to check
@@ -228,12 +345,8 @@ class ExpiredUsers:
                  False anyway
         """
 
-        formatter_string = "%Y-%m-%d"
-        datetime_object = datetime.datetime.strptime(started_at, formatter_string)
-        date_object_old = datetime_object.date()
-
-        datetime_object = datetime.datetime.today()
-        date_object_new = datetime_object.date()
+        date_object_old = parse_date(started_at)
+        date_object_new = datetime.date.today()
 
         difference = date_object_new - date_object_old
 
@@ -244,55 +357,45 @@ class ExpiredUsers:
 
         return result
 
-    def get_role_trial_or_community(self, user):
+    def get_role_trial_or_community(self, user, roles=None):
         """
         It checks if the user has a role trial or
         community and in this case, it returns it.
         :param user: the user to check it
+        :param roles: the role names of the user, if already known (see
+          get_roles_by_user). By default, they are requested.
         :return: the role name
         """
         role = None
-        roles = self.get_roles_user(user)
+        if roles is None:
+            roles = self.get_roles_user(user)
         if "trial" in roles:
             role = "trial"
         elif "community" in roles:
             role = "community"
         return role
 
-    def get_remaining_time(self, user):
+    def get_remaining_time(self, user, role=None):
         """
         Check the time of the trial user; return the remaining days.
         The number will be negative when the account is expired.
         :param user: the trial user data obtained from keystone API server
+        :param role: the role of the user (trial or community), if already
+          known. By default, it is obtained with get_role_trial_or_community.
         :return: remaining days (may be negative)
         """
 
         started_at = 0
         duration = 180
-        role = self.get_role_trial_or_community(user)
+        if role is None:
+            role = self.get_role_trial_or_community(user)
         if not role:
             return duration
 
-        if role == "trial":
-            started_at = user.trial_started_at
-            if hasattr(user, 'trial_duration'):
-                duration = user.trial_duration
-            else:
-                duration = self.TRIAL_MAX_NUMBER_OF_DAYS
-        elif role == "community":
-            started_at = user.community_started_at
-            if hasattr(user, 'community_duration'):
-                duration = user.community_duration
-            else:
-                duration = self.COMMUNITY_MAX_NUMBER_OF_DAYS
-
-        formatter_string = "%Y-%m-%d"
-
-        datetime_object = datetime.datetime.strptime(started_at, formatter_string)
-        date_object_old = datetime_object.date()
+        (started_at, duration) = self._get_start_and_duration(user, role)
 
-        datetime_object = datetime.datetime.today()
-        date_object_new = datetime_object.date()
+        date_object_old = parse_date(started_at)
+        date_object_new = datetime.date.today()
 
         difference = date_object_new - date_object_old
 
@@ -46,17 +46,21 @@ class GlanceResources(object):
         """Method invoked when the region is changed"""
         self.glance = self.osclients.get_glanceclient()
 
-    def get_tenant_images(self):
+    def get_tenant_images(self, images=None):
         """ return a list of images ids
 
+        :param images: the images of the tenant already listed. If None, they
+          are obtained from glance.
         :return: a list of image ids
         """
-        images = list()
-        for image in self.glance.images.findall(owner=self.tenant_id):
+        tenant_images = list()
+        if images is None:
+            images = self.glance.images.findall(owner=self.tenant_id)
+        for image in images:
             if image.owner != self.tenant_id:
                 continue
-            images.append(image.id)
-        return images
+            tenant_images.append(image.id)
+        return tenant_images
 
     def get_images(self):
         """ return a list of images ids
@@ -103,14 +107,18 @@ class GlanceResources(object):
             else:
                 self.glance.images.delete(image.id)
 
-    def delete_tenant_images_notinuse(self, images_in_use):
+    def delete_tenant_images_notinuse(self, images_in_use, images=None):
         """delete all the tenant images, but check that they are not in the
         set 'images_in_use'. If the image is in the set, activate flag
         'orphan_image'.
         :param images_in_use: a set of images ids that should not be deleted
                               because other tenants are using them.
+        :param images: the images of the tenant already listed. If None, they
+                       are obtained from glance.
         :return: nothing"""
-        for image in self.glance.images.findall(owner=self.tenant_id):
+        if images is None:
+            images = self.glance.images.findall(owner=self.tenant_id)
+        for image in images:
             if image.owner != self.tenant_id:
                 continue
 
@@ -27,6 +27,8 @@ import time
 import os
 from oslo_utils import timeutils
 from fiwareskuld.utils import osclients
+from fiwareskuld.utils.pagination import iterate_users
+from fiwareskuld.utils.workers import run_concurrently
 from fiwareskuld.conf import settings
 
 
@@ -64,8 +66,19 @@ class TrustFactory:
 
         self.keystone = osclients_o.get_keystoneclientv3()
         self.trustid_validity = trustid_validity
+        self._trustees = dict()
 
-    def create_trust_admin(self, trustor_id, trustee_name):
+    def get_trustee(self, trustee_name):
+        """Get the trustee user. It is requested only the first time.
+        :param trustee_name: the user name of the trustee
+        :return: the trustee user
+        """
+        if trustee_name not in self._trustees:
+            self._trustees[trustee_name] = self.keystone.users.find(
+                name=trustee_name)
+        return self._trustees[trustee_name]
+
+    def create_trust_admin(self, trustor_id, trustee_name, trustor=None):
         """
         Create a TRUST_ID. This method must be invoked by the administrator and
         only works if the keystone server has been adapted to allow the
@@ -75,11 +88,14 @@ class TrustFactory:
                            impersonated by the trustee)
         :param trustee_name: the user name of the trustee user (who
                              impersonates the trustor)
+        :param trustor: the trustor user, if already obtained. By default it
+                        is requested.
         :return: the tuple (trustor_username, trust_id, trustor_id), None if
                  error
         """
-        trustor = self.keystone.users.get(trustor_id)
-        trustee = self.keystone.users.find(name=trustee_name)
+        if trustor is None:
+            trustor = self.keystone.users.get(trustor_id)
+        trustee = self.get_trustee(trustee_name)
         data = dict()
         data['impersonation'] = True
         data['allow_redelegation'] = True
@@ -99,6 +115,52 @@ class TrustFactory:
         else:
             return None
 
+    def create_trusts_admin(self, trustor_ids, trustee_name, max_workers=None,
+                            prefetch=True, callback=None):
+        """
+        Create a TRUST_ID for each trustor (see create_trust_admin). The
+        trustee is requested only once, the trustors are obtained with a
+        single listing of the users and the trusts are created concurrently.
+
+        :param trustor_ids: the user ids of the trustors
+        :param trustee_name: the user name of the trustee user
+        :param max_workers: the trusts created simultaneously. By default,
+                            settings.TRUST_MAX_WORKERS
+        :param prefetch: if False, each trustor is requested individually
+                         instead of listing all the users (better when there
+                         are only a few trustors).
+        :param callback: if provided, it is invoked with the trustor id and
+                         the result as soon as each trust is created (the
+                         result is None if error). It is called from the
+                         worker threads.
+        :return: a list with the result of create_trust_admin for each
+                 trustor (None if error), in the same order than trustor_ids
+        """
+        if max_workers is None:
+            max_workers = settings.TRUST_MAX_WORKERS
+        trustor_ids = list(trustor_ids)
+        self.get_trustee(trustee_name)
+
+        trustors = dict()
+        if prefetch:
+            pending = set(trustor_ids)
+            for user in iterate_users(self.keystone):
+                if user.id in pending:
+                    trustors[user.id] = user
+
+        def create(trustor_id):
+            result = None
+            try:
+                # a trustor not found in the listing is requested again
+                result = self.create_trust_admin(
+                    trustor_id, trustee_name, trustors.get(trustor_id))
+            finally:
+                if callback:
+                    callback(trustor_id, result)
+            return result
+
+        return run_concurrently(create, trustor_ids, max_workers)
+
     def create_trust(self, trustor_id, trustee_id):
         """
         Create a TRUST_ID. This method must be invoked by trustor, that is, the
@@ -47,95 +47,136 @@ class NeutronResources(object):
         """Method invoked when the region is changed"""
         self.neutron = self.osclients.get_neutronclient()
 
-    def get_tenant_floatingips(self):
+    def get_tenant_floatingips(self, floatingips=None):
         """Return a list with the ids of all the tenant's floating ips
+        :param floatingips: the floating ips already listed (the whole list
+          returned by neutron). If None, they are obtained from neutron.
         :return: a list of floatingips ids
         """
-        floatingips = list()
-        for floatingip in self.neutron.list_floatingips()['floatingips']:
+        tenant_floatingips = list()
+        if floatingips is None:
+            floatingips = self.neutron.list_floatingips()['floatingips']
+        for floatingip in floatingips:
             if floatingip['tenant_id'] != self.tenant_id:
                 continue
 
-            floatingips.append(floatingip['id'])
-        return floatingips
+            tenant_floatingips.append(floatingip['id'])
+        return tenant_floatingips
 
-    def delete_tenant_floatingips(self):
-        """delete all the tenant's floating ips"""
-        for floatingip in self.neutron.list_floatingips()['floatingips']:
+    def delete_tenant_floatingips(self, floatingips=None):
+        """delete all the tenant's floating ips
+        :param floatingips: the floating ips already listed (the whole list
+          returned by neutron). If None, they are obtained from neutron.
+        """
+        if floatingips is None:
+            floatingips = self.neutron.list_floatingips()['floatingips']
+        for floatingip in floatingips:
             if floatingip['tenant_id'] != self.tenant_id:
                 continue
 
             self.neutron.delete_floatingip(floatingip['id'])
 
-    def get_tenant_networks(self):
+    def get_tenant_networks(self, networks=None):
         """Return a list with the ids of all the tenant's networks
+        :param networks: the networks already listed (the whole list returned
+          by neutron). If None, they are obtained from neutron.
         :return: a list of network ids
         """
-        networks = list()
-        for net in self.neutron.list_networks()['networks']:
+        tenant_networks = list()
+        if networks is None:
+            networks = self.neutron.list_networks()['networks']
+        for net in networks:
             if net['tenant_id'] != self.tenant_id:
                 continue
 
-            networks.append((net['id'], net['shared']))
-        return networks
+            tenant_networks.append((net['id'], net['shared']))
+        return tenant_networks
 
-    def delete_tenant_networks(self):
-        """delete all the tenant's networks"""
-        for net in self.neutron.list_networks()['networks']:
+    def delete_tenant_networks(self, networks=None):
+        """delete all the tenant's networks
+        :param networks: the networks already listed (the whole list returned
+          by neutron). If None, they are obtained from neutron.
+        """
+        if networks is None:
+            networks = self.neutron.list_networks()['networks']
+        for net in networks:
             if net['tenant_id'] != self.tenant_id:
                 continue
 
             self.neutron.delete_network(net['id'])
 
-    def get_tenant_subnets(self):
+    def get_tenant_subnets(self, subnets=None):
         """Return a list with the ids of all the tenant's subnets
+        :param subnets: the subnets already listed (the whole list returned
+          by neutron). If None, they are obtained from neutron.
         :return: a list of subnet ids
         """
-        subnets = list()
-        for subnet in self.neutron.list_subnets()['subnets']:
+        tenant_subnets = list()
+        if subnets is None:
+            subnets = self.neutron.list_subnets()['subnets']
+        for subnet in subnets:
             if subnet['tenant_id'] != self.tenant_id:
                 continue
 
-            subnets.append(subnet['id'])
-        return subnets
+            tenant_subnets.append(subnet['id'])
+        return tenant_subnets
 
-    def delete_tenant_subnets(self):
-        """delete all the tenant's subnets"""
-        for subnet in self.neutron.list_subnets()['subnets']:
+    def delete_tenant_subnets(self, subnets=None):
+        """delete all the tenant's subnets
+        :param subnets: the subnets already listed (the whole list returned
+          by neutron). If None, they are obtained from neutron.
+        """
+        if subnets is None:
+            subnets = self.neutron.list_subnets()['subnets']
+        for subnet in subnets:
             if subnet['tenant_id'] != self.tenant_id:
                 continue
 
             self.neutron.delete_subnet(subnet['id'])
 
-    def get_tenant_routers(self):
+    def get_tenant_routers(self, routers=None):
         """Return a list with the id of all the tenant's routers
+        :param routers: the routers already listed (the whole list returned
+          by neutron). If None, they are obtained from neutron.
         :return: a list of router ids
         """
-        routers = list()
-        for router in self.neutron.list_routers()['routers']:
+        tenant_routers = list()
+        if routers is None:
+            routers = self.neutron.list_routers()['routers']
+        for router in routers:
             if router['tenant_id'] != self.tenant_id:
                 continue
 
-            routers.append(router['id'])
-        return routers
+            tenant_routers.append(router['id'])
+        return tenant_routers
 
-    def delete_tenant_routers(self):
-        """delete all the tenant's rouers"""
-        for router in self.neutron.list_routers()['routers']:
+    def delete_tenant_routers(self, routers=None):
+        """delete all the tenant's rouers
+        :param routers: the routers already listed (the whole list returned
+          by neutron). If None, they are obtained from neutron.
+        """
+        if routers is None:
+            routers = self.neutron.list_routers()['routers']
+        for router in routers:
             if router['tenant_id'] != self.tenant_id:
                 continue
 
             self.neutron.remove_gateway_router(router['id'])
             self.neutron.delete_router(router['id'])
 
-    def get_tenant_securitygroups(self):
+    def get_tenant_securitygroups(self, security_groups=None):
         """Return a list with the id of all the tenant's security groups in
         neutron. Usually the security groups in nova has the same ids
-        ::return: a list of security group ids
+        :param security_groups: the security groups already listed (the
+          whole list returned by neutron). If None, they are obtained from
+          neutron.
+        :return: a list of security group ids
         """
         securitygroups = list()
-        for security_group in self.neutron.list_security_groups()[
-                'security_groups']:
+        if security_groups is None:
+            security_groups = self.neutron.list_security_groups()[
+                'security_groups']
+        for security_group in security_groups:
             if security_group['tenant_id'] != self.tenant_id:
                 continue
             if security_group['name'] == 'default':
@@ -143,10 +184,16 @@ class NeutronResources(object):
             securitygroups.append(security_group['id'])
         return securitygroups
 
-    def delete_tenant_securitygroups(self):
-        """delete all the tenant's security groups"""
-        for security_group in self.neutron.list_security_groups()[
-                'security_groups']:
+    def delete_tenant_securitygroups(self, security_groups=None):
+        """delete all the tenant's security groups
+        :param security_groups: the security groups already listed (the
+          whole list returned by neutron). If None, they are obtained from
+          neutron.
+        """
+        if security_groups is None:
+            security_groups = self.neutron.list_security_groups()[
+                'security_groups']
+        for security_group in security_groups:
             if security_group['tenant_id'] != self.tenant_id:
                 continue
             if security_group['name'] == 'default':
@@ -154,16 +201,20 @@ class NeutronResources(object):
 
             self.neutron.delete_security_group(security_group['id'])
 
-    def get_tenant_ports(self):
+    def get_tenant_ports(self, ports=None):
         """return a list with the ids of all the tenant's network ports
+        :param ports: the ports already listed (the whole list returned
+          by neutron). If None, they are obtained from neutron.
         :return: a list of port ids
         """
-        ports = list()
-        for port in self.neutron.list_ports()['ports']:
+        tenant_ports = list()
+        if ports is None:
+            ports = self.neutron.list_ports()['ports']
+        for port in ports:
             if port['tenant_id'] != self.tenant_id:
                 continue
-            ports.append(port['id'])
-        return ports
+            tenant_ports.append(port['id'])
+        return tenant_ports
 
     def delete_port(self, port_id):
         """command to delete a specific port. This method is intended for
@@ -182,9 +233,14 @@ class NeutronResources(object):
         else:
             self.neutron.delete_port(port_id)
 
-    def delete_tenant_ports(self):
-        """delete all the tenant's network ports"""
-        for port in self.neutron.list_ports()['ports']:
+    def delete_tenant_ports(self, ports=None):
+        """delete all the tenant's network ports
+        :param ports: the ports already listed (the whole list returned
+          by neutron). If None, they are obtained from neutron.
+        """
+        if ports is None:
+            ports = self.neutron.list_ports()['ports']
+        for port in ports:
             if port['tenant_id'] != self.tenant_id:
                 continue
             # check if port is a interface of a router:
@@ -22,7 +22,12 @@
 # For those usages not covered by the Apache version 2.0 License please
 # contact with opensource@tid.es
 #
-import time
+import logging
+
+from novaclient.exceptions import NotFound
+
+from fiwareskuld.conf import settings
+from fiwareskuld.utils.wait import wait_until
 
 
 class NovaResources(object):
@@ -42,13 +47,17 @@ class NovaResources(object):
         """Method invoked when the region is changed"""
         self.novaclient = self.osclients.get_novaclient()
 
-    def get_tenant_vms(self):
+    def get_tenant_vms(self, servers=None):
         """return all the tenant's vms
+        :param servers: the servers already listed (e.g. from a
+          TenantInventory). If None, they are obtained from nova.
         :return: a list of VMs UUID, with user_id and status
         """
         vms = list()
         print self.tenant_id
-        for vm in self.novaclient.servers.list():
+        if servers is None:
+            servers = self.novaclient.servers.list()
+        for vm in servers:
             assert(vm.tenant_id == self.tenant_id)
             vms.append((vm.id, vm.user_id, vm.status))
         return vms
@@ -78,43 +87,91 @@ class NovaResources(object):
             print("Stopping VM: " + str(vm.id))
         return count
 
-    def delete_tenant_vms(self):
-        """delete all the tenant's vms."""
-        for vm in self.novaclient.servers.list():
+    def delete_tenant_vms(self, servers=None):
+        """delete all the tenant's vms.
+
+        All the deletions are requested first and then a single wait is done
+        for the whole set of VMs.
+        :param servers: the servers already listed. If None, they are
+          obtained from nova.
+        :return: True if all the VMs disappeared before the deadline
+        """
+        vms_ids = set()
+        if servers is None:
+            servers = self.novaclient.servers.list()
+        for vm in servers:
             assert(vm.tenant_id == self.tenant_id)
-            vm.delete()
-            self.wait_for_vm_deleted(vm)
+            try:
+                vm.delete()
+            except NotFound:
+                # already deleted (e.g. by its blueprint instance)
+                continue
+            vms_ids.add(vm.id)
+        return self.wait_for_vms_deleted(vms_ids)
 
     def wait_for_vm_deleted(self, vm):
         """
         It waits for having the concrete vm deleted.
         :param vm: the vm
-        :return: Nothing.
+        :return: True if the VM was deleted before the deadline
         """
-        while(self.exits_vm(vm)):
-            time.sleep(5)
+        return self.wait_for_vms_deleted([vm.id])
 
-    def get_user_keypairs(self):
+    def wait_for_vms_deleted(self, vms_ids, timeout=None):
+        """
+        It waits for having all the vms deleted. Only one list of servers is
+        requested each time, whatever the number of vms is. The time between
+        checks grows exponentially until the timeout expires.
+        :param vms_ids: the ids of the vms
+        :param timeout: maximum seconds to wait. Default is
+          settings.VM_DELETION_TIMEOUT
+        :return: True if all the vms were deleted before the deadline
+        """
+        pending = set(vms_ids)
+        if not pending:
+            return True
+        if timeout is None:
+            timeout = settings.VM_DELETION_TIMEOUT
+
+        def all_deleted():
+            existing = set(vm.id for vm in self.novaclient.servers.list())
+            pending.intersection_update(existing)
+            return not pending
+
+        if wait_until(all_deleted, timeout):
+            return True
+        msg = 'VMs not deleted after {0} seconds: {1}'
+        logging.getLogger(__name__).warning(
+            msg.format(timeout, ', '.join(str(vm_id) for vm_id in pending)))
+        return False
+
+    def get_user_keypairs(self, keypairs=None):
         """return a list with the user's keypairs
 
         The keypair is a very particular case: is the only resource owned
         by the user, not by the tenant. And it is also the only resource that
         does not have a unique id, the name is only unique among the user's
         keypairs. In other way, only the user can obtain the list of keypairs.
+        :param keypairs: the keypairs already listed. If None, they are
+          obtained from nova.
         :return: a list of keypairs. The ids are only unique among the user's
            keypairs.
         """
-        keypairs = list()
-        for keypair in self.novaclient.keypairs.list():
-            keypairs.append(keypair.id)
-        return keypairs
-
-    def delete_user_keypairs(self):
-        """delete all the user's keypairs ."""
-        for keypair in self.novaclient.keypairs.list():
+        if keypairs is None:
+            keypairs = self.novaclient.keypairs.list()
+        return list(keypair.id for keypair in keypairs)
+
+    def delete_user_keypairs(self, keypairs=None):
+        """delete all the user's keypairs .
+        :param keypairs: the keypairs already listed. If None, they are
+          obtained from nova.
+        """
+        if keypairs is None:
+            keypairs = self.novaclient.keypairs.list()
+        for keypair in keypairs:
             keypair.delete()
 
-    def get_tenant_security_groups(self):
+    def get_tenant_security_groups(self, security_groups=None):
         """return a list with the tenant's security groups (nova)
 
 
@@ -123,20 +180,28 @@ class NovaResources(object):
 
         However, if using neutron, the ids are the same and an administrator
         in neutron can list all the security groups.
+        :param security_groups: the security groups already listed. If None,
+          they are obtained from nova.
         :return: a list of security group ids.
         """
-        security_groups = list()
-
-        for secgroup in self.novaclient.security_groups.list():
+        if security_groups is None:
+            security_groups = self.novaclient.security_groups.list()
+        secgroups_ids = list()
+        for secgroup in security_groups:
             if secgroup.name == 'default' \
                     or secgroup.tenant_id != self.tenant_id:
                 continue
-            security_groups.append(secgroup.id)
-        return security_groups
+            secgroups_ids.append(secgroup.id)
+        return secgroups_ids
 
-    def delete_tenant_security_groups(self):
-        """delete all the tenant's security groups (nova)"""
-        for secgroup in self.novaclient.security_groups.findall():
+    def delete_tenant_security_groups(self, security_groups=None):
+        """delete all the tenant's security groups (nova)
+        :param security_groups: the security groups already listed. If None,
+          they are obtained from nova.
+        """
+        if security_groups is None:
+            security_groups = self.novaclient.security_groups.findall()
+        for secgroup in security_groups:
             if secgroup.name == 'default' \
                     or secgroup.tenant_id != self.tenant_id:
                 continue
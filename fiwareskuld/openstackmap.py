@@ -22,15 +22,31 @@
 # For those usages not covered by the Apache version 2.0 License please
 # contact with opensource@tid.es
 #
-import cPickle as pickle
+import copy
+import datetime
 import os
+import time
 from os import environ as env
 from utils.osclients import OpenStackClients
+from utils.mapstore import STORES, filter_objects, get_tenant_id
+from utils.records import Record, record_class
+from utils.columnar import ColumnarMap, ColumnarTable, write_collection
+from utils.workers import run_concurrently
+from utils.pagination import iterate_users, iterate_projects, \
+    iterate_role_assignments
 import logging
 
 __author__ = 'chema'
 
 
+class AttrDict(dict):
+    """A dictionary whose items are also available as attributes: a['key']
+    is also a.key. See OpenStackMap.use_wrapper"""
+    def __init__(self, d=dict()):
+        self.__dict__ = self
+        dict.__init__(self, d)
+
+
 class OpenStackMap(object):
     """
     This class build a map from the resources (VMs, networks, images,
@@ -42,22 +58,133 @@ class OpenStackMap(object):
     """
 
     # objects strategy see the __init__ method documentation
-    DIRECT_OBJECTS, NO_CACHE_OBJECTS, REFRESH_OBJECTS, USE_CACHE_OBJECTS, USE_CACHE_OBJECTS_ONLY = \
-        range(5)
+    DIRECT_OBJECTS, NO_CACHE_OBJECTS, REFRESH_OBJECTS, USE_CACHE_OBJECTS, USE_CACHE_OBJECTS_ONLY, \
+        DELTA_REFRESH_OBJECTS = range(6)
 
     # If use_wrapper is True, dictionaries are wrapped to allow access to
     # resource['field'] also as resource.field. This is not used when
     # objects_strategy is DIRECT_OBJECTS
     use_wrapper = True
 
+    # If compact_records is True, the resources in compact_fields are
+    # converted to records that only keep those fields (see module
+    # utils.records). They use much less memory than the dictionaries and
+    # also allow access to resource['field'] and resource.field. The cached
+    # data keeps all the fields. This is not used when objects_strategy is
+    # DIRECT_OBJECTS
+    compact_records = False
+
+    compact_fields = {
+        'vms': ('id', 'name', 'tenant_id', 'user_id', 'status', 'image',
+                'flavor', 'created'),
+        'images': ('id', 'name', 'owner', 'tenant_id', 'status', 'is_public',
+                   'visibility', 'size', 'created_at'),
+        'networks': ('id', 'name', 'tenant_id', 'status', 'shared',
+                     'router:external', 'subnets'),
+        'subnets': ('id', 'name', 'tenant_id', 'network_id', 'cidr'),
+        'routers': ('id', 'name', 'tenant_id', 'status',
+                    'external_gateway_info'),
+        'ports': ('id', 'tenant_id', 'device_id', 'device_owner',
+                  'network_id', 'fixed_ips', 'status'),
+        'floatingips': ('id', 'tenant_id', 'floating_ip_address', 'port_id',
+                        'router_id', 'floating_network_id', 'status'),
+        'security_groups': ('id', 'name', 'tenant_id'),
+        'volumes': ('id', 'status', 'size', 'tenant_id',
+                    'os-vol-tenant-attr:tenant_id'),
+        'volume_snapshots': ('id', 'status', 'size', 'volume_id', 'tenant_id',
+                             'os-extended-snapshot-attributes:project_id'),
+        'volume_backups': ('id', 'status', 'size', 'volume_id', 'tenant_id',
+                           'os-extended-snapshot-attributes:project_id'),
+        'users': ('id', 'name', 'enabled', 'domain_id', 'cloud_project_id',
+                  'default_project_id'),
+        'users_by_name': ('id', 'name', 'enabled', 'domain_id',
+                          'cloud_project_id', 'default_project_id'),
+        'tenants': ('id', 'name', 'enabled', 'domain_id', 'is_cloud_project'),
+        'tenants_by_name': ('id', 'name', 'enabled', 'domain_id',
+                            'is_cloud_project'),
+    }
+
     load_filters = True
 
     resources_region = ['vms', 'images', 'routers', 'networks', 'subnets', 'ports', 'floatingips',
                         'security_groups', 'volumes', 'volume_backups', 'volume_snapshots']
 
+    resources_keystone = ['users', 'users_by_name', 'tenants', 'tenants_by_name', 'roles_a', 'roles',
+                          'roles_by_user', 'roles_by_project', 'filters', 'filters_by_project']
+
+    # The format of the cache: 'pickle' (a file for each resource type) or
+    # 'sqlite' (a database for each region, that supports partial loads, see
+    # get_objects). See module utils.mapstore
+    storage = 'pickle'
+
+    # With DELTA_REFRESH_OBJECTS, seconds subtracted to the time of the cached
+    # data when requesting the changes, to tolerate clock differences with
+    # the servers.
+    delta_margin = 300
+    # With DELTA_REFRESH_OBJECTS, if the cached data is older than this
+    # (seconds), it is obtained again completely. Deleted resources are
+    # returned as changes only for a limited time.
+    delta_max_age = 86400
+
+    # The number of simultaneous requests used to build the map: load_all
+    # loads the services in parallel and the list calls of neutron and cinder
+    # are also issued in parallel. With 1, everything is sequential.
+    load_workers = 1
+
+    # The fields of each type of resource saved in a columnar snapshot (see
+    # export_snapshot); by default, id, name and status. The owner
+    # (tenant_id) and, for the region resources, the region are always
+    # saved.
+    snapshot_fields = {
+        'images': ('id', 'name', 'status', 'owner'),
+        'ports': ('id', 'name', 'status', 'device_id', 'device_owner'),
+        'volumes': ('id', 'name', 'status', 'os-vol-tenant-attr:tenant_id'),
+        'volume_snapshots': ('id', 'name', 'status',
+                             'os-extended-snapshot-attributes:project_id'),
+        'volume_backups': ('id', 'name', 'status',
+                           'os-extended-snapshot-attributes:project_id'),
+        'users': ('id', 'name', 'cloud_project_id', 'default_project_id'),
+        'tenants': ('id', 'name'),
+        'filters': ('id', 'name', 'filters'),
+    }
+
+    # The keystone collections saved in a columnar snapshot
+    snapshot_keystone = ['users', 'tenants', 'roles_by_user', 'filters', 'filters_by_project']
+
+    # The method that loads each type of resource
+    loaders = {
+        'vms': 'load_nova', 'images': 'load_glance', 'volumes': 'load_cinder',
+        'volume_backups': 'load_cinder', 'volume_snapshots': 'load_cinder',
+        'routers': 'load_neutron', 'networks': 'load_neutron', 'subnets': 'load_neutron', 'ports': 'load_neutron',
+        'floatingips': 'load_neutron', 'security_groups': 'load_neutron',
+        'floatingips_by_ip': 'load_neutron'}
+    loaders.update((name, 'load_keystone') for name in resources_keystone)
+
+    # Secondary indexes, built when the resources are loaded and saved with
+    # the cache. Each index is a dictionary from a value to the list of ids
+    # of the resources with that value; the value is a field of the resource
+    # (the id, if the field is a dictionary, e.g. the image of a vm) or,
+    # when the field is None, the owner (see get_tenant_resources).
+    resource_indexes = {
+        'vms_by_tenant': ('vms', None), 'images_by_tenant': ('images', None),
+        'routers_by_tenant': ('routers', None), 'networks_by_tenant': ('networks', None),
+        'subnets_by_tenant': ('subnets', None), 'ports_by_tenant': ('ports', None),
+        'floatingips_by_tenant': ('floatingips', None), 'security_groups_by_tenant': ('security_groups', None),
+        'volumes_by_tenant': ('volumes', None), 'volume_backups_by_tenant': ('volume_backups', None),
+        'volume_snapshots_by_tenant': ('volume_snapshots', None),
+        'ports_by_device': ('ports', 'device_id'), 'ports_by_device_owner': ('ports', 'device_owner'),
+        'vms_by_image': ('vms', 'image')}
+
+    # The service type and the resource that indicates if a loader of a
+    # region resource can be used (see load_all)
+    loader_services = {
+        'load_nova': ('compute', 'vms'), 'load_neutron': ('network', 'networks'),
+        'load_glance': ('image', 'images'), 'load_cinder': ('volume', 'volumes')}
+
     def __init__(
             self, persistence_dir='~/openstackmap', region=None, auth_url=None,
-            objects_strategy=USE_CACHE_OBJECTS, auto_load=True):
+            objects_strategy=USE_CACHE_OBJECTS, auto_load=True,
+            lazy_load=False, storage=None):
         """
         Constructor
         :param persistence_dir: The path where the data is saved. Ignored if
@@ -79,9 +206,19 @@ class OpenStackMap(object):
          * USE_CACHE_OBJECTS_ONLY is using the objects converted to dictionaries.
            This strategy used cached objects only. It never contacts with the
            servers, even when the object is not available in the local cache.
+         * DELTA_REFRESH_OBJECTS is like REFRESH_OBJECTS, but when there is a
+           recent cached copy, only the resources changed since then are
+           requested and merged into the cached copy (see the
+           _refresh_*_data methods). Where the API does not support it, or it fails, all the
+           objects are obtained again.
 
         :param auto_load: if True, invoke self.load_all()
          Note that neutron objects returned by the API are already dictionaries
+        :param lazy_load: if True, each resource (vms, ports, users...) is
+         loaded the first time it is accessed, following objects_strategy;
+         auto_load is ignored. See __getattr__.
+        :param storage: the format of the cache of this object ('pickle' or
+         'sqlite'); by default, the class attribute storage.
         """
 
         self.logger = logging.getLogger(__name__)
@@ -106,10 +243,15 @@ class OpenStackMap(object):
                 os.environ['KEYSTONE_ADMIN_ENDPOINT'])
 
         self.objects_strategy = objects_strategy
+        self.lazy_load = lazy_load
+        if storage:
+            self.storage = storage
 
         self.persistence_dir = os.path.expanduser(persistence_dir)
         self.pers_region = self.persistence_dir + '/' + region
         self.pers_keystone = self.persistence_dir + '/keystone'
+        self.region_store = STORES[self.storage](self.pers_region)
+        self.keystone_store = STORES[self.storage](self.pers_keystone)
 
         if objects_strategy not in (OpenStackMap.DIRECT_OBJECTS,
                                     OpenStackMap.NO_CACHE_OBJECTS):
@@ -124,14 +266,83 @@ class OpenStackMap(object):
 
         self._init_resource_maps()
 
-        if auto_load:
+        if auto_load and not lazy_load:
             self.load_all()
 
         self.region_map = dict()
 
+    def __getattr__(self, name):
+        """With lazy_load, this method loads a resource the first time it
+        is accessed. It is only called when the attribute does not exist.
+
+        :param name: the attribute name
+        :return: the resource (a dictionary or list of objects)
+        """
+        if (name not in OpenStackMap.loaders and
+                name not in OpenStackMap.resource_indexes) or \
+                not self.__dict__.get('lazy_load'):
+            raise AttributeError(name)
+
+        self._load_lazy(name)
+        return self.__dict__[name]
+
+    def _load_lazy(self, name):
+        """Load a resource not loaded yet. If it is cached and the strategy
+        allows using the cache, only this resource is read; otherwise the
+        loader of its service is called (e.g. load_neutron for ports). As in
+        load_all, the resources of a service not available in the region
+        are empty.
+
+        :param name: the resource name
+        :return: nothing
+        """
+        if name in self.resource_indexes:
+            loader = self.loaders[self.resource_indexes[name][0]]
+        else:
+            loader = self.loaders[name]
+        if name in self.resources_keystone:
+            store = self.keystone_store
+        else:
+            store = self.region_store
+
+        if self.objects_strategy in (OpenStackMap.USE_CACHE_OBJECTS,
+                                     OpenStackMap.USE_CACHE_OBJECTS_ONLY) \
+                and store.exists(name):
+            setattr(self, name, self._convert(store.load(name), name))
+            return
+
+        if loader in self.loader_services:
+            service, resource = self.loader_services[loader]
+            if self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS_ONLY:
+                available = store.exists(resource)
+            else:
+                available = self.osclients.region in \
+                    self.osclients.get_regions(service)
+            if not available:
+                for resource_name, resource_loader in self.loaders.items():
+                    if resource_loader == loader:
+                        setattr(self, resource_name, dict())
+                for index, (resource_name, field) in \
+                        self.resource_indexes.items():
+                    if self.loaders[resource_name] == loader:
+                        setattr(self, index, dict())
+                return
+
+        getattr(self, loader)()
+
     def _init_resource_maps(self):
         """init all the resources that will be available
-        as empty dictionaries"""
+        as empty dictionaries. With lazy_load, the resources are removed
+        instead, to be loaded when accessed"""
+        if self.lazy_load:
+            for name in self.loaders.keys() + self.resource_indexes.keys():
+                self.__dict__.pop(name, None)
+            self.flavors = dict()
+            return
+
+        for index in self.resource_indexes:
+            setattr(self, index, dict())
+
         # Keystone resources
         self.users = dict()
         self.users_by_name = dict()
@@ -163,7 +374,7 @@ class OpenStackMap(object):
         self.volume_snapshots = dict()
 
     def _load(self, name):
-        """Load the resources persisted with pickle. This resources (e.g.
+        """Load the persisted resources. This resources (e.g.
         networks, vms, images...) are saved independently for each region.
 
         This method is called for load_cinder, load_nova, load_glance,
@@ -172,36 +383,41 @@ class OpenStackMap(object):
         :param name: the resource name
         :return: a dictionary of objects (dictionaries) indexed by id
         """
-        objects = pickle.load(open(self.pers_region + '/' + name +
-                                   '.pickle', 'rb'))
-        return self._convert(objects)
+        return self._convert(self.region_store.load(name), name)
 
     def _load_fkeystone(self, name):
-        """Load the keystone objects persisted with pickle. This resources are
+        """Load the persisted keystone objects. This resources are
         shared among the regions. This method is used in load_keystone
 
         :param name: the resource name
         :return: a list/dictionary of objects (dictionaries)
         """
-        objects = pickle.load(open(self.pers_keystone + '/' + name +
-                                   '.pickle', 'rb'))
-        return self._convert(objects)
-
-    def _convert(self, objects):
-        """if use_wrapper, convert objects from dictionary to __E class;
-        this class allows accessing  a['key'] also as a.key"""
-        if self.use_wrapper and len(objects) > 0:
-            class __E(dict):
-                def __init__(self, d=dict()):
-                    self.__dict__ = self
-                    dict.__init__(self, d)
+        return self._convert(self.keystone_store.load(name), name)
+
+    def _convert(self, objects, name=None):
+        """if compact_records and name is in compact_fields, convert objects
+        from dictionary to records; otherwise, if use_wrapper, convert objects
+        from dictionary to AttrDict. Both allow accessing a['key'] also as
+        a.key
 
+        :param objects: a dictionary or list of objects (dictionaries)
+        :param name: the resource name (vms, ports...)
+        :return: the converted objects
+        """
+        if self.compact_records and name in self.compact_fields:
+            wrapper = record_class(name, self.compact_fields[name])
+        elif self.use_wrapper:
+            wrapper = AttrDict
+        else:
+            return objects
+
+        if len(objects) > 0:
             if isinstance(objects, dict):
                 if not isinstance(objects.values()[0], dict):
                     return objects
-                return dict((key, __E(objects[key])) for key in objects)
+                return dict((key, wrapper(objects[key])) for key in objects)
             else:
-                return list(__E(object) for object in objects)
+                return list(wrapper(object) for object in objects)
 
         else:
             return objects
@@ -213,9 +429,11 @@ class OpenStackMap(object):
             self.objects_strategy != OpenStackMap.NO_CACHE_OBJECTS
         keystone = self.osclients.get_keystoneclientv3()
         roles = keystone.roles.list()
-        users = keystone.users.list()
-        tenants = keystone.projects.list()
-        roles_a = keystone.role_assignments.list()
+        # users, tenants and role assignments are iterators, processed while
+        # they are received (see utils.pagination)
+        users = iterate_users(keystone)
+        tenants = iterate_projects(keystone)
+        roles_a = iterate_role_assignments(keystone)
 
         if OpenStackMap.load_filters:
             ef = {'service_type': 'identity', 'interface': 'public'}
@@ -243,7 +461,12 @@ class OpenStackMap(object):
         roles_by_user = dict()
         roles_by_project = dict()
 
+        roles_a_list = list()
         for roleasig in roles_a:
+            if dict_object:
+                roles_a_list.append(roleasig.to_dict())
+            else:
+                roles_a_list.append(roleasig)
             try:
                 userid = roleasig.user['id']
                 if 'project' in roleasig.scope:
@@ -261,6 +484,7 @@ class OpenStackMap(object):
                 roles_by_project[projectid] = list()
             roles_by_user[userid].append((roleid, projectid))
             roles_by_project[projectid].append((roleid, userid))
+        roles_a = roles_a_list
 
         self.roles_by_user = roles_by_user
         self.roles_by_project = roles_by_project
@@ -273,12 +497,13 @@ class OpenStackMap(object):
             roles = dict((role.id, role.to_dict()) for role in roles)
             users = dict((user.id, user.to_dict()) for user in users)
             tenants = dict((tenant.id, tenant.to_dict()) for tenant in tenants)
-            roles_a = list(asig.to_dict() for asig in roles_a)
             for tenant in tenants.values():
                 tenants_by_name[tenant['name']] = tenant
             for user in users.values():
                 users_by_name[user['name']] = user
         else:
+            users = list(users)
+            tenants = list(tenants)
             self.roles = dict((role.id, role) for role in roles)
             self.users = dict((user.id, user) for user in users)
             self.tenants = dict((tenant.id, tenant) for tenant in tenants)
@@ -300,53 +525,32 @@ class OpenStackMap(object):
             return
 
         if save:
-            with open(self.pers_keystone + '/roles.pickle', 'wb') as f:
-                pickle.dump(roles, f, protocol=-1)
-
-            with open(self.pers_keystone + '/users.pickle', 'wb') as f:
-                pickle.dump(users, f, protocol=-1)
-
-            with open(self.pers_keystone + '/users_by_name.pickle', 'wb') as f:
-                pickle.dump(users_by_name, f, protocol=-1)
-
-            with open(self.pers_keystone + '/tenants.pickle', 'wb') as f:
-                pickle.dump(tenants, f, protocol=-1)
-
-            with open(self.pers_keystone + '/tenants_by_name.pickle', 'wb') as\
-                    f:
-                pickle.dump(tenants_by_name, f)
-
-            with open(self.pers_keystone + '/roles_a.pickle', 'wb') as f:
-                pickle.dump(roles_a, f, protocol=-1)
-
-            with open(self.pers_keystone + '/roles_by_user.pickle', 'wb') as f:
-                pickle.dump(roles_by_user, f, protocol=-1)
-
-            with open(self.pers_keystone + '/roles_by_project.pickle', 'wb') as\
-                    f:
-                pickle.dump(roles_by_project, f, protocol=-1)
-
-            with open(self.pers_keystone + '/filters.pickle', 'wb') as f:
-                pickle.dump(filters, f, protocol=-1)
-
-            with open(self.pers_keystone + '/filters_by_project.pickle', 'wb') \
-                    as f:
-                pickle.dump(filters_by_project, f, protocol=-1)
-
-        self.roles = self._convert(roles)
-        self.users = self._convert(users)
-        self.users_by_name = self._convert(users_by_name)
-        self.tenants = self._convert(tenants)
-        self.tenants_by_name = self._convert(tenants_by_name)
-        self.roles_a = self._convert(roles_a)
-        self.filters = self._convert(filters)
-        self.filters_by_project = self._convert(filters_by_project)
+            self.keystone_store.save('roles', roles)
+            self.keystone_store.save('users', users)
+            self.keystone_store.save('users_by_name', users_by_name)
+            self.keystone_store.save('tenants', tenants)
+            self.keystone_store.save('tenants_by_name', tenants_by_name)
+            self.keystone_store.save('roles_a', roles_a)
+            self.keystone_store.save('roles_by_user', roles_by_user)
+            self.keystone_store.save('roles_by_project', roles_by_project)
+            self.keystone_store.save('filters', filters)
+            self.keystone_store.save('filters_by_project', filters_by_project)
+
+        self.roles = self._convert(roles, 'roles')
+        self.users = self._convert(users, 'users')
+        self.users_by_name = self._convert(users_by_name, 'users_by_name')
+        self.tenants = self._convert(tenants, 'tenants')
+        self.tenants_by_name = self._convert(tenants_by_name, 'tenants_by_name')
+        self.roles_a = self._convert(roles_a, 'roles_a')
+        self.filters = self._convert(filters, 'filters')
+        self.filters_by_project = self._convert(filters_by_project, 'filters_by_project')
 
     def _get_nova_data(self):
         """ get data from nova"""
         dict_object = self.objects_strategy != OpenStackMap.DIRECT_OBJECTS
         save = dict_object and \
             self.objects_strategy != OpenStackMap.NO_CACHE_OBJECTS
+        timestamp = time.time()
 
         nova = self.osclients.get_novaclient()
         vms = nova.servers.list(search_opts={'all_tenants': 1})
@@ -358,22 +562,23 @@ class OpenStackMap(object):
             return
 
         if save:
-            with open(self.pers_region + '/vms.pickle', 'wb') as f:
-                pickle.dump(vms, f, protocol=-1)
+            self.region_store.save('vms', vms, timestamp)
 
-        self.vms = self._convert(vms)
+        self.vms = self._convert(vms, 'vms')
 
     def _get_cinder_data(self):
         """get data from cinder"""
         dict_object = self.objects_strategy != OpenStackMap.DIRECT_OBJECTS
         save = dict_object and \
             self.objects_strategy != OpenStackMap.NO_CACHE_OBJECTS
+        timestamp = time.time()
 
         cinder = self.osclients.get_cinderclientv1()
-        volumes = cinder.volumes.list(search_opts={'all_tenants': 1})
-        snapshots = cinder.volume_snapshots.list(
-            search_opts={'all_tenants': 1})
-        backups = cinder.backups.list(search_opts={'all_tenants': 1})
+        search_opts = {'all_tenants': 1}
+        volumes, snapshots, backups = self._run_parallel([
+            lambda: cinder.volumes.list(search_opts=search_opts),
+            lambda: cinder.volume_snapshots.list(search_opts=search_opts),
+            lambda: cinder.backups.list(search_opts=search_opts)])
 
         if dict_object:
             volumes = dict((volume.id, volume.__dict__) for volume in volumes)
@@ -389,23 +594,20 @@ class OpenStackMap(object):
             return
 
         if save:
-            with open(self.pers_region + '/volumes.pickle', 'wb') as f:
-                pickle.dump(volumes, f, protocol=-1)
-            with open(self.pers_region + '/volume_snapshots.pickle', 'wb') as \
-                    f:
-                pickle.dump(snapshots, f, protocol=-1)
-            with open(self.pers_region + '/volume_backups.pickle', 'wb') as f:
-                pickle.dump(backups, f, protocol=-1)
-
-        self.volumes = self._convert(volumes)
-        self.volume_snapshots = self._convert(snapshots)
-        self.volume_backups = self._convert(backups)
+            self.region_store.save('volumes', volumes, timestamp)
+            self.region_store.save('volume_snapshots', snapshots, timestamp)
+            self.region_store.save('volume_backups', backups, timestamp)
+
+        self.volumes = self._convert(volumes, 'volumes')
+        self.volume_snapshots = self._convert(snapshots, 'volume_snapshots')
+        self.volume_backups = self._convert(backups, 'volume_backups')
 
     def _get_glance_data(self):
         """get data from glance"""
         dict_object = self.objects_strategy != OpenStackMap.DIRECT_OBJECTS
         save = dict_object and \
             self.objects_strategy != OpenStackMap.NO_CACHE_OBJECTS
+        timestamp = time.time()
 
         glance = self.osclients.get_glanceclient()
         images = glance.images.findall()
@@ -418,24 +620,29 @@ class OpenStackMap(object):
             return
 
         if save:
-            with open(self.pers_region + '/images.pickle', 'wb') as f:
-                pickle.dump(images, f, protocol=-1)
+            self.region_store.save('images', images, timestamp)
 
-        self.images = self._convert(images)
+        self.images = self._convert(images, 'images')
 
     def _get_neutron_data(self):
         """get network data from neutron"""
         dict_object = self.objects_strategy != OpenStackMap.DIRECT_OBJECTS
         save = dict_object and \
             self.objects_strategy != OpenStackMap.NO_CACHE_OBJECTS
+        timestamp = time.time()
 
         neutron = self.osclients.get_neutronclient()
-        networks = neutron.list_networks()['networks']
-        subnets = neutron.list_subnets()['subnets']
-        routers = neutron.list_routers()['routers']
-        sec_grps = neutron.list_security_groups()['security_groups']
-        floatingips = neutron.list_floatingips()['floatingips']
-        ports = neutron.list_ports()['ports']
+        networks, subnets, routers, sec_grps, floatingips, ports = \
+            self._run_parallel([neutron.list_networks, neutron.list_subnets,
+                                neutron.list_routers,
+                                neutron.list_security_groups,
+                                neutron.list_floatingips, neutron.list_ports])
+        networks = networks['networks']
+        subnets = subnets['subnets']
+        routers = routers['routers']
+        sec_grps = sec_grps['security_groups']
+        floatingips = floatingips['floatingips']
+        ports = ports['ports']
 
         nets = dict((network['id'], network) for network in networks)
         snets = dict((subnet['id'], subnet) for subnet in subnets)
@@ -458,63 +665,271 @@ class OpenStackMap(object):
             return
 
         if save:
-            with open(self.pers_region + '/networks.pickle', 'wb') as f:
-                pickle.dump(nets, f, protocol=-1)
+            self.region_store.save('networks', nets, timestamp)
+            self.region_store.save('subnets', snets, timestamp)
+            self.region_store.save('routers', routers, timestamp)
+            self.region_store.save('floatingips', floatingips, timestamp)
+            self.region_store.save('security_groups', sec_grps, timestamp)
+            self.region_store.save('ports', ports, timestamp)
+
+        self.networks = self._convert(nets, 'networks')
+        self.subnets = self._convert(snets, 'subnets')
+        self.routers = self._convert(routers, 'routers')
+        self.floatingips = self._convert(floatingips, 'floatingips')
+        self.security_groups = self._convert(sec_grps, 'security_groups')
+        self.ports = self._convert(ports, 'ports')
+
+    def _run_parallel(self, functions):
+        """Call the functions (without parameters) using up to load_workers
+        threads. If any of them fails, its exception is raised after all the
+        calls have finished.
+
+        :param functions: a list of functions
+        :return: a list with the results, in the same order than functions
+        """
+        def invoke(function):
+            try:
+                return function(), None
+            except Exception, e:
+                return None, e
+
+        results = run_concurrently(invoke, functions, self.load_workers,
+                                   logger=self.logger)
+        for result, error in results:
+            if error:
+                raise error
+        return [result for result, error in results]
+
+    def _get_changes_since(self, names):
+        """Return the time from which the changes must be requested to
+        refresh the cached resources, or None if they must be obtained
+        completely (the strategy is not DELTA_REFRESH_OBJECTS, or the resources
+        are not cached, or the cached copy is too old).
+
+        :param names: the resource types that are refreshed together
+        :return: the time in seconds since the epoch or None
+        """
+        if self.objects_strategy != OpenStackMap.DELTA_REFRESH_OBJECTS:
+            return None
+        timestamps = list(self.region_store.get_timestamp(name)
+                          for name in names)
+        if None in timestamps or \
+                time.time() - min(timestamps) > self.delta_max_age:
+            return None
+        return min(timestamps) - self.delta_margin
+
+    def _delta_refresh(self, names, refresh_method):
+        """Refresh the cached resources requesting only the changes, if
+        possible.
+
+        :param names: the resource types that are refreshed together
+        :param refresh_method: the method that merges the changes; it
+          receives the time from which the changes are requested.
+        :return: True if the resources were refreshed, False if they must be
+          obtained completely.
+        """
+        since = self._get_changes_since(names)
+        if since is None:
+            return False
+        try:
+            return refresh_method(since) is not False
+        except Exception, e:
+            msg = 'Incremental refresh of {0} failed, obtaining all the ' \
+                  'objects. Cause: {1}'
+            self.logger.warning(msg.format(', '.join(names), str(e)))
+            return False
+
+    @staticmethod
+    def _format_time(seconds):
+        """Return the time in the ISO 8601 format used by the APIs
+        :param seconds: the time in seconds since the epoch
+        :return: a string (UTC time)
+        """
+        return datetime.datetime.utcfromtimestamp(seconds).strftime(
+            '%Y-%m-%dT%H:%M:%SZ')
+
+    def _refresh_nova_data(self, since):
+        """merge into the cached vms the changes obtained from nova. The
+        deleted vms are also returned by nova, with status DELETED.
+
+        :param since: the time from which the changes are requested
+        :return: nothing
+        """
+        timestamp = time.time()
+        nova = self.osclients.get_novaclient()
+        changed = nova.servers.list(search_opts={
+            'all_tenants': 1, 'changes-since': self._format_time(since)})
 
-            with open(self.pers_region + '/subnets.pickle', 'wb') as f:
-                pickle.dump(snets, f, protocol=-1)
+        vms = self.region_store.load('vms')
+        for vm in changed:
+            if vm.status == 'DELETED':
+                vms.pop(vm.id, None)
+            else:
+                vms[vm.id] = vm.to_dict()
 
-            with open(self.pers_region + '/routers.pickle', 'wb') as f:
-                pickle.dump(routers, f, protocol=-1)
+        self.region_store.save('vms', vms, timestamp)
+        self.vms = self._convert(vms, 'vms')
 
-            with open(self.pers_region + '/floatingips.pickle', 'wb') as f:
-                pickle.dump(floatingips, f, protocol=-1)
+    def _refresh_glance_data(self, since):
+        """merge into the cached images the changes obtained from glance. The
+        deleted images are also returned by glance, with the deleted flag.
 
-            with open(self.pers_region + '/security_groups.pickle', 'wb') as f:
-                pickle.dump(sec_grps, f, protocol=-1)
+        :param since: the time from which the changes are requested
+        :return: nothing
+        """
+        timestamp = time.time()
+        glance = self.osclients.get_glanceclient()
+        changed = glance.images.list(
+            filters={'changes-since': self._format_time(since)})
+
+        images = self.region_store.load('images')
+        for image in changed:
+            if getattr(image, 'deleted', False) or \
+                    image.status in ('deleted', 'killed'):
+                images.pop(image.id, None)
+            else:
+                images[image.id] = image.to_dict()
 
-            with open(self.pers_region + '/ports.pickle', 'wb') as f:
-                pickle.dump(ports, f, protocol=-1)
+        self.region_store.save('images', images, timestamp)
+        self.images = self._convert(images, 'images')
 
-        self.networks = self._convert(nets)
-        self.subnets = self._convert(snets)
-        self.routers = self._convert(routers)
-        self.floatingips = self._convert(floatingips)
-        self.security_groups = self._convert(sec_grps)
-        self.ports = self._convert(ports)
+    def _refresh_neutron_data(self, since):
+        """merge into the cached network resources the changes obtained from
+        neutron. It requires the timestamp extension of neutron. Neutron does
+        not return the deleted resources, so only the ids of all the resources
+        are requested to find them out.
+
+        :param since: the time from which the changes are requested
+        :return: False if neutron does not support this method
+        """
+        neutron = self.osclients.get_neutronclient()
+        extensions = set(extension['alias'] for extension in
+                         neutron.list_extensions()['extensions'])
+        if not extensions.intersection(('timestamp_core',
+                                        'standard-attr-timestamp')):
+            return False
+
+        timestamp = time.time()
+        changed_since = self._format_time(since)
+        for name in ('networks', 'subnets', 'routers', 'floatingips',
+                     'security_groups', 'ports'):
+            list_method = getattr(neutron, 'list_' + name)
+            objects = self.region_store.load(name)
+            for resource in list_method(changed_since=changed_since)[name]:
+                objects[resource['id']] = resource
+
+            ids = set(resource['id'] for resource in
+                      list_method(fields='id')[name])
+            objects = dict((key, value) for key, value in objects.items()
+                           if key in ids)
+
+            self.region_store.save(name, objects, timestamp)
+            setattr(self, name, self._convert(objects, name))
+
+    def _build_index(self, objects, field):
+        """Build an index of a collection, see resource_indexes.
+
+        :param objects: the dictionary of resources, indexed by id
+        :param field: the field to index, or None to index by owner
+        :return: a dictionary from each value to the list of ids
+        """
+        index = dict()
+        for key, resource in objects.items():
+            if not isinstance(resource, (dict, Record)):
+                # DIRECT_OBJECTS
+                resource = getattr(resource, '_info', None) or \
+                    getattr(resource, '__dict__', None)
+                if not isinstance(resource, dict):
+                    continue
+            if field:
+                value = resource.get(field)
+            else:
+                value = get_tenant_id(resource)
+            if isinstance(value, dict):
+                value = value.get('id')
+            if not value:
+                continue
+            if value not in index:
+                index[value] = list()
+            index[value].append(key)
+        return index
+
+    def _load_indexes(self, names):
+        """Set the indexes of the resources (see resource_indexes). If the
+        strategy allows using the cache and the saved index is not older than
+        the resources, it is loaded; otherwise it is built and saved.
+
+        :param names: the resources just loaded
+        :return: nothing
+        """
+        use_cache = self.objects_strategy in (
+            OpenStackMap.USE_CACHE_OBJECTS, OpenStackMap.USE_CACHE_OBJECTS_ONLY)
+        save = self.objects_strategy not in (
+            OpenStackMap.DIRECT_OBJECTS, OpenStackMap.NO_CACHE_OBJECTS,
+            OpenStackMap.USE_CACHE_OBJECTS_ONLY)
+        for index, (name, field) in self.resource_indexes.items():
+            if name not in names:
+                continue
+            store = self.region_store
+            if use_cache and store.exists(index) and \
+                    store.get_timestamp(index) >= store.get_timestamp(name):
+                setattr(self, index, store.load(index))
+                continue
+            setattr(self, index, self._build_index(getattr(self, name), field))
+            if save:
+                store.save(index, getattr(self, index),
+                           store.get_timestamp(name))
+
+    def get_tenant_resources(self, name, tenant_id):
+        """Return the resources of a tenant, using the index by owner.
+
+        :param name: the resource name (vms, ports...)
+        :param tenant_id: the tenant id
+        :return: a dictionary with the resources, indexed by id
+        """
+        objects = getattr(self, name)
+        index = getattr(self, name + '_by_tenant')
+        return dict((key, objects[key]) for key in index.get(tenant_id, list())
+                    if key in objects)
 
     def load_nova(self):
         """load nova data: vms"""
         if (self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS or
             self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS_ONLY) and \
-                os.path.exists(self.pers_region + '/vms.pickle'):
+                self.region_store.exists('vms'):
             self.vms = self._load('vms')
         else:
             if self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS_ONLY:
                 raise Exception('Strategy is USE_CACHE_OBJECTS_ONLY but there are not cached data about nova')
 
-            self._get_nova_data()
+            if not self._delta_refresh(['vms'], self._refresh_nova_data):
+                self._get_nova_data()
+
+        self._load_indexes(['vms'])
 
     def load_glance(self):
         """load glance data: images"""
         if (self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS or
             self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS_ONLY) and \
-                os.path.exists(self.pers_region + '/images.pickle'):
+                self.region_store.exists('images'):
             self.images = self._load('images')
         else:
             if self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS_ONLY:
                 raise Exception('Strategy is USE_CACHE_OBJECTS_ONLY but there are not cached data about glance')
-            self._get_glance_data()
+            if not self._delta_refresh(['images'], self._refresh_glance_data):
+                self._get_glance_data()
+
+        self._load_indexes(['images'])
 
     def load_neutron(self):
         """load neutron (network) data: networks, subnets, routers,
            floatingips, security_groups, ports"""
         if (self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS or
             self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS_ONLY) and \
-                os.path.exists(self.pers_region + '/networks.pickle'):
+                self.region_store.exists('networks'):
             self.networks = self._load('networks')
             # legacy
-            if os.path.exists(self.pers_region + '/subnetworks.pickle'):
+            if self.region_store.exists('subnetworks'):
                 self.subnets = self._load('subnetworks')
             else:
                 self.subnets = self._load('subnets')
@@ -522,7 +937,7 @@ class OpenStackMap(object):
             self.routers = self._load('routers')
             self.floatingips = self._load('floatingips')
             # legacy
-            if os.path.exists(self.pers_region + '/securitygroups.pickle'):
+            if self.region_store.exists('securitygroups'):
                 self.security_groups = self._load('securitygroups')
             else:
                 self.security_groups = self._load('security_groups')
@@ -531,12 +946,15 @@ class OpenStackMap(object):
         else:
             if self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS_ONLY:
                 raise Exception('Strategy is USE_CACHE_OBJECTS_ONLY but there are not cached data about neutron')
-            self._get_neutron_data()
+            names = ['networks', 'subnets', 'routers', 'floatingips', 'security_groups', 'ports']
+            if not self._delta_refresh(names, self._refresh_neutron_data):
+                self._get_neutron_data()
 
         # make indexes
         self.floatingips_by_ip = dict((f['floating_ip_address'], f)
                                       for f in self.floatingips.values()
                                       if 'floating_ip_address' in f)
+        self._load_indexes(['networks', 'subnets', 'routers', 'floatingips', 'security_groups', 'ports'])
 
     def load_keystone(self):
         """load keystone data: users, tenants, roles, roles_a,
@@ -544,13 +962,13 @@ class OpenStackMap(object):
         """
         if (self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS or
             self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS_ONLY) and \
-                os.path.exists(self.pers_keystone + '/users.pickle'):
+                self.keystone_store.exists('users'):
             self.users = self._load_fkeystone('users')
             self.users_by_name = self._load_fkeystone('users_by_name')
             self.tenants = self._load_fkeystone('tenants')
             self.tenants_by_name = self._load_fkeystone('tenants_by_name')
             # legacy code
-            if os.path.exists(self.pers_keystone + '/asignments.pickle'):
+            if self.keystone_store.exists('asignments'):
                 self.roles_a = self._load_fkeystone('asignments')
             else:
                 self.roles_a = self._load_fkeystone('roles_a')
@@ -559,7 +977,7 @@ class OpenStackMap(object):
             self.roles_by_user = self._load_fkeystone('roles_by_user')
             self.filters = self._load_fkeystone('filters')
             # legacy code
-            if os.path.exists(self.pers_keystone + '/filters_byproject.pickle'):
+            if self.keystone_store.exists('filters_byproject'):
                 self.filters_by_project = self._load_fkeystone('filters_byproject')
             else:
                 self.filters_by_project = self._load_fkeystone('filters_by_project')
@@ -575,7 +993,7 @@ class OpenStackMap(object):
         """
         if (self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS or
             self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS_ONLY) and \
-                os.path.exists(self.pers_region + '/volumes.pickle'):
+                self.region_store.exists('volumes'):
             self.volumes = self._load('volumes')
             self.volume_backups = self._load('volume_backups')
             self.volume_snapshots = self._load('volume_snapshots')
@@ -585,62 +1003,157 @@ class OpenStackMap(object):
 
             self._get_cinder_data()
 
+        self._load_indexes(['volumes', 'volume_backups', 'volume_snapshots'])
+
     def load_all(self):
-        """load all data"""
+        """load all data. If load_workers is greater than 1, the services are
+        loaded in parallel"""
         region = self.osclients.region
+        loaders = list()
         if self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS_ONLY:
-            if os.path.exists(self.pers_region + '/vms.pickle'):
-                self.load_nova()
+            if self.region_store.exists('vms'):
+                loaders.append(self.load_nova)
 
-            if os.path.exists(self.pers_region + '/networks.pickle'):
-                self.load_neutron()
+            if self.region_store.exists('networks'):
+                loaders.append(self.load_neutron)
 
-            if os.path.exists(self.pers_region + '/images.pickle'):
-                self.load_glance()
+            if self.region_store.exists('images'):
+                loaders.append(self.load_glance)
 
-            if os.path.exists(self.pers_region + '/volumes.pickle'):
-                self.load_cinder()
+            if self.region_store.exists('volumes'):
+                loaders.append(self.load_cinder)
         else:
+            if self.load_workers > 1:
+                # create the session before the threads, to share it
+                self.osclients.get_session()
+
             if region in self.osclients.get_regions('compute'):
-                self.load_nova()
+                loaders.append(self.load_nova)
 
             if region in self.osclients.get_regions('network'):
-                self.load_neutron()
+                loaders.append(self.load_neutron)
 
             if region in self.osclients.get_regions('image'):
-                self.load_glance()
+                loaders.append(self.load_glance)
 
             if region in self.osclients.get_regions('volume'):
-                self.load_cinder()
+                loaders.append(self.load_cinder)
+
+        loaders.append(self.load_keystone)
+        self._run_parallel(loaders)
+
+    def get_objects(self, name, ids=None, tenants=None):
+        """Return the resources of a type, optionally only the ones with the
+        specified ids and/or owned by the specified tenants.
+
+        If the resources are already loaded, they are filtered in memory.
+        Otherwise, if the strategy allows using the cache and the resources
+        are cached, only the requested resources are read (with the sqlite
+        storage, the other resources are not even deserialised). If they are
+        not cached, all the resources are loaded with the load_* method.
+
+        :param name: the resource type (e.g. users, ports)
+        :param ids: if not None, a collection with the ids of the resources
+        :param tenants: if not None, a collection with the tenants owners
+          (the cloud project for the users)
+        :return: a dictionary with the resources indexed by id
+        """
+        # with lazy_load, getattr would load all the objects. A resource is
+        # only in __dict__ once loaded (even if it is empty); without
+        # lazy_load, the maps start as empty dictionaries, so an empty one
+        # may be not loaded yet.
+        objects = self.__dict__.get(name)
+        if objects is not None and (objects or self.lazy_load):
+            return filter_objects(objects, ids, tenants)
+
+        if name in self.resources_keystone:
+            store = self.keystone_store
+        else:
+            store = self.region_store
 
-        self.load_keystone()
+        if self.objects_strategy in (OpenStackMap.USE_CACHE_OBJECTS,
+                                     OpenStackMap.USE_CACHE_OBJECTS_ONLY) \
+                and store.exists(name):
+            return self._convert(store.load_partial(name, ids, tenants), name)
+
+        getattr(self, self.loaders[name])()
+        return filter_objects(getattr(self, name), ids, tenants)
 
     def change_region(self, region, auto_load=True):
         """change region and clean maps. Optionally load the maps.
         :param region: the new region
-        :param auto_load: True to invoke load_all
+        :param auto_load: True to invoke load_all (ignored with lazy_load)
         :return: nothing
         """
         self.pers_region = self.persistence_dir + '/' + region
+        self.region_store = STORES[self.storage](self.pers_region)
         if not os.path.exists(self.pers_region) and self.objects_strategy\
            not in (OpenStackMap.DIRECT_OBJECTS, OpenStackMap.NO_CACHE_OBJECTS):
             os.mkdir(self.pers_region)
         self.osclients.set_region(region)
         self._init_resource_maps()
-        if auto_load:
+        if auto_load and not self.lazy_load:
             self.load_all()
 
-    def preload_regions(self, regions=None, all_regions_excluded=None):
+    def _load_region_map(self, region, services):
+        """Load the data of a region without modifying this object: the data
+        is loaded by a copy of the map with its own clients, so several
+        regions can be loaded at the same time.
+
+        :param region: the region name
+        :param services: the services to load in that region (compute,
+          network, image, volume)
+        :return: a dictionary with the resources of the region (see
+          resources_region), or None if it failed
+        """
+        try:
+            self.logger.info('Creating map of region ' + region)
+            region_osmap = copy.copy(self)
+            region_osmap.osclients = copy.copy(self.osclients)
+            region_osmap.change_region(region, False)
+            if 'compute' in services:
+                region_osmap.load_nova()
+            if 'network' in services:
+                region_osmap.load_neutron()
+            if 'image' in services:
+                region_osmap.load_glance()
+            if 'volume' in services:
+                region_osmap.load_cinder()
+            return dict((resource, getattr(region_osmap, resource))
+                        for resource in self.resources_region +
+                        self.resource_indexes.keys())
+
+        except Exception, e:
+            msg = 'Failed the creation of the map of {0}. Cause: {1}'
+            self.logger.error(msg.format(region, str(e)))
+            # Remove dir if it exists and is empty.
+            dir = os.path.join(self.persistence_dir, region)
+            if os.path.isdir(dir) and len(os.listdir(dir)) == 0:
+                os.rmdir(dir)
+            return None
+
+    def preload_regions(self, regions=None, all_regions_excluded=None,
+                        max_workers=None):
         """Method to preload the data of the specified regions. If
         regions is None, use all the available regions in the federation, but
         the specified in all_regions_excluded.
 
         The data for each region will be available at the region_map dictionary.
 
-        It must be noted that this method could affect the current region
-        and the values of the direct maps (vms, networks...). This is because it
-        calls change_region/load_<service_name> methods. If regions is provided, then
-        the last region in the list will be the new current region"""
+        The regions are loaded at the same time, each one with its own
+        clients. The failure of a region is logged and does not affect the
+        others.
+
+        It must be noted that this method affects the current region
+        and the values of the direct maps (vms, networks...): the last region in
+        the list will be the new current region.
+
+        :param regions: the regions to load
+        :param all_regions_excluded: the regions not to load, when regions is
+          not provided
+        :param max_workers: the number of regions loaded at the same time. By
+          default, all of them.
+        """
 
         if self.objects_strategy == OpenStackMap.USE_CACHE_OBJECTS_ONLY:
             regions_in_disk = set(os.listdir(self.persistence_dir))
@@ -653,17 +1166,18 @@ class OpenStackMap(object):
             regions_volume = set()
 
             for region in regions_in_disk:
-                path = self.persistence_dir + os.path.sep + region
-                if os.path.exists(path + os.path.sep + 'vms.pickle'):
+                store = STORES[self.storage](
+                    self.persistence_dir + os.path.sep + region)
+                if store.exists('vms'):
                     regions_compute.add(region)
 
-                if os.path.exists(path + os.path.sep + 'networks.pickle'):
+                if store.exists('networks'):
                     regions_network.add(region)
 
-                if os.path.exists(path + os.path.sep + 'images.pickle'):
+                if store.exists('images'):
                     regions_image.add(region)
 
-                if os.path.exists(path + os.path.sep + 'volumes.pickle'):
+                if store.exists('volumes'):
                     regions_volume.add(region)
 
         else:
@@ -690,29 +1204,120 @@ class OpenStackMap(object):
             regions = list(all_regions)
             regions.append(self.osclients.region)
 
+        regions = list(regions)
+        services_by_region = dict()
         for region in regions:
-            try:
-                self.logger.info('Creating map of region ' + region)
-                self.change_region(region, False)
-                if region in regions_compute:
-                    self.load_nova()
-                if region in regions_network:
-                    self.load_neutron()
-                if region in regions_image:
-                    self.load_glance()
-                if region in regions_volume:
-                    self.load_cinder()
-                region_map = dict()
-                for resource in self.resources_region:
-                    region_map[resource] = getattr(self, resource)
+            services = set()
+            for service, regions_service in (
+                    ('compute', regions_compute), ('network', regions_network),
+                    ('image', regions_image), ('volume', regions_volume)):
+                if region in regions_service:
+                    services.add(service)
+            services_by_region[region] = services
+
+        if self.objects_strategy != OpenStackMap.USE_CACHE_OBJECTS_ONLY:
+            # the session is created before, to be shared by all the regions
+            self.osclients.get_session()
+
+        if not max_workers:
+            max_workers = len(regions)
+        results = run_concurrently(
+            lambda region: self._load_region_map(
+                region, services_by_region[region]),
+            regions, max_workers, logger=self.logger)
+
+        for region, region_map in zip(regions, results):
+            if region_map is not None:
                 self.region_map[region] = region_map
 
-            except Exception, e:
-                msg = 'Failed the creation of the map of {0}. Cause: {1}'
-                self.logger.error(msg.format(region, str(e)))
-                # Remove dir if it exists and is empty.
-                dir = os.path.join(self.persistence_dir, region)
-                if os.path.isdir(dir) and len(os.listdir(dir)) == 0:
-                    os.rmdir(dir)
+        # the last region is the current one, as if change_region was called
+        # for each region
+        if regions:
+            self.change_region(regions[-1], False)
+            if regions[-1] in self.region_map:
+                for resource, objects in \
+                        self.region_map[regions[-1]].items():
+                    setattr(self, resource, objects)
 
         self.load_keystone()
+
+    def export_snapshot(self, snapshot_dir, regions=None):
+        """Save a columnar snapshot of the map: the keystone collections in
+        snapshot_keystone and the resources of the regions, with only the
+        fields in snapshot_fields. Other processes can read it very fast with
+        load_snapshot. See module utils.columnar.
+
+        :param snapshot_dir: the directory of the snapshot. There is a
+          subdirectory for keystone and for each region.
+        :param regions: the regions to save, from the current region and
+          region_map. By default, all of them.
+        :return: nothing
+        """
+        snapshot_dir = os.path.expanduser(snapshot_dir)
+        keystone_dir = os.path.join(snapshot_dir, 'keystone')
+        if not os.path.exists(keystone_dir):
+            os.makedirs(keystone_dir)
+        for name in self.snapshot_keystone:
+            write_collection(os.path.join(keystone_dir, name + '.columns'),
+                             getattr(self, name),
+                             self.snapshot_fields.get(name, ('id', 'name')))
+
+        region_maps = dict(self.region_map)
+        region_maps[self.osclients.region] = dict(
+            (name, getattr(self, name)) for name in self.resources_region)
+        for region, region_map in region_maps.items():
+            if regions and region not in regions:
+                continue
+            region_dir = os.path.join(snapshot_dir, region)
+            if not os.path.exists(region_dir):
+                os.mkdir(region_dir)
+            for name in self.resources_region:
+                fields = self.snapshot_fields.get(
+                    name, ('id', 'name', 'status'))
+                write_collection(os.path.join(region_dir, name + '.columns'),
+                                 region_map[name], fields, {'region': region})
+
+    def load_snapshot(self, snapshot_dir):
+        """Load a columnar snapshot saved with export_snapshot. The files are
+        memory-mapped, so the objects are decoded only when accessed. The
+        collections are read-only dictionaries (ColumnarMap) and the objects
+        only have the fields saved in the snapshot.
+
+        The keystone collections and the resources of the current region are
+        set as direct maps (users, vms...); the resources of all the regions
+        are available at region_map.
+
+        :param snapshot_dir: the directory of the snapshot
+        :return: nothing
+        """
+        snapshot_dir = os.path.expanduser(snapshot_dir)
+        if self.use_wrapper:
+            wrapper = AttrDict
+        else:
+            wrapper = dict
+
+        def load_dir(directory, names):
+            collections = dict()
+            for name in names:
+                path = os.path.join(directory, name + '.columns')
+                if os.path.exists(path):
+                    collections[name] = ColumnarMap(ColumnarTable(path),
+                                                    wrapper)
+                else:
+                    collections[name] = dict()
+            return collections
+
+        keystone_dir = os.path.join(snapshot_dir, 'keystone')
+        for name, objects in load_dir(
+                keystone_dir, self.snapshot_keystone).items():
+            setattr(self, name, objects)
+
+        for region in os.listdir(snapshot_dir):
+            if region == 'keystone':
+                continue
+            region_map = load_dir(os.path.join(snapshot_dir, region),
+                                  self.resources_region)
+            self.region_map[region] = region_map
+            if region == self.osclients.region:
+                for name, objects in region_map.items():
+                    setattr(self, name, objects)
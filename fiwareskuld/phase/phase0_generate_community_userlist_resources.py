@@ -95,24 +95,32 @@ class CommunityUsers:
         with open(file, 'w') as users_to_delete:
             for user in users:
                 users_to_delete.write(user.id + "," + user.name + "," + user.community_started_at + ",")
-                regions = user_manager.get_regions(user)
-                if regions and "PiraeusU;Hannover;Spain2;Karlsk" in regions:
-                    users_to_delete.write("All regions\n")
-                    continue
-                resources = user_manager.get_user_resources_regions(user)
-
-                for resource in resources:
-                    if type(resources) is dict:
-                        if resources[resource]:
-                            if "vms" in resources[resource]:
-                                users_to_delete.write("Region " + resource + " vms: " +
-                                                      str(len(resources[resource]["vms"])) + " ")
-                            else:
-                                users_to_delete.write("Region " + resource + " problems to obtain vms")
-                        else:
-                            users_to_delete.write("Projects is not enabled")
+                try:
+                    self._write_community_resources(user_manager, user, users_to_delete)
+                finally:
+                    # the same trust id is used for the regions and the
+                    # resources of the user; it is not needed anymore
+                    user_manager.release_trust(user)
                 users_to_delete.write("\n")
 
+    def _write_community_resources(self, user_manager, user, users_to_delete):
+        regions = user_manager.get_regions(user)
+        if regions and "PiraeusU;Hannover;Spain2;Karlsk" in regions:
+            users_to_delete.write("All regions")
+            return
+        resources = user_manager.get_user_resources_regions(user)
+
+        for resource in resources:
+            if type(resources) is dict:
+                if resources[resource]:
+                    if "vms" in resources[resource]:
+                        users_to_delete.write("Region " + resource + " vms: " +
+                                              str(len(resources[resource]["vms"])) + " ")
+                    else:
+                        users_to_delete.write("Region " + resource + " problems to obtain vms")
+                else:
+                    users_to_delete.write("Projects is not enabled")
+
     def _get_regions_users(self, community_users, file):
         user_manager = UserManager()
 
@@ -120,6 +128,7 @@ class CommunityUsers:
             for user in community_users:
                 users_to_delete.write(user.id + "," + user.name + "," + user.community_started_at + ",")
                 regions = user_manager.get_regions(user)
+                user_manager.release_trust(user)
                 if regions:
                     users_to_delete.write(regions)
                 else:
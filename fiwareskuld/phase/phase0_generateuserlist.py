@@ -52,6 +52,17 @@ class UsersExpired:
         (notify_list, delete_list) = self.expiredusers.get_yellow_red_trial_users()
         self._save_lists(notify_list, delete_list, "trial", cron_daily)
 
+    def save_all_lists(self, cron_daily=False):
+        """Create the lists of both the trial and the community users, with
+        a single request of the users and of the role assignments.
+        :param cron_daily: this code is invoked from a cron daily script.
+        :return: nothing
+        """
+        lists = self.expiredusers.get_yellow_red_users_by_role()
+        for role in ("trial", "community"):
+            (notify_list, delete_list) = lists[role]
+            self._save_lists(notify_list, delete_list, role, cron_daily)
+
     def _save_lists(self, notify_list, delete_list, start_file, cron_daily=False):
         """Create files users_to_delete.txt and users_to_notify.txt with the
         users expired and users that will expire in a week or less.
@@ -83,17 +94,17 @@ class UsersExpired:
             else:
                 name = "{0}_users_to_delete.txt".format(start_file)
                 phase3_name = "{0}_users_to_delete_phase3.txt".format(start_file)
-                basic_users = self.get_basic_users_ids()
+                basic_users = self.expiredusers.get_basic_users_ids()
                 rotated_files.rotate_files(
                     name, settings.STOP_BEFORE_DELETE, phase3_name)
                 # Remove from list the users that are not basic
                 # (i.e.) users who has changed to community or again to trial
                 if os.path.exists(phase3_name):
                     with open(phase3_name, 'r') as phase3:
-                        filtered = list(u for u in phase3 if u in basic_users)
+                        filtered = list(line for line in phase3
+                                        if line.strip().split(',')[0] in basic_users)
                     with open(phase3_name, 'w') as phase3:
-                        for user in filtered:
-                            phase3.write(user.id + ',' + user.name + '\n')
+                        phase3.writelines(filtered)
 
                 with open(name, 'w') as users_to_delete:
                     for user in delete_list:
@@ -109,10 +120,12 @@ if __name__ == '__main__':
     logger = log.init_logs('phase0')
     if len(sys.argv) != 2:
         print "This script is used in the following way: phase0_generateuserlist {role}, where role is " \
-              "trial or community"
+              "trial, community or all (both trial and community)"
         exit()
     expired = UsersExpired()
-    if "trial" in sys.argv[1]:
+    if sys.argv[1] == "all":
+        expired.save_all_lists(cron_daily=False)
+    elif "trial" in sys.argv[1]:
         expired.save_trial_lists(cron_daily=False)
     elif "community" in sys.argv[1]:
         expired.save_community_lists(cron_daily=False)
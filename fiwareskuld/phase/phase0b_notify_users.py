@@ -28,10 +28,10 @@ import sys
 
 import warnings
 import os.path
-import requests
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 from requests.packages.urllib3.exceptions import InsecurePlatformWarning
 from fiwareskuld.utils.osclients import osclients
+from fiwareskuld.utils.httpsession import get_http_session
 from fiwareskuld.conf.settings import HORIZON_ENDPOINT
 from fiwareskuld.utils import log
 
@@ -76,8 +76,9 @@ class Notifier(object):
             if horizon_url.endswith('/'):
                 horizon_url = horizon_url[:-1]
 
-            r = requests.post(horizon_url + '/notify_expire_users',
-                              json=body, headers=headers, verify=False)
+            r = get_http_session().post(
+                horizon_url + '/notify_expire_users', json=body,
+                headers=headers, verify=False)
             if r.status_code not in (200, 204):
                 msg = 'The operation returned code {0}: {1}'
                 self.logger.error(msg.format(r.status_code, r.reason))
@@ -94,7 +95,7 @@ class Notifier(object):
         try:
             users = open(file)
         except Exception:
-            logger.error('The users_to_notify.txt file must exists')
+            self.logger.error('The {0} file must exists'.format(file))
             sys.exit(-1)
 
         list_users = list()
@@ -103,6 +104,7 @@ class Notifier(object):
             if user_id == '':
                 continue
             list_users.append(user_id)
+        return list_users
 
     def notify_trial_users(self):
         """
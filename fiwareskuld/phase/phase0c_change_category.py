@@ -25,11 +25,11 @@
 import logging
 
 import warnings
-import requests
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 from requests.packages.urllib3.exceptions import InsecurePlatformWarning
 from fiwareskuld.utils import queries
 from fiwareskuld.utils import log
+from fiwareskuld.utils.httpsession import get_http_session
 from fiwareskuld.conf.settings import TRIAL_ROLE_ID, BASIC_ROLE_ID, HORIZON_ENDPOINT
 import sys
 
@@ -78,8 +78,9 @@ class ChangeCategory():
         if horizon_url.endswith('/'):
             horizon_url = horizon_url[:-1]
 
-        r = requests.post(horizon_url + '/account_category',
-                          json=body, headers=headers, verify=False)
+        r = get_http_session().post(
+            horizon_url + '/account_category', json=body, headers=headers,
+            verify=False)
         if r.status_code not in (200, 204):
             msg = 'The operation returned code {0}: {1}'
             logger.error(msg.format(r.status_code, r.reason))
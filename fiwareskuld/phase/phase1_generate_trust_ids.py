@@ -24,6 +24,7 @@
 #
 import logging
 import sys
+import threading
 
 from fiwareskuld.users_management import UserManager
 from fiwareskuld.utils import log
@@ -49,25 +50,32 @@ def generate_trust_ids(users_to_delete):
     # Use an alternative URL that allow direct access to the keystone admin
     # endpoint, because the registered one uses an internal IP address.
 
-    lines = users_to_delete.readlines()
-    total = len(lines)
-    count = 0
+    users = list(user.strip() for user in users_to_delete.readlines()
+                 if user.strip() != '')
+    total = len(users)
+    progress = {'count': 0}
+    lock = threading.Lock()
 
-    for user in lines:
-        user = user.strip()
-        if user == '':
-            continue
-        try:
-            count += 1
-            (user_name, trust_id, user_id) = user_manager.generate_trust_id(user)
-            users_trusted_ids.write(user_name + ',' + trust_id + ',' + user_id+'\n')
+    def save_trust_id(user, result):
+        # The trust ids are generated concurrently; each one is written as
+        # soon as it is available, so the progress is not lost if the
+        # process is interrupted.
+        with lock:
+            progress['count'] += 1
+            if not result:
+                msg = 'Failed getting trust-id from trustor {0}'
+                logger.error(msg.format(user))
+                return
+            (user_name, trust_id, user_id) = result
+            users_trusted_ids.write(user_name + ',' + trust_id + ',' + user_id + '\n')
+            users_trusted_ids.flush()
             msg = 'Generated trustid for user {0} ({1}/{2})'
-            logger.info(msg.format(user, count, total))
-        except Exception, e:
-            msg = 'Failed getting trust-id from trustor {0}. Reason: {1}'
-            logger.error(msg.format(user, str(e)))
+            logger.info(msg.format(user, progress['count'], total))
 
-    users_trusted_ids.close()
+    try:
+        user_manager.generate_trust_ids(users, save_trust_id)
+    finally:
+        users_trusted_ids.close()
 
 
 if __name__ == '__main__':
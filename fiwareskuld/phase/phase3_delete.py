@@ -27,8 +27,11 @@ import datetime
 
 from os import environ as env
 import os.path
+from fiwareskuld.openstackmap import OpenStackMap
+from fiwareskuld.tenant_inventory import NeutronTenantIndex
 from fiwareskuld.user_resources import UserResources
 from fiwareskuld.utils import log
+from fiwareskuld.utils.workers import run_concurrently
 import fiwareskuld.conf.settings
 
 
@@ -44,6 +47,16 @@ report = dict()
 if os.path.exists('imagesinuse.pickle'):
     images_in_use = pickle.load(open('imagesinuse.pickle'))
 
+# If PHASE3_ADMIN_INVENTORY is defined, the neutron resources of all the
+# tenants are listed once with the admin credential (therefore, before
+# cleaning it), instead of listing them for each user.
+neutron_index = None
+if 'PHASE3_ADMIN_INVENTORY' in env:
+    logger.info('Obtaining neutron resources of all the tenants')
+    neutron_index = NeutronTenantIndex(OpenStackMap(
+        objects_strategy=OpenStackMap.NO_CACHE_OBJECTS, auto_load=False))
+    neutron_index.load()
+
 # clean credential
 if 'OS_USERNAME' in env:
     del env['OS_USERNAME']
@@ -58,6 +71,11 @@ if 'OS_PASSWORD' in env:
 
 trustee = password = None
 
+if 'PHASE3_MAX_WORKERS' in env:
+    max_workers = int(env['PHASE3_MAX_WORKERS'])
+else:
+    max_workers = fiwareskuld.conf.settings.PHASE3_MAX_WORKERS
+
 if os.path.exists('users_trusted_ids.txt'):
     # The output was generated by the process that create trust-ids
     use_trust_ids = True
@@ -105,6 +123,11 @@ for line in lines:
         if images_in_use:
             user_resources.imagesinuse = images_in_use
 
+        if neutron_index:
+            tenant_id = user_resources.clients.get_session().get_project_id()
+            user_resources.preloaded = neutron_index.get_tenant_collections(
+                tenant_id)
+
         user_id = user_resources.user_id
         logger.info('user ' + user + ' has id ' + user_id)
         resources_before = user_resources.get_resources_dict()
@@ -134,48 +157,74 @@ for line in lines:
         msg = 'Obtaining resources of user {0} failed. Cause: {1}'
         logger.error(msg.format(user, str(e)))
 
-# free resources; group by priorities and delete all the user's resources with
-# the some priority before starting with the next priority, to avoid pauses
+# free resources. The users are processed concurrently, using a bounded pool
+# of workers. The deletion of each user's resources follows the priorities
+# (the resources of a priority depend of the resources of the next ones)
 total_free = dict()
-count = 0
-total = len(users_list)
-for user_resources in users_list:
-    user_id = user_resources.user_id
-    count += 1
-    msg = "Freeing resources priority 1 user: {0} ({1}/{2})"
-    logger.info(msg.format(user_id, count, total))
-    user_resources.delete_tenant_resources_pri_1()
+users_by_id = dict((u.user_id, u) for u in users_list)
 
-count = 0
-for user_resources in users_list:
-    user_id = user_resources.user_id
-    count += 1
-    msg = "Freeing resources priority 2 user: {0} ({1}/{2})"
-    logger.info(msg.format(user_id, count, total))
-    user_resources.delete_tenant_resources_pri_2()
 
-count = 0
-for user_resources in users_list:
-    user_id = user_resources.user_id
-    count += 1
-    msg = "Freeing resources priority 3 user: {0} ({1}/{2})"
-    logger.info(msg.format(user_id, count, total))
-    user_resources.delete_tenant_resources_pri_3()
-
-# Report
-count = 0
-for user_resources in users_list:
-    # tuple with user's resources before and after deletion.
-    u_id = user_resources.user_id
-    count += 1
-    resources_before = report[u_id]
+def free_user_resources(u_id):
+    """Free the resources of the user, priority by priority.
+    :param u_id: the id of the user
+    :return: nothing
+    """
+    user_resources = users_by_id[u_id]
+    try:
+        user_resources.delete_tenant_resources_pri_1()
+        user_resources.delete_tenant_resources_pri_2()
+        user_resources.delete_tenant_resources_pri_3()
+    except Exception, e:
+        msg = 'Error freeing resources of user {0}. Cause: {1}'
+        logger.error(msg.format(u_id, str(e)))
+
+
+def get_resources_after(u_id):
+    """Return the resources that remain after freeing them.
+    :param u_id: the id of the user
+    :return: the dictionary with the resources after freeing, or None if
+             they cannot be obtained
+    """
     try:
-        msg = "Retrieving after resources of user: {0} ({1}/{2})"
-        logger.info(msg.format(u_id, count, total))
-        resources_after = user_resources.get_resources_dict()
+        return users_by_id[u_id].get_resources_dict()
     except Exception, e:
         msg = 'Error retrieving resources after freeing of user {0} cause: {1}'
         logger.error(msg.format(u_id, str(e)))
+        return None
+
+msg = 'Freeing resources of {0} users using {1} workers'
+logger.info(msg.format(len(users_list), max_workers))
+users_ids = list(u.user_id for u in users_list)
+run_concurrently(free_user_resources, users_ids, max_workers,
+                 'Freed resources of user: {0} ({1}/{2})', logger)
+
+# The neutron resources have changed, so they are obtained again. If it
+# fails, each user lists its own resources.
+if neutron_index:
+    try:
+        neutron_index.load()
+    except Exception, e:
+        msg = 'Error obtaining neutron resources of all the tenants: ' + str(e)
+        logger.error(msg)
+        neutron_index = None
+
+    for user_resources in users_list:
+        if neutron_index:
+            tenant_id = user_resources.clients.get_session().get_project_id()
+            user_resources.preloaded = neutron_index.get_tenant_collections(
+                tenant_id)
+        else:
+            user_resources.preloaded = None
+
+results = run_concurrently(get_resources_after, users_ids, max_workers,
+                           logger=logger)
+
+# Report. It is built in the same order than the users were read, so the
+# content does not depend of the number of workers.
+for u_id, resources_after in zip(users_ids, results):
+    # tuple with user's resources before and after deletion.
+    resources_before = report[u_id]
+    if resources_after is None:
         # At least, save the resources before
         report[u_id] = (resources_before, resources_before, False)
         continue
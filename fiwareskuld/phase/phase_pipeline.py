@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+import cPickle as pickle
+import datetime
+import os.path
+import sys
+
+from fiwareskuld.conf import settings
+from fiwareskuld.users_management import UserManager
+from fiwareskuld.utils import log
+from fiwareskuld.utils.pipeline import CheckpointStore, PipelineRunner
+from fiwareskuld.utils.queries import Queries
+from phase0_generateuserlist import UsersExpired
+from phase0b_notify_users import Notifier
+from phase2c_deletespecialports import SpecialPortsRemover
+
+__author__ = 'chema'
+
+"""Run all the phases of the daily cron script: generate the lists of users,
+notify the users next to expire, change the category of the expired users,
+stop the VMs of the users (if STOP_BEFORE_DELETE is not 0) and, after the
+grace period, delete their resources.
+
+The progress is saved in a checkpoint file (pipeline_checkpoint.jsonl). If the
+process is interrupted, the next invocation resumes it: the phases and the
+users already processed are skipped (this is specially important for phase0,
+because it rotates the lists of users). The checkpoint is removed when all the
+phases and users are completed; otherwise the script exits with an error and
+the next invocation retries the phases and users that failed.
+"""
+
+logger = log.init_logs('pipeline')
+
+CHECKPOINT_FILE = 'pipeline_checkpoint.jsonl'
+
+
+def read_user_ids(name):
+    """Read the ids of the users of a list generated in phase0. The lines may
+    have other fields after the id, separated by a comma.
+    :param name: the name of the file
+    :return: a list with the user ids; empty if the file does not exist.
+    """
+    if not os.path.exists(name):
+        return list()
+    with open(name) as f:
+        users = list(line.strip().split(',')[0] for line in f)
+    return list(user for user in users if user != '')
+
+
+class SkuldPipeline(object):
+    """The phases of the daily script, run with a PipelineRunner"""
+
+    def __init__(self, checkpoint, roles=('trial', 'community')):
+        """Constructor.
+        :param checkpoint: a CheckpointStore object
+        :param roles: the roles whose users are processed.
+        """
+        self.checkpoint = checkpoint
+        self.runner = PipelineRunner(checkpoint)
+        self.roles = roles
+        self.report = dict()
+        self._user_manager = None
+
+    def get_user_manager(self):
+        """Return the UserManager used to generate the trust ids; it is created
+        only the first time"""
+        if self._user_manager is None:
+            self._user_manager = UserManager()
+        return self._user_manager
+
+    def run(self):
+        """Run all the phases. The checkpoint is removed only when all the
+        phases and users are completed; otherwise it is kept, so the next
+        invocation retries the failed ones.
+        :return: True if everything was completed
+        """
+        self.runner.run_phase(
+            'phase0', lambda: UsersExpired().save_all_lists(cron_daily=True))
+        for role in self.roles:
+            self.run_role(role)
+        if self.runner.incomplete:
+            msg = 'Pipeline not completed; the checkpoint is kept to retry: {0}'
+            logger.error(msg.format(', '.join(
+                phase if item is None else phase + ' ' + item
+                for (phase, item) in self.runner.incomplete)))
+            return False
+        self.checkpoint.remove()
+        return True
+
+    def run_role(self, role):
+        """Run the phases after phase0 for the users of the role.
+        :param role: trial or community
+        :return: nothing
+        """
+        notifier = Notifier()
+        self.runner.run_phase(role + ':phase0b',
+                              getattr(notifier, 'notify_{0}_users'.format(role)))
+
+        phase3_users = read_user_ids(
+            '{0}_users_to_delete_phase3.txt'.format(role))
+        if settings.STOP_BEFORE_DELETE:
+            stop_users = read_user_ids('{0}_users_to_delete.txt'.format(role))
+            expired_users = stop_users
+        else:
+            stop_users = list()
+            expired_users = phase3_users
+
+        if expired_users:
+            # The module creates an admin client when it is imported
+            from phase0c_change_category import ChangeCategory
+            change_category = ChangeCategory()
+            self.runner.run_items(
+                role + ':phase0c', expired_users,
+                lambda user: change_category.change_user_via_idm(user, role))
+
+        if stop_users:
+            self._generate_trust_ids(role + ':phase2', stop_users)
+            self.runner.run_items(
+                role + ':phase2', stop_users, self.stop_user_vms,
+                settings.PHASE3_MAX_WORKERS)
+
+        if phase3_users:
+            # The detection of the images in use and the deletion of the
+            # special ports are independent, so they are run simultaneously.
+            remover = SpecialPortsRemover()
+            self.runner.run_overlapped([
+                ('phase2b', self.detect_images_in_use),
+                (role + ':phase2c',
+                 lambda: remover.special_port.delete_special_ports(phase3_users))])
+            if not self.checkpoint.is_done('phase2b'):
+                msg = 'The images in use are unknown; the resources of the {0} users are not deleted'
+                raise Exception(msg.format(role))
+
+            with open('imagesinuse.pickle') as f:
+                images_in_use = pickle.load(f)
+            self._generate_trust_ids(role + ':phase3', phase3_users)
+            self.runner.run_items(
+                role + ':phase3', phase3_users,
+                lambda user: self.delete_user_resources(user, images_in_use),
+                settings.PHASE3_MAX_WORKERS)
+            self.save_report(role)
+
+    def _generate_trust_ids(self, phase, users):
+        """Generate concurrently the trust ids of the users not processed yet
+        in the phase; the UserManager caches them. A user whose trust id
+        cannot be generated fails in the phase (see _get_user_resources), so
+        it is retried in the next invocation. The trust ids are not saved in
+        the checkpoint, because they are deleted after using them or may be
+        expired when the process is resumed.
+        :param phase: the name of the phase
+        :param users: the ids of the users
+        :return: nothing
+        """
+        pending = list(user for user in users
+                       if not self.checkpoint.is_done(phase, user))
+        if pending:
+            self.get_user_manager().generate_trust_ids(pending)
+
+    def _get_user_resources(self, user):
+        """Return the UserResources object of the user, built with the trust
+        id generated in _generate_trust_ids. The UserManager caches it with the
+        trust, so release_trust reuses it to delete the trust id."""
+        user_resources = self.get_user_manager()._get_user_resources(user)
+        if not user_resources:
+            raise Exception('The resources of user {0} are not available'.format(user))
+        return user_resources
+
+    def stop_user_vms(self, user):
+        """Stop the VMs of the user and unshare its images (phase2).
+        :param user: the user id
+        :return: the number of VMs stopped
+        """
+        try:
+            user_resources = self._get_user_resources(user)
+            stopped = user_resources.stop_tenant_vms()
+            # the images in use are detected only once, in phase2b
+            user_resources.unshare_images(detect_images=False)
+            logger.info('Stopped {0} VMs of user {1}'.format(stopped, user))
+            return stopped
+        finally:
+            self.get_user_manager().release_trust(user)
+
+    def detect_images_in_use(self):
+        """Save in imagesinuse.pickle the images used by a tenant different
+        than the owner (phase2b)"""
+        image_set = Queries().get_imageset_othertenants()
+        with open('imagesinuse.pickle', 'wb') as f:
+            pickle.dump(image_set, f, protocol=-1)
+
+    def delete_user_resources(self, user, images_in_use):
+        """Free the resources of the user (phase3). The deletion is always
+        requested, because some resources (e.g. the swift containers) are not
+        in the listing. If the resources cannot be listed, an exception is
+        raised, so the user is not marked as completed.
+        :param user: the user id
+        :param images_in_use: the images that must not be deleted
+        :return: True if all the resources are freed
+        """
+        try:
+            user_resources = self._get_user_resources(user)
+            user_resources.imagesinuse = images_in_use
+            resources_before = user_resources.get_resources_dict(raise_errors=True)
+            user_resources.delete_tenant_resources()
+            resources_after = user_resources.get_resources_dict(raise_errors=True)
+            all_free = not any(resources_after.values())
+            self.report[user] = (resources_before, resources_after, all_free)
+            return all_free
+        finally:
+            self.get_user_manager().release_trust(user)
+
+    def save_report(self, role):
+        """Save the report of the users whose resources were freed in this
+        invocation.
+        :param role: trial or community
+        :return: nothing
+        """
+        now = datetime.datetime.now().isoformat()
+        name = 'freeresources_report_{0}_{1}.pickle'.format(role, now)
+        with open(name, 'wb') as f:
+            pickle.dump(self.report, f, protocol=-1)
+        self.report = dict()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 or (len(sys.argv) == 2 and sys.argv[1] not in ('trial', 'community', 'all')):
+        print "This script is used in the following way: phase_pipeline.py [role], where role is " \
+              "trial, community or all (the default)"
+        exit()
+    if len(sys.argv) == 2 and sys.argv[1] != 'all':
+        roles = (sys.argv[1],)
+    else:
+        roles = ('trial', 'community')
+
+    if not SkuldPipeline(CheckpointStore(CHECKPOINT_FILE), roles).run():
+        sys.exit(1)
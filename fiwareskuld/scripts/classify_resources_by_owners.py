@@ -38,7 +38,8 @@ class ClassifyResources(object):
        belonging to users that should not have resources, or resources without
        an owner"""
 
-    def __init__(self, cache_dir, regions=None, offline_mode=False):
+    def __init__(self, cache_dir, regions=None, offline_mode=False,
+                 snapshot_dir=None):
         """Constructor
         It also build the sets about users and tenants
         :param cache_dir: the directory where the data is cached.
@@ -46,6 +47,10 @@ class ClassifyResources(object):
           only the current region.
         :param offline_mode: if True, never connect with servers, use only the
                              cached data.
+        :param snapshot_dir: if provided, the data is read from the columnar
+                             snapshot in this directory (see
+                             OpenStackMap.export_snapshot); regions and
+                             offline_mode are ignored.
         """
         self.logger = logging.getLogger(__name__)
         if offline_mode:
@@ -53,11 +58,16 @@ class ClassifyResources(object):
         else:
             strategy = OpenStackMap.USE_CACHE_OBJECTS
 
-        if regions:
+        if snapshot_dir:
+            self.map = OpenStackMap(
+                cache_dir, objects_strategy=OpenStackMap.USE_CACHE_OBJECTS_ONLY, auto_load=False)
+            self.map.load_snapshot(snapshot_dir)
+        elif regions:
             self.map = OpenStackMap(cache_dir, objects_strategy=strategy, auto_load=False)
             self.map.preload_regions(regions)
         else:
-            self.map = OpenStackMap(cache_dir, objects_strategy=strategy)
+            # only the resources used are loaded
+            self.map = OpenStackMap(cache_dir, objects_strategy=strategy, lazy_load=True)
 
         # This groups should be disjoint
         self.admin_users = set()
@@ -395,17 +405,33 @@ if __name__ == '__main__':
     help = 'data is cached in this directory (default is %(default)s)'
     parser.add_argument('--cache-dir', help=help, default='~/openstackmap')
     parser.add_argument('--offline-mode', help='only use cached data', action='store_true')
+    help = 'format of the cached data (default is %(default)s)'
+    parser.add_argument('--storage', help=help, choices=('pickle', 'sqlite'), default='pickle')
+    help = 'number of simultaneous requests to build the map (default is %(default)s)'
+    parser.add_argument('--workers', help=help, type=int, default=1)
+    help = 'keep in memory only the fields of the resources used by the report'
+    parser.add_argument('--compact-records', help=help, action='store_true')
+    help = 'read the data from the columnar snapshot in this directory'
+    parser.add_argument('--snapshot-dir', help=help)
+    help = 'save a columnar snapshot of the data in this directory'
+    parser.add_argument('--export-snapshot', help=help)
 
     meta = parser.parse_args()
+    OpenStackMap.storage = meta.storage
+    OpenStackMap.load_workers = meta.workers
+    OpenStackMap.compact_records = meta.compact_records
     if meta.offline_mode:
         offline_mode = True
     else:
         offline_mode = False
 
     if meta.regions:
-        object = ClassifyResources(meta.cache_dir, meta.regions, offline_mode)
+        object = ClassifyResources(meta.cache_dir, meta.regions, offline_mode, meta.snapshot_dir)
     else:
-        object = ClassifyResources(meta.cache_dir, offline_mode=offline_mode)
+        object = ClassifyResources(meta.cache_dir, offline_mode=offline_mode, snapshot_dir=meta.snapshot_dir)
+
+    if meta.export_snapshot:
+        object.map.export_snapshot(meta.export_snapshot)
 
     if not meta.omit_user_summary:
         object.print_users_summary()
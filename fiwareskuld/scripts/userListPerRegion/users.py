@@ -25,7 +25,7 @@
 """Get the users list of a specific FIWARE Lab region.
 
 Usage:
-  users --user=<username> --pass=<password> --region=<region> [--out=<filename>]
+  users --user=<username> --pass=<password> --region=<region> [--out=<filename>] [--snapshot=<dir>]
   users -h | --help
   users -v | --version
 
@@ -36,14 +36,16 @@ Options:
   --user=<username>   Admin user that request the data.
   --pass=<password>   Admin password of the user.
   --region=<region>   Region name that we want to recover the information.
+  --snapshot=<dir>    Read the keystone data of the bottom-up analysis from the
+                      columnar snapshot in <dir>, instead of the servers.
 
 """
 
 from docopt import docopt
-import requests
 import os
 import json
 from fiwareskuld.openstackmap import OpenStackMap
+from fiwareskuld.utils.httpsession import get_http_session
 
 __version__ = '1.0.0'
 
@@ -84,7 +86,7 @@ def get_token(username, password):
     url = os.path.join(KEYSTONE_URL, API_V2, TOKENS)
     headers = {'content-type': CONTENT_TYPE, 'accept': ACCEPT}
 
-    response = requests.post(url=url, headers=headers, data=body)
+    response = get_http_session().post(url=url, headers=headers, data=body)
 
     info = json.loads(response.text)
     token = info['access']['token']['id']
@@ -106,7 +108,7 @@ def get_endpoint_groups_id(token, region):
 
     headers = {'X-Auth-Token': token}
 
-    response = requests.get(url=url, headers=headers)
+    response = get_http_session().get(url=url, headers=headers)
 
     info = json.loads(response.text)
 
@@ -139,7 +141,7 @@ def get_project_list(token, regionid):
 
     headers = {'X-Auth-Token': token}
 
-    response = requests.get(url=url, headers=headers)
+    response = get_http_session().get(url=url, headers=headers)
 
     info = json.loads(response.text)
 
@@ -169,7 +171,7 @@ def get_user_list(token, projectlist):
 
         headers = {'X-Auth-Token': token}
 
-        response = requests.get(url=url, headers=headers)
+        response = get_http_session().get(url=url, headers=headers)
 
         info = json.loads(response.text)
 
@@ -197,7 +199,7 @@ def get_email(token, userset):
     url = os.path.join(KEYSTONE_URL, API_V3, USER_DETAILS)
     headers = {'X-Auth-Token': token}
 
-    response = requests.get(url=url, headers=headers)
+    response = get_http_session().get(url=url, headers=headers)
 
     info = json.loads(response.text)
 
@@ -211,13 +213,14 @@ def get_email(token, userset):
     return result
 
 
-def get_email_osclient(username, password, region):
+def get_email_osclient(username, password, region, snapshot_dir=None):
     """
     Get the list of user of one region taking into account a bottom-up analysis.
 
     :param username: The name of the admin user that launch the request.
     :param password: The password of the admin user.
     :param region: The region in which we want to obtain the data.
+    :param snapshot_dir: If provided, the columnar snapshot with the keystone data.
     :return: The emaillist.
     """
     print("Making analysis bottom-up...")
@@ -232,7 +235,10 @@ def get_email_osclient(username, password, region):
 
     # load data from servers
     map = OpenStackMap('tmp_cache', auto_load=False)
-    map.load_keystone()
+    if snapshot_dir:
+        map.load_snapshot(snapshot_dir)
+    else:
+        map.load_keystone()
 
     # Get region filters and empty filter
     regions_filters = dict()
@@ -301,7 +307,8 @@ def processing_request(params):
     useremail = get_email(token, userset)
 
     # Get botton-up approx to obtain the user list
-    useremail_osclient = get_email_osclient(username=username, password=password, region=region)
+    useremail_osclient = get_email_osclient(username=username, password=password, region=region,
+                                            snapshot_dir=params['--snapshot'])
 
     # Join the two lists
     finaluserlist = merge_two_dicts(useremail, useremail_osclient)
@@ -9,14 +9,25 @@ class SpecialPortRemover(object):
     """Class to delete ports associated to routers not owned by the port
     owner. To delete these ports, an admin credential is needed"""
 
-    def __init__(self):
-        """constructor"""
+    def __init__(self, cache_dir=None):
+        """constructor
+
+        :param cache_dir: if provided, the users, ports and routers are kept
+          in a sqlite cache in this directory. The ports chosen for deletion
+          must be current, so the cache is refreshed requesting only the
+          changes since it was saved (see DELTA_REFRESH_OBJECTS). By default,
+          all the resources are obtained from the servers.
+        """
         self.logger = logging.getLogger(__name__)
         OpenStackMap.load_filters = False
-        osmap = OpenStackMap(objects_strategy=OpenStackMap.NO_CACHE_OBJECTS,
-                             auto_load=False)
-        osmap.load_keystone()
-        osmap.load_neutron()
+        if cache_dir:
+            osmap = OpenStackMap(
+                cache_dir, objects_strategy=OpenStackMap.DELTA_REFRESH_OBJECTS,
+                lazy_load=True, storage='sqlite')
+        else:
+            osmap = OpenStackMap(
+                objects_strategy=OpenStackMap.NO_CACHE_OBJECTS,
+                lazy_load=True)
         self.map = osmap
         self.neutron = self.map.osclients.get_neutronclient()
 
@@ -26,7 +37,8 @@ class SpecialPortRemover(object):
         :param users: the users to delete
         :return: a set with the project ids of the users
         """
-        tenants = set(self.map.users[user].cloud_project_id for user in users)
+        users_map = self.map.get_objects('users', ids=users)
+        tenants = set(users_map[user].cloud_project_id for user in users)
         return tenants
 
     def _get_router_ports_tenants(self, tenants):
@@ -36,12 +48,23 @@ class SpecialPortRemover(object):
         :return: a list of port objects
         """
         ports = list()
-        for port in self.map.ports.values():
-            if port.tenant_id in tenants and \
-                    port.device_owner.startswith('network:router_interface'):
-                router = self.map.routers[port.device_id]
-                if router.tenant_id != port.tenant_id:
-                    ports.append(port)
+        # the indexes avoid reading the ports that are not router interfaces
+        # of these tenants
+        router_ports_ids = set()
+        for device_owner, ids in self.map.ports_by_device_owner.items():
+            if device_owner.startswith('network:router_interface'):
+                router_ports_ids.update(ids)
+        tenants_ports_ids = set()
+        for tenant in tenants:
+            tenants_ports_ids.update(self.map.ports_by_tenant.get(tenant, []))
+        router_ports = self.map.get_objects(
+            'ports', ids=router_ports_ids & tenants_ports_ids).values()
+        routers = self.map.get_objects(
+            'routers', ids=set(port.device_id for port in router_ports))
+        for port in router_ports:
+            router = routers[port.device_id]
+            if router.tenant_id != port.tenant_id:
+                ports.append(port)
         return ports
 
     def delete_special_ports(self, users_id):
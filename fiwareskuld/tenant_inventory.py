@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+import logging
+
+from fiwareskuld.conf import settings
+from fiwareskuld.utils.workers import run_concurrently
+
+__author__ = 'chema'
+
+# Collections of the inventory that are obtained from neutron, with the name
+# of the equivalent map in OpenStackMap
+NEUTRON_COLLECTIONS = {
+    'floatingips': 'floatingips',
+    'networks': 'networks',
+    'nsecuritygroups': 'security_groups',
+    'routers': 'routers',
+    'subnets': 'subnets',
+    'ports': 'ports'}
+
+
+class TenantInventory(object):
+    """A snapshot of the resources of a tenant.
+
+    Each collection is listed only once and the requests to the different
+    services are sent in parallel. The collections keep the objects returned
+    by the APIs, before filtering them by tenant, so they can be passed to the
+    get_tenant_* and delete_tenant_* methods of the *Resources classes to
+    avoid listing the same resources again."""
+
+    def __init__(self, user_resources, max_workers=None, preloaded=None):
+        """Constructor. The collections are not obtained until load is
+        invoked.
+
+        :param user_resources: the UserResources object of the tenant
+        :param max_workers: the number of collections listed simultaneously.
+          Default is settings.INVENTORY_MAX_WORKERS
+        :param preloaded: a dictionary with collections already obtained by
+          other means (e.g. with NeutronTenantIndex). These collections are
+          not listed.
+        :return: nothing
+        """
+        self.logger = logging.getLogger(__name__)
+        if max_workers is None:
+            max_workers = settings.INVENTORY_MAX_WORKERS
+        self.max_workers = max_workers
+        self.preloaded = preloaded or dict()
+        self.collections = dict()
+        self.sources = self._get_sources(user_resources)
+        for name in self.preloaded:
+            self.sources.pop(name, None)
+
+    def _get_sources(self, user_resources):
+        """Return a dictionary with a function to list each collection. Only
+        the services available in the region are included.
+
+        :param user_resources: the UserResources object of the tenant
+        :return: a dictionary of collection name -> function
+        """
+        sources = dict()
+        nova = user_resources.nova
+        sources['keypairs'] = lambda: nova.novaclient.keypairs.list()
+        sources['servers'] = lambda: nova.novaclient.servers.list()
+        sources['security_groups'] = \
+            lambda: nova.novaclient.security_groups.list()
+
+        glance = user_resources.glance
+        sources['images'] = \
+            lambda: glance.glance.images.findall(owner=glance.tenant_id)
+
+        neutron = user_resources.neutron
+        if neutron:
+            sources['floatingips'] = \
+                lambda: neutron.neutron.list_floatingips()['floatingips']
+            sources['networks'] = \
+                lambda: neutron.neutron.list_networks()['networks']
+            sources['nsecuritygroups'] = \
+                lambda: neutron.neutron.list_security_groups()[
+                    'security_groups']
+            sources['routers'] = \
+                lambda: neutron.neutron.list_routers()['routers']
+            sources['subnets'] = \
+                lambda: neutron.neutron.list_subnets()['subnets']
+            sources['ports'] = lambda: neutron.neutron.list_ports()['ports']
+
+        cinder = user_resources.cinder
+        if cinder:
+            sources['volumesnapshots'] = \
+                lambda: cinder.cinder.volume_snapshots.list()
+            sources['volumes'] = lambda: cinder.cinder.volumes.list()
+            sources['backupvolumes'] = lambda: cinder.cinder.backups.list()
+
+        blueprints = user_resources.blueprints
+        if blueprints:
+            sources['blueprints'] = blueprints.get_tenant_blueprints
+            sources['templates'] = blueprints.get_tenant_templates
+
+        swift = user_resources.swift
+        if swift:
+            sources['objects'] = swift.get_tenant_objects
+
+        return sources
+
+    def load(self):
+        """List all the collections, in parallel. If a collection cannot be
+        obtained, the error is logged and its value is None.
+
+        :return: the object itself
+        """
+        names = sorted(self.sources.keys())
+        results = run_concurrently(lambda name: self.sources[name](), names,
+                                   self.max_workers, logger=self.logger)
+        self.collections = dict(zip(names, results))
+        self.collections.update(self.preloaded)
+        return self
+
+    def get(self, name):
+        """Return a collection of the snapshot.
+
+        :param name: the name of the collection
+        :return: the objects returned by the API, or None if the collection
+          is not available (it was not possible to obtain it, or the service
+          is not available in the region)
+        """
+        return self.collections.get(name)
+
+
+class NeutronTenantIndex(object):
+    """The neutron resources of all the tenants of a region, indexed by
+    tenant.
+
+    The resources are obtained using an OpenStackMap with an admin
+    credential, so each resource type is listed only once for all the
+    tenants, instead of once for each tenant with the credential of its
+    user."""
+
+    def __init__(self, osmap):
+        """Constructor. The resources are not obtained until load is invoked.
+
+        :param osmap: an OpenStackMap object, created with an admin
+          credential, in the region of the tenants.
+        :return: nothing
+        """
+        self.osmap = osmap
+        self.by_tenant = dict()
+
+    def load(self):
+        """Obtain (again) the neutron resources of the region and index them.
+
+        :return: the object itself
+        """
+        self.osmap.load_neutron()
+        by_tenant = dict()
+        for name, attribute in NEUTRON_COLLECTIONS.items():
+            for resource in getattr(self.osmap, attribute).values():
+                tenant_id = resource.get('tenant_id')
+                if tenant_id not in by_tenant:
+                    by_tenant[tenant_id] = dict()
+                collections = by_tenant[tenant_id]
+                if name not in collections:
+                    collections[name] = list()
+                collections[name].append(resource)
+        self.by_tenant = by_tenant
+        return self
+
+    def get_tenant_collections(self, tenant_id):
+        """Return the neutron collections of the tenant, to be used as the
+        preloaded collections of a TenantInventory.
+
+        :param tenant_id: the id of the tenant
+        :return: a dictionary with all the neutron collections of the
+          inventory; the collections without resources are empty lists.
+        """
+        collections = self.by_tenant.get(tenant_id, dict())
+        return dict((name, list(collections.get(name, list())))
+                    for name in NEUTRON_COLLECTIONS)
@@ -23,7 +23,6 @@
 # contact with opensource@tid.es
 #
 
-import time
 import logging
 
 from fiwareskuld.conf import settings
@@ -35,8 +34,22 @@ from cinder_resources import CinderResources
 from neutron_resources import NeutronResources
 from blueprint_resources import BluePrintResources
 from swift_resources import SwiftResources
+from tenant_inventory import TenantInventory
 from fiwareskuld.utils.queries import Queries
+from fiwareskuld.utils.wait import wait_until
+from fiwareskuld.utils.workers import run_concurrently
 import cPickle as pickle
+import copy
+
+
+def _wrapper_property(name):
+    """Return a property to get (creating it on first use) and set the
+    wrapper of a service in the current region. See UserResources.get_wrapper
+    :param name: the name of the wrapper (e.g. nova)
+    :return: a property object
+    """
+    return property(lambda self: self.get_wrapper(name),
+                    lambda self, wrapper: self.set_wrapper(name, wrapper))
 
 
 class UserResources(object):
@@ -45,6 +58,21 @@ class UserResources(object):
 
     This class works creating a instance with the credential of the user owner
     of the resources. It does not use an admin credential!!!"""
+
+    # Classes of the wrappers of each service
+    wrapper_classes = {
+        'nova': NovaResources,
+        'glance': GlanceResources,
+        'neutron': NeutronResources,
+        'cinder': CinderResources,
+        'blueprints': BluePrintResources,
+        'swift': SwiftResources,
+    }
+
+    # Services that may be not available in a region; their wrapper is None
+    # when it cannot be created.
+    optional_wrappers = ('neutron', 'cinder', 'blueprints', 'swift')
+
     def __init__(self, username, password, tenant_id=None, tenant_name=None,
                  trust_id=None):
         """
@@ -91,38 +119,11 @@ class UserResources(object):
             'identity', region, 'admin', settings.KEYSTONE_ENDPOINT)
 
         self.user_id = self.clients.get_session().get_user_id()
-        session = self.clients.get_session()
         self.user_name = username
-        self.nova = NovaResources(self.clients)
-        self.glance = GlanceResources(self.clients)
 
-        try:
-            self.neutron = NeutronResources(self.clients)
-        except Exception:
-            # The region does not support Neutron
-            # It would be better to check the endpoint
-            self.neutron = None
-
-        try:
-            self.cinder = CinderResources(self.clients)
-        except Exception:
-            # The region does not support Neutron
-            # It would be better to check the endpoint
-            self.cinder = None
-
-        try:
-            self.blueprints = BluePrintResources(self.clients)
-        except Exception:
-            # The region does not support PaaS Manager
-            # It would be better to check the endpoint
-            self.blueprints = None
-
-        try:
-            self.swift = SwiftResources(self.clients)
-        except Exception:
-            # The region does not support Swift
-            # It would be better to check the endpoint
-            self.swift = None
+        # The wrappers of the services (nova, glance...) are created on first
+        # use, by region. See get_wrapper.
+        self._wrappers = dict()
 
         # Images in use is a set used to avoid deleting formerly glance images
         # in use by other tenants
@@ -132,56 +133,130 @@ class UserResources(object):
         self.regions_available = set()
         self.regions_available.update(self.clients.get_regions('compute'))
 
+        # Snapshot of the tenant resources, see load_inventory
+        self.inventory = None
+
+        # Collections already obtained by other means (e.g. with an admin
+        # credential), that must not be listed by load_inventory
+        self.preloaded = None
+
+    def get_wrapper(self, name):
+        """Return the wrapper of a service (e.g. nova) in the current region.
+        It is created the first time it is used in each region, so only the
+        clients of the services actually used are built.
+        :param name: the name of the wrapper (see wrapper_classes)
+        :return: the wrapper object, or None if the service is optional and
+          its wrapper cannot be created in the region.
+        """
+        key = (self.clients.region, name)
+        if key not in self._wrappers:
+            try:
+                wrapper = self.wrapper_classes[name](self.clients)
+            except Exception, e:
+                if name not in self.optional_wrappers:
+                    raise
+                # The region does not support the service
+                msg = 'Service {0} not available in region {1}: {2}'
+                self.logger.debug(msg.format(name, key[0], str(e)))
+                wrapper = None
+            self._wrappers[key] = wrapper
+        return self._wrappers[key]
+
+    def set_wrapper(self, name, wrapper):
+        """Replace the wrapper of a service in the current region.
+        :param name: the name of the wrapper (see wrapper_classes)
+        :param wrapper: the wrapper object or None
+        :return: nothing
+        """
+        self._wrappers[(self.clients.region, name)] = wrapper
+
+    nova = _wrapper_property('nova')
+    glance = _wrapper_property('glance')
+    neutron = _wrapper_property('neutron')
+    cinder = _wrapper_property('cinder')
+    blueprints = _wrapper_property('blueprints')
+    swift = _wrapper_property('swift')
+
     def change_region(self, region):
         """
-        It changes the region. All the clients need to be updated, but the
-        session does not.
+        It changes the region. The session is not changed; the wrappers of
+        the services in the region are created on first use (see get_wrapper).
         :param region: the name of the region
         :return: nothing.
         """
         self.clients.set_region(region)
         self.clients.override_endpoint(
             'identity', region, 'admin', settings.KEYSTONE_ENDPOINT)
-
-        self.nova.on_region_changed()
-        self.glance.on_region_changed()
-
-        try:
-            if self.swift:
-                self.swift.on_region_changed()
-            else:
-                self.swift = SwiftResources(self.clients)
-        except Exception:
-            # The region does not support swift
-            self.swift = None
-
-        if self.cinder:
-            self.cinder.on_region_changed()
-
-        try:
-            if self.blueprints:
-                self.blueprint.on_region_changed()
-            else:
-                self.blueprints = BluePrintResources(self.clients)
-        except Exception:
-            # The region has not configured paas manager
-            self.blueprints = None
-
-        try:
-            if self.neutron:
-                self.neutron.on_region_changed()
-            else:
-                self.neutron = NeutronResources(self.clients)
-        except Exception:
-            # The region does not support neutron
-            self.neutron = None
+        self.inventory = None
+        self.preloaded = None
+
+    def for_region(self, region):
+        """Return a copy of this object that works with other region, with
+        its own clients and wrappers; the session is shared. This object is
+        not modified, so the copies of several regions may be used at the
+        same time.
+        :param region: the name of the region
+        :return: a UserResources object
+        """
+        user_resources = copy.copy(self)
+        user_resources.clients = self.clients.for_region(region)
+        user_resources.clients.override_endpoint(
+            'identity', region, 'admin', settings.KEYSTONE_ENDPOINT)
+        user_resources._wrappers = dict()
+        user_resources.imagesinuse = set(self.imagesinuse)
+        user_resources.inventory = None
+        user_resources.preloaded = None
+        return user_resources
+
+    def map_regions(self, function, regions=None, max_workers=None):
+        """Invoke function in each region the user has access, with a copy of
+        this object bound to the region (see for_region). The regions are
+        processed concurrently.
+
+        An error in a region is logged and its result is None.
+        :param function: the function to call; it receives the UserResources
+          object of the region.
+        :param regions: the regions. By default, get_regions_user()
+        :param max_workers: the regions processed simultaneously. By default,
+          settings.REGION_MAX_WORKERS
+        :return: a dictionary region -> result of the function
+        """
+        if regions is None:
+            regions = self.get_regions_user()
+        if max_workers is None:
+            max_workers = settings.REGION_MAX_WORKERS
+        regions = sorted(regions)
+        results = run_concurrently(
+            lambda region: function(self.for_region(region)), regions,
+            max_workers, logger=self.logger)
+        return dict(zip(regions, results))
+
+    def load_inventory(self):
+        """Obtain a snapshot of the tenant resources. Each collection is
+        listed only once, and the delete_tenant_resources_pri_* methods reuse
+        the snapshot until the resources are deleted. The collections in
+        self.preloaded are not listed.
+        :return: the TenantInventory object
+        """
+        self.inventory = TenantInventory(self, preloaded=self.preloaded).load()
+        return self.inventory
+
+    def _get_collection(self, name):
+        """Return a collection of the inventory, or None if there is not an
+        inventory available (then the resources must be listed again)
+        :param name: the name of the collection
+        :return: a list of resources or None
+        """
+        if self.inventory:
+            return self.inventory.get(name)
+        return None
 
     def delete_tenant_resources_pri_1(self):
         """Delete here all the elements that do not depend of others are
         deleted first"""
 
         try:
-            self.nova.delete_user_keypairs()
+            self.nova.delete_user_keypairs(self._get_collection('keypairs'))
         except Exception, e:
             msg = 'Deletion of keypairs failed. Reason: '
             self.logger.error(msg + str(e))
@@ -190,7 +265,8 @@ class UserResources(object):
         # depends of a volume.
         try:
             if self.swift:
-                self.cinder.delete_tenant_volume_snapshots()
+                self.cinder.delete_tenant_volume_snapshots(
+                    self._get_collection('volumesnapshots'))
         except Exception, e:
             msg = 'Deletion of volume snaphosts failed. Reason: '
             self.logger.error(msg + str(e))
@@ -199,14 +275,16 @@ class UserResources(object):
         # templates
         try:
             if self.blueprints:
-                self.blueprints.delete_tenant_blueprints()
+                self.blueprints.delete_tenant_blueprints(
+                    self._get_collection('blueprints'))
         except Exception, e:
             msg = 'Deletion of blueprints failed. Reason: '
             self.logger.error(msg + str(e))
 
         try:
             if self.cinder:
-                self.cinder.delete_tenant_backup_volumes()
+                self.cinder.delete_tenant_backup_volumes(
+                    self._get_collection('backupvolumes'))
         except Exception, e:
             msg = 'Deletion of backup volumes failed. Reason: '
             self.logger.error(msg + str(e))
@@ -223,17 +301,18 @@ class UserResources(object):
         # VMs and blueprint templates should be deleted after blueprint
         # instances.
 
-        count = 0
         if self.blueprints:
-            while self.blueprints.get_tenant_blueprints() and count < 120:
-                time.sleep(1)
-                count += 1
-
-            if count >= 120:
-                self.logger.warning('Waiting for blueprint more than 120 seconds')
+            self.wait_until_deleted(self.blueprints.get_tenant_blueprints,
+                                    'blueprints')
 
+        # The blueprint instances deleted in pri_1 delete their own VMs, so
+        # the servers are listed again instead of using the inventory.
+        if self.blueprints:
+            servers = None
+        else:
+            servers = self._get_collection('servers')
         try:
-            self.nova.delete_tenant_vms()
+            self.nova.delete_tenant_vms(servers)
         except Exception, e:
             msg = 'Deletion of VMs failed. Reason: '
             self.logger.error(msg + str(e))
@@ -241,47 +320,43 @@ class UserResources(object):
         # Blueprint instances must be deleted after blueprint templates
         try:
             if self.blueprints:
-                self.blueprints.delete_tenant_templates()
+                self.blueprints.delete_tenant_templates(
+                    self._get_collection('templates'))
         except Exception, e:
             msg = 'Deletion of blueprint templates failed. Reason: '
             self.logger.error(msg + str(e))
 
     def delete_tenant_resources_pri_3(self):
         """Delete resources that must be deleted after p2 resources"""
-        count = 0
-        while self.nova.get_tenant_vms() and count < 120:
-            time.sleep(1)
-            count += 1
-
-        if count >= 120:
-            self.logger.warning('Waiting for VMs more than 120 seconds')
+        self.wait_until_deleted(self.nova.get_tenant_vms, 'VMs')
 
         # security group, volumes, network ports, images, floating ips,
         # must be deleted after VMs
 
         # self.glance.delete_tenant_images()
         try:
-            self.glance.delete_tenant_images_notinuse(self.imagesinuse)
+            self.glance.delete_tenant_images_notinuse(
+                self.imagesinuse, self._get_collection('images'))
         except Exception, e:
             msg = 'Deletion of images failed. Reason: '
             self.logger.error(msg + str(e))
 
         # Before deleting volumes, snapshot volumes must be deleted
-        count = 0
-        while self.cinder and self.cinder.get_tenant_volume_snapshots() and count < 120:
-            time.sleep(1)
-            count += 1
-
-        if count >= 120:
-            self.logger.warning('Waiting for volume snapshots > 120 seconds')
+        if self.cinder:
+            self.wait_until_deleted(self.cinder.get_tenant_volume_snapshots,
+                                    'volume snapshots')
 
         try:
             if self.cinder:
-                self.cinder.delete_tenant_volumes()
+                self.cinder.delete_tenant_volumes(
+                    self._get_collection('volumes'))
         except Exception, e:
             msg = 'Deletion of volumes failed. Reason: '
             self.logger.error(msg + str(e))
 
+        # The ports are listed again, because the ports of the VMs have
+        # disappeared with them. The same applies to the nova security
+        # groups, that are the same than the neutron ones.
         try:
             self.neutron.delete_tenant_ports()
         except Exception, e:
@@ -289,7 +364,8 @@ class UserResources(object):
             self.logger.error(msg + str(e))
 
         try:
-            self.neutron.delete_tenant_securitygroups()
+            self.neutron.delete_tenant_securitygroups(
+                self._get_collection('nsecuritygroups'))
         except Exception, e:
             msg = 'Deletion of network security groups failed. Reason: '
             self.logger.error(msg + str(e))
@@ -301,34 +377,66 @@ class UserResources(object):
             self.logger.error(msg + str(e))
 
         try:
-            self.neutron.delete_tenant_floatingips()
+            self.neutron.delete_tenant_floatingips(
+                self._get_collection('floatingips'))
         except Exception, e:
             msg = 'Deletion of floating ips failed. Reason: '
             self.logger.error(msg + str(e))
 
         try:
-            self.neutron.delete_tenant_subnets()
+            self.neutron.delete_tenant_subnets(
+                self._get_collection('subnets'))
         except Exception, e:
             msg = 'Deletion of subnets failed. Reason: '
             self.logger.error(msg + str(e))
 
         try:
-            self.neutron.delete_tenant_networks()
+            self.neutron.delete_tenant_networks(
+                self._get_collection('networks'))
         except Exception, e:
             msg = 'Deletion of networks failed. Reason: '
             self.logger.error(msg + str(e))
 
         try:
-            self.neutron.delete_tenant_routers()
+            self.neutron.delete_tenant_routers(
+                self._get_collection('routers'))
         except Exception, e:
             msg = 'Deletion of routers failed. Reason: '
             self.logger.error(msg + str(e))
 
+        # The snapshot is not valid anymore
+        self.inventory = None
+
+    def wait_until_deleted(self, get_resources, description):
+        """Wait until the resources returned by get_resources disappear.
+
+        The wait finishes as soon as the list is empty, or after
+        settings.DEPENDENCY_WAIT_TIMEOUT seconds. A failure obtaining the list
+        is logged and also finishes the wait.
+        :param get_resources: a callable returning the list of resources
+        :param description: the name of the resources, used in the log
+        :return: True if the resources were deleted in time.
+        """
+        timeout = settings.DEPENDENCY_WAIT_TIMEOUT
+        try:
+            deleted = wait_until(lambda: not get_resources(), timeout,
+                                 jitter=0.1)
+        except Exception, e:
+            msg = 'Checking deletion of {0} failed. Reason: {1}'
+            self.logger.error(msg.format(description, str(e)))
+            return False
+
+        if not deleted:
+            msg = 'Waiting for {0} more than {1} seconds'
+            self.logger.warning(msg.format(description, timeout))
+        return deleted
+
     def delete_tenant_resources(self):
         """Delete all the resources of the tenant, and also the keypairs of the
         user"""
         self.delete_tenant_resources_pri_1()
-        time.sleep(10)
+        # there is no fixed pause here: each priority waits only for the
+        # resources it depends on (e.g. blueprint instances before VMs)
         self.delete_tenant_resources_pri_2()
         self.delete_tenant_resources_pri_3()
 
@@ -338,11 +446,15 @@ class UserResources(object):
         """
         return self.nova.stop_tenant_vms()
 
-    def unshare_images(self):
-        """Make private all the tenant public images"""
+    def unshare_images(self, detect_images=True):
+        """Make private all the tenant public images
+        :param detect_images: if True, the images in use are detected again
+          (see detect_images_in_use)
+        """
         if self.glance:
             self.glance.unshare_images()
-            self.detect_images_in_use()
+            if detect_images:
+                self.detect_images_in_use()
 
     def get_regions_user(self):
         """
@@ -362,45 +474,54 @@ class UserResources(object):
         regions.
         :return: a dictionary with the user's resources
         """
-        vms_regions = {}
-        for region in self.get_regions_user():
-            self.change_region(region)
-            vms_regions[region] = set(self.nova.get_tenant_vms())
-        return vms_regions
-
-    def get_resources_dict(self):
-        """It returns a dictionary of sets with the ids of the user's resources
+        return self.map_regions(
+            lambda user_resources: set(user_resources.nova.get_tenant_vms()))
+
+    def get_resources_dict(self, raise_errors=False):
+        """It returns a dictionary of sets with the ids of the user's resources.
+        A new inventory of the tenant is obtained, and kept to be reused by
+        the delete_tenant_resources_pri_* methods.
+        :param raise_errors: if True, an error listing the resources is
+          raised; otherwise it is printed and the dictionary is incomplete.
         :return: a dictionary with the user's resources
         """
         resources = dict()
         try:
+            self.load_inventory()
+            get = self._get_collection
 
             if self.blueprints:
-                resources['blueprints'] = set(self.blueprints.get_tenant_blueprints())
-                resources['templates'] = set(self.blueprints.get_tenant_templates())
+                resources['blueprints'] = set(get('blueprints'))
+                resources['templates'] = set(get('templates'))
 
-            resources['keys'] = set(self.nova.get_user_keypairs())
-            resources['vms'] = set(self.nova.get_tenant_vms())
-            resources['security_groups'] = set(self.nova.get_tenant_security_groups())
+            resources['keys'] = set(self.nova.get_user_keypairs(get('keypairs')))
+            resources['vms'] = set(self.nova.get_tenant_vms(get('servers')))
+            resources['security_groups'] = set(self.nova.get_tenant_security_groups(get('security_groups')))
 
-            resources['images'] = self.glance.get_tenant_images()
+            resources['images'] = self.glance.get_tenant_images(get('images'))
 
             if self.neutron:
-                resources['floatingips'] = set(self.neutron.get_tenant_floatingips())
-                resources['networks'] = set(self.neutron.get_tenant_networks())
-                resources['nsecuritygroups'] = set(self.neutron.get_tenant_securitygroups())
-                resources['routers'] = set(self.neutron.get_tenant_routers())
-                resources['subnets'] = set(self.neutron.get_tenant_subnets())
-                resources['ports'] = set(self.neutron.get_tenant_ports())
+                resources['floatingips'] = set(self.neutron.get_tenant_floatingips(get('floatingips')))
+                resources['networks'] = set(self.neutron.get_tenant_networks(get('networks')))
+                resources['nsecuritygroups'] = set(self.neutron.get_tenant_securitygroups(get('nsecuritygroups')))
+                resources['routers'] = set(self.neutron.get_tenant_routers(get('routers')))
+                resources['subnets'] = set(self.neutron.get_tenant_subnets(get('subnets')))
+                resources['ports'] = set(self.neutron.get_tenant_ports(get('ports')))
 
             if self.cinder:
-                resources['volumesnapshots'] = set(self.cinder.get_tenant_volume_snapshots())
-                resources['volumes'] = set(self.cinder.get_tenant_volumes())
-                resources['backupvolumes'] = set(self.cinder.get_tenant_backup_volumes())
+                resources['volumesnapshots'] = set(self.cinder.get_tenant_volume_snapshots(get('volumesnapshots')))
+                resources['volumes'] = set(self.cinder.get_tenant_volumes(get('volumes')))
+                resources['backupvolumes'] = set(self.cinder.get_tenant_backup_volumes(get('backupvolumes')))
 
             if self.swift:
-                resources['objects'] = set(self.swift.get_tenant_objects())
+                objects = get('objects')
+                if objects is None:
+                    # the listing failed or there is not an inventory
+                    objects = self.swift.get_tenant_objects()
+                resources['objects'] = set(objects)
         except Exception as e:
+            if raise_errors:
+                raise
             print("Error to obtain the data " + e.message)
 
         return resources
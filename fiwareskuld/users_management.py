@@ -24,6 +24,8 @@
 
 import datetime
 import pickle
+import threading
+import time
 
 from fiwareskuld.conf import settings
 from fiwareskuld.utils import osclients
@@ -41,6 +43,11 @@ logger = log.init_logs('user_management')
 
 class UserManager(object):
     """Class to generate users."""
+
+    # A cached trust id is not reused when it expires in less than these
+    # seconds; see generate_trust_id.
+    trust_expiration_margin = 600
+
     def __init__(self):
         """constructor"""
         self.clients = osclients.OpenStackClients()
@@ -50,6 +57,10 @@ class UserManager(object):
         self.neutron_c = self.clients.get_neutronclient()
         self.keystone = self.clients.get_keystoneclientv3()
         self.exp = ExpiredUsers()
+        self._trust_factory = None
+        # Trust ids (and the UserResources built with them) by trustor id
+        self._trusts = dict()
+        self._trusts_lock = threading.Lock()
         self._trust_info()
 
     def _trust_info(self):
@@ -277,20 +288,30 @@ class UserManager(object):
 
     def generate_trust_id(self, user):
         """
-        From a list of users to delete, generate a file with a trustid for each
-        user. The user is acting as the trustor, delegating in a trustee, which
-        will impersonate it to delete its resources.
+        Generate a trust id for the user. The user is acting as the trustor,
+        delegating in a trustee, which will impersonate it to delete its
+        resources.
 
-        :param users_to_delete: a list of trustors.
-        :return: this function does not return anything. It creates a file.
+        The trust id is cached by trustor and reused until it is near its
+        expiration (see trust_expiration_margin) or it is released with
+        release_trust.
+
+        :param user: the user (or the user id) of the trustor.
+        :return: the tuple (user_name, trust_id, user_id); the values are None
+          if error.
         """
-        trust_factory = TrustFactory(self.clients)
+        trust = self._get_cached_trust(user)
+        if trust:
+            return trust['result']
+
+        trust_factory = self.get_trust_factory()
         user_name = None
         trust_id = None
         user_id = None
         try:
             (user_name, trust_id, user_id) = \
                 trust_factory.create_trust_admin(user, self.trustee)
+            self._cache_trust(user, (user_name, trust_id, user_id))
 
         except Exception, e:
             msg = 'Failed getting trust-id from trustor {0}. Reason: {1}'
@@ -299,6 +320,94 @@ class UserManager(object):
 
         return (user_name, trust_id, user_id)
 
+    def _get_cached_trust(self, user):
+        """
+        It obtains the cached trust of the user, if it is still valid.
+        :param user: the user (or the user id) of the trustor.
+        :return: a dictionary with the keys result (see generate_trust_id),
+          expires and user_resources; None if there is not a valid trust.
+        """
+        key = getattr(user, 'id', user)
+        with self._trusts_lock:
+            trust = self._trusts.get(key)
+            if trust and trust['expires'] - self.trust_expiration_margin < time.time():
+                # the trust id is expired or near its expiration
+                del self._trusts[key]
+                trust = None
+        return trust
+
+    def _cache_trust(self, user, result):
+        """
+        It saves a trust just generated.
+        :param user: the user (or the user id) of the trustor.
+        :param result: the tuple (user_name, trust_id, user_id)
+        :return: nothing.
+        """
+        expires = time.time() + self.get_trust_factory().trustid_validity
+        with self._trusts_lock:
+            self._trusts[getattr(user, 'id', user)] = dict(
+                result=result, expires=expires, user_resources=None)
+
+    def release_trust(self, user):
+        """
+        It deletes the trust id of the user, if it was generated, and
+        forgets it and the UserResources object built with it.
+        :param user: the user (or the user id) of the trustor.
+        :return: nothing.
+        """
+        key = getattr(user, 'id', user)
+        with self._trusts_lock:
+            trust = self._trusts.pop(key, None)
+        if not trust:
+            return
+        try:
+            user_resources = trust['user_resources']
+            if not user_resources:
+                user_resources = UserResources(
+                    self.trustee, self.trust_password, trust_id=trust['result'][1])
+            user_resources.free_trust_id()
+        except Exception, e:
+            msg = 'Failed deleting trust-id of trustor {0}. Reason: {1}'
+            logger.error(msg.format(key, str(e)))
+
+    def release_trusts(self):
+        """
+        It deletes all the trust ids generated and cached by this object.
+        :return: nothing.
+        """
+        for key in list(self._trusts):
+            self.release_trust(key)
+
+    def get_trust_factory(self):
+        """
+        It obtains the TrustFactory used to generate the trust ids; it is
+        created only the first time.
+        :return: the TrustFactory object.
+        """
+        if self._trust_factory is None:
+            self._trust_factory = TrustFactory(self.clients)
+        return self._trust_factory
+
+    def generate_trust_ids(self, users, callback=None):
+        """
+        It generates a trust id for each user, concurrently. See
+        TrustFactory.create_trusts_admin.
+        :param users: the ids of the users (the trustors).
+        :param callback: if provided, it is called with the user id and the
+          tuple (user_name, trust_id, user_id) as soon as each trust id is
+          generated (None instead of the tuple if error).
+        :return: a list with a tuple (user_name, trust_id, user_id) for each
+          user, or None if error.
+        """
+        def save_trust(user, result):
+            if result:
+                self._cache_trust(user, result)
+            if callback:
+                callback(user, result)
+
+        return self.get_trust_factory().create_trusts_admin(
+            users, self.trustee, callback=save_trust)
+
     def change_password(self, user):
         """
         It changes the password for the user.
@@ -365,15 +474,22 @@ class UserManager(object):
 
     def _get_user_resources(self, user):
         """
-        It obtains the UserResources object for the user.
+        It obtains the UserResources object for the user. It is built with
+        the trust id of the user (see generate_trust_id) and it is reused
+        while the trust id is valid.
         :param user: the user
         :return: UserResources
         """
         user_resources = None
         (user_name, trust_id, user_id) = self.generate_trust_id(user)
         if trust_id:
+            trust = self._get_cached_trust(user)
+            if trust and trust['user_resources']:
+                return trust['user_resources']
             try:
                 user_resources = UserResources(self.trustee, self.trust_password, trust_id=trust_id)
+                if trust:
+                    trust['user_resources'] = user_resources
             except:
                 print "Problems with user {0}. Projects is not enabled".format(user.name)
         return user_resources
@@ -400,13 +516,10 @@ class UserManager(object):
         """
         user_resources = self._get_user_resources(user)
 
-        region_resources = {}
         if not user_resources:
-            return region_resources
-        for region in user_resources.regions_available:
-                user_resources.change_region(region)
-                region_resources[region] = user_resources.get_resources_dict()
-        return region_resources
+            return {}
+        return user_resources.map_regions(
+            lambda region_resources: region_resources.get_resources_dict())
 
     def get_user_resources(self, user):
         """
@@ -449,16 +562,19 @@ class UserManager(object):
         """
         user_resources = self._get_user_resources(user)
 
-        regions = user_resources.get_regions_user()
-        vms_regions = {}
-        for region in regions:
-            user_resources.change_region(region)
-            vms = user_resources.get_vms_in_dict()
-            vms_regions[region] = vms
-            stopped = user_resources.stop_tenant_vms()
+        def stop_vms_in_region(region_resources):
+            region = region_resources.clients.region
+            vms = region_resources.get_vms_in_dict()
+            stopped = region_resources.stop_tenant_vms()
             logger.info('Stopped {0} (total {1}) in Region {2}'.format(stopped, len(vms), region))
-            user_resources.unshare_images()
+            # the images in use are the same in all the regions
+            region_resources.unshare_images(detect_images=False)
             logger.info('Unshare public images of user ' + user)
+            return vms
+
+        vms_regions = user_resources.map_regions(stop_vms_in_region)
+        if vms_regions and user_resources.glance:
+            user_resources.detect_images_in_use()
         return vms_regions
 
     def detect_images_in_use(self):
@@ -489,7 +605,9 @@ class UserManager(object):
         :return: nothing.
         """
         (user_name, trust_id, user_id) = self.generate_trust_id(user)
-        user_resources = UserResources(self.trustee, self.trust_password, trust_id=trust_id)
+        user_resources = self._get_user_resources(user)
+        if not user_resources:
+            raise Exception('The resources of user {0} are not available'.format(user_id))
         report = {}
         user_resources.imagesinuse = self.detect_images_in_use()
 
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+from records import Record
+from mapstore import get_tenant_id
+
+__author__ = 'chema'
+
+"""Columnar snapshot of the resources of OpenStackMap. Each collection (vms,
+users, roles_by_user...) is saved in a file with only some fields (columns).
+The files are memory-mapped when read: opening a snapshot is immediate, the
+values are decoded only when accessed, and the pages are shared by all the
+processes reading the same snapshot.
+
+Format of a file (integers are little-endian):
+ * MAGIC
+ * the length of the header (uint32) and the header, in JSON: the number of
+   rows, the columns and their types, and the position of the sections.
+ * the string table: the offsets (uint32) of each string and the strings
+   (UTF-8). Each distinct value is stored only once (interning).
+ * a section for each column, with the index in the string table of the
+   value of each row (int32; -1 is a missing value).
+
+The columns of type 'str' keep strings; the columns of type 'json' keep any
+other value (lists, dictionaries, booleans...) encoded as JSON.
+"""
+
+MAGIC = 'SKULDCOL1\n'
+
+# A collection whose objects are dictionaries (vms, users...) is saved as a
+# table of records with a column for each field plus the key column. Other
+# collections (e.g. roles_by_user) are saved with a key and a value column.
+KEY_COLUMN = '_key'
+VALUE_COLUMN = '_value'
+
+
+def _get_type(values):
+    """Return the column type needed to keep the values"""
+    for value in values:
+        if value is not None and not isinstance(value, basestring):
+            return 'json'
+    return 'str'
+
+
+def write_table(path, rows, columns):
+    """Write a table. The file is replaced atomically.
+
+    :param path: the file path
+    :param rows: a list of dictionaries
+    :param columns: the columns to save; the other fields are discarded and
+      a missing field is saved as a missing value.
+    :return: nothing
+    """
+    strings = list()
+    string_index = dict()
+    header_columns = list()
+    column_data = list()
+    for column in columns:
+        values = list(row.get(column) for row in rows)
+        column_type = _get_type(values)
+        indexes = list()
+        for value in values:
+            if value is None:
+                indexes.append(-1)
+                continue
+            if column_type == 'json':
+                value = json.dumps(value, sort_keys=True)
+            if isinstance(value, unicode):
+                value = value.encode('utf-8')
+            if value not in string_index:
+                string_index[value] = len(strings)
+                strings.append(value)
+            indexes.append(string_index[value])
+        header_columns.append([column, column_type])
+        column_data.append(struct.pack('<%di' % len(indexes), *indexes))
+
+    offsets = [0]
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+    data = ''.join(strings)
+    # the offsets and columns are aligned to 4 bytes
+    data += '\0' * (-len(data) % 4)
+
+    header = {'rows': len(rows), 'columns': header_columns,
+              'strings': len(strings)}
+    # the positions are relative to the end of the header
+    header['offsets_start'] = 0
+    header['data_start'] = 4 * len(offsets)
+    header['columns_start'] = header['data_start'] + len(data)
+    encoded = json.dumps(header)
+    encoded += ' ' * (-(len(MAGIC) + 4 + len(encoded)) % 4)
+
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(encoded)))
+        f.write(encoded)
+        f.write(struct.pack('<%dI' % len(offsets), *offsets))
+        f.write(data)
+        for packed in column_data:
+            f.write(packed)
+    os.rename(tmp_path, path)
+
+
+class ColumnarTable(object):
+    """A table written with write_table, read using mmap"""
+
+    def __init__(self, path):
+        """Constructor. Only the header is read.
+
+        :param path: the file path
+        """
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise Exception('Invalid columnar table ' + path)
+        (length,) = struct.unpack_from('<I', self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(self._mmap[start:start + length])
+        start += length
+        self.rows = header['rows']
+        self.columns = list(name for name, column_type in header['columns'])
+        self._types = dict(header['columns'])
+        self._offsets_start = start + header['offsets_start']
+        self._data_start = start + header['data_start']
+        columns_start = start + header['columns_start']
+        self._column_start = dict(
+            (name, columns_start + 4 * self.rows * position)
+            for position, name in enumerate(self.columns))
+        # decoded strings, by index in the string table
+        self._strings = dict()
+
+    def __len__(self):
+        return self.rows
+
+    def _string(self, index):
+        """Return the string of the table with that index (decoded)"""
+        if index not in self._strings:
+            start, end = struct.unpack_from(
+                '<2I', self._mmap, self._offsets_start + 4 * index)
+            self._strings[index] = self._mmap[
+                self._data_start + start:self._data_start + end].decode(
+                'utf-8')
+        return self._strings[index]
+
+    def get(self, column, row):
+        """Return the value of a column in a row.
+
+        :param column: the column name
+        :param row: the row number
+        :return: the value, or None if it is missing
+        """
+        (index,) = struct.unpack_from(
+            '<i', self._mmap, self._column_start[column] + 4 * row)
+        if index == -1:
+            return None
+        value = self._string(index)
+        if self._types[column] == 'json':
+            return json.loads(value)
+        return value
+
+    def column(self, column):
+        """Return all the values of a column
+
+        :param column: the column name
+        :return: a list with the values
+        """
+        return list(self.get(column, row) for row in range(self.rows))
+
+    def row(self, row):
+        """Return a row as a dictionary, without the missing values
+
+        :param row: the row number
+        :return: a dictionary
+        """
+        result = dict()
+        for column in self.columns:
+            value = self.get(column, row)
+            if value is not None:
+                result[column] = value
+        return result
+
+    def close(self):
+        self._mmap.close()
+
+
+class ColumnarMap(object):
+    """A read-only dictionary with the collection saved in a table. The
+    objects are built each time they are accessed, so the changes in them
+    are not kept."""
+
+    def __init__(self, table, wrapper=dict):
+        """Constructor
+
+        :param table: a ColumnarTable written by write_collection
+        :param wrapper: the class used to build the objects from the
+          dictionaries of the rows
+        """
+        self.table = table
+        self.wrapper = wrapper
+        self._is_records = VALUE_COLUMN not in table.columns
+        self._index = None
+
+    def _get_index(self):
+        if self._index is None:
+            self._index = dict(
+                (key, row) for row, key in
+                enumerate(self.table.column(KEY_COLUMN)))
+        return self._index
+
+    def _build(self, row):
+        if not self._is_records:
+            return self.table.get(VALUE_COLUMN, row)
+        value = self.table.row(row)
+        del value[KEY_COLUMN]
+        return self.wrapper(value)
+
+    def __len__(self):
+        return len(self.table)
+
+    def __contains__(self, key):
+        return key in self._get_index()
+
+    def __getitem__(self, key):
+        return self._build(self._get_index()[key])
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return self.table.column(KEY_COLUMN)
+
+    def values(self):
+        return list(self._build(row) for row in range(len(self.table)))
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+    def __nonzero__(self):
+        return len(self) > 0
+
+
+def write_collection(path, objects, fields, extra=None):
+    """Write a collection of OpenStackMap (a dictionary) in a table.
+
+    :param path: the file path
+    :param objects: the dictionary with the objects, indexed by key
+    :param fields: if the objects are dictionaries (e.g. resources), the
+      fields to save; tenant_id is always saved with the owner of the
+      resource (see mapstore.get_tenant_id).
+    :param extra: a dictionary with fields added to all the rows (e.g. the
+      region)
+    :return: nothing
+    """
+    values = objects.values()
+    if values and isinstance(values[0], (dict, Record)):
+        rows = list()
+        for key, value in objects.items():
+            row = dict((field, value.get(field)) for field in fields)
+            row['tenant_id'] = get_tenant_id(value)
+            row[KEY_COLUMN] = key
+            if extra:
+                row.update(extra)
+            rows.append(row)
+        columns = [KEY_COLUMN, 'tenant_id'] + list(
+            field for field in fields if field != 'tenant_id')
+        if extra:
+            columns.extend(extra.keys())
+    else:
+        rows = list({KEY_COLUMN: key, VALUE_COLUMN: value}
+                    for key, value in objects.items())
+        columns = [KEY_COLUMN, VALUE_COLUMN]
+    write_table(path, rows, columns)
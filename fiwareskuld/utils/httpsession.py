@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from keystoneclient import session as keystone_session
+
+from fiwareskuld.conf import settings
+
+__author__ = 'chema'
+
+"""A requests.Session shared by all the HTTP clients of the process (the
+keystone sessions of OpenStackClients and the direct requests to PaaS and
+Horizon), so that the connections are pooled and kept alive instead of
+opening a new TCP/TLS connection for each object that uses a client.
+"""
+
+# Adapter that also enables TCP keep-alive; it is the one used by the
+# keystone sessions when they create their own requests.Session.
+_adapter_class = getattr(keystone_session, 'TCPKeepAliveAdapter', HTTPAdapter)
+
+_lock = threading.Lock()
+_http_session = None
+
+
+def create_http_session(pool_size=None, pool_hosts=None):
+    """Create a requests.Session with a pooled adapter for http and https.
+
+    :param pool_size: the connections kept alive by each host. By default,
+      settings.HTTP_POOL_SIZE. It should not be less than the threads that
+      use the session at the same time.
+    :param pool_hosts: the hosts whose pools are kept. By default,
+      settings.HTTP_POOL_HOSTS.
+    :return: a requests.Session object.
+    """
+    if pool_size is None:
+        pool_size = settings.HTTP_POOL_SIZE
+    if pool_hosts is None:
+        pool_hosts = settings.HTTP_POOL_HOSTS
+    http_session = requests.Session()
+    for scheme in ('http://', 'https://'):
+        http_session.mount(scheme, _adapter_class(
+            pool_connections=pool_hosts, pool_maxsize=pool_size))
+    return http_session
+
+
+def get_http_session():
+    """Return the requests.Session shared by the process; it is created the
+    first time.
+
+    :return: a requests.Session object.
+    """
+    global _http_session
+    with _lock:
+        if _http_session is None:
+            _http_session = create_http_session()
+        return _http_session
+
+
+def reset_http_session():
+    """Close the shared session, if any; the next call to get_http_session
+    will create a new one (e.g. after a fork, or to apply new settings).
+    """
+    global _http_session
+    with _lock:
+        if _http_session is not None:
+            _http_session.close()
+            _http_session = None
@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+import cPickle as pickle
+import os
+import sqlite3
+import tempfile
+import time
+
+from records import Record
+
+__author__ = 'chema'
+
+"""Storage backends of the OpenStackMap cache. Each store keeps the
+collections (vms, ports, users...) of a directory: a region or keystone.
+
+All the stores provide the same methods: exists, load, load_partial, save and
+get_timestamp.
+"""
+
+# Fields used to find out the owner of a resource (a volume uses its own
+# attribute, the images use owner and the users their cloud project).
+TENANT_FIELDS = ('tenant_id', 'project_id', 'os-vol-tenant-attr:tenant_id',
+                 'owner', 'cloud_project_id')
+
+
+def get_tenant_id(resource):
+    """Return the tenant owner of a resource, or None if unknown.
+
+    :param resource: a resource (dictionary)
+    :return: the tenant id or None
+    """
+    if not isinstance(resource, (dict, Record)):
+        return None
+    for field in TENANT_FIELDS:
+        if resource.get(field):
+            return resource[field]
+    return None
+
+
+def filter_objects(objects, ids=None, tenants=None):
+    """Filter a dictionary of resources by id and/or by tenant.
+
+    :param objects: a dictionary of resources indexed by id
+    :param ids: if not None, a collection with the ids to keep
+    :param tenants: if not None, a collection with the tenants to keep
+    :return: a new dictionary with the resources that match
+    """
+    if ids is not None:
+        objects = dict((key, objects[key]) for key in ids if key in objects)
+    if tenants is not None:
+        tenants = set(tenants)
+        objects = dict((key, value) for key, value in objects.items()
+                       if get_tenant_id(value) in tenants)
+    return objects
+
+
+class PickleStore(object):
+    """Store each collection in a different pickle file. This is the
+    original format of the cache."""
+
+    def __init__(self, directory):
+        """Constructor
+
+        :param directory: the directory with the pickle files
+        :return: nothing
+        """
+        self.directory = directory
+
+    def _path(self, name, extension='.pickle'):
+        """return the path of the file with the collection"""
+        return self.directory + '/' + name + extension
+
+    def _write(self, path, content):
+        """Write the content to a temporal file that then is renamed, so
+        readers never see a file partially written."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.rename(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def exists(self, name):
+        """Check if the collection is stored
+
+        :param name: the name of the collection
+        :return: True if the collection is stored
+        """
+        return os.path.exists(self._path(name))
+
+    def load(self, name):
+        """Load a whole collection
+
+        :param name: the name of the collection
+        :return: the collection (usually a dictionary indexed by id)
+        """
+        with open(self._path(name), 'rb') as f:
+            return pickle.load(f)
+
+    def get_timestamp(self, name):
+        """Return when the saved version of the collection was obtained
+
+        :param name: the name of the collection
+        :return: the time in seconds since the epoch, or None if unknown
+        """
+        try:
+            with open(self._path(name, '.timestamp')) as f:
+                return float(f.read())
+        except (IOError, ValueError):
+            return None
+
+    def load_partial(self, name, ids=None, tenants=None):
+        """Load only some resources of a collection. This format does not
+        support partial loads, so the whole file is read and then filtered.
+
+        :param name: the name of the collection
+        :param ids: if not None, a collection with the ids to load
+        :param tenants: if not None, the tenants whose resources are loaded
+        :return: a dictionary with the resources indexed by id
+        """
+        return filter_objects(self.load(name), ids, tenants)
+
+    def save(self, name, objects, timestamp=None):
+        """Save a collection, replacing the old version. The file is written
+        to a temporal file that then is renamed, so readers never see a file
+        partially written.
+
+        :param name: the name of the collection
+        :param objects: the collection (usually a dictionary indexed by id)
+        :param timestamp: when the collection was obtained (seconds since the
+          epoch). Default is now.
+        :return: nothing
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        self._write(self._path(name), pickle.dumps(objects, -1))
+        self._write(self._path(name, '.timestamp'), repr(timestamp))
+
+
+class SQLiteStore(object):
+    """Store all the collections of the directory in a single SQLite file.
+    Each resource is a row, indexed by id and by tenant, so it is possible to
+    load only some resources without reading the whole collection."""
+
+    SCHEMA_VERSION = 1
+    FILE_NAME = 'openstackmap.sqlite'
+    MAX_PARAMETERS = 400
+
+    def __init__(self, directory):
+        """Constructor. The database is not opened until it is used.
+
+        :param directory: the directory of the database file
+        :return: nothing
+        """
+        self.directory = directory
+        self.path = directory + '/' + self.FILE_NAME
+        self._checked = False
+
+    def _connect(self):
+        """Open the database, creating the schema if needed. A database
+        with a different schema version is a cache that can not be used, so
+        it is emptied.
+
+        :return: a sqlite3 connection
+        """
+        conn = sqlite3.connect(self.path)
+        conn.text_factory = str
+        if self._checked:
+            return conn
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS metadata '
+                         '(key TEXT PRIMARY KEY, value TEXT)')
+            row = conn.execute("SELECT value FROM metadata WHERE "
+                               "key = 'schema_version'").fetchone()
+            if row and int(row[0]) != self.SCHEMA_VERSION:
+                conn.execute('DROP TABLE IF EXISTS collections')
+                conn.execute('DROP TABLE IF EXISTS objects')
+            conn.execute('CREATE TABLE IF NOT EXISTS collections '
+                         '(name TEXT PRIMARY KEY, is_dict INTEGER, '
+                         'timestamp REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS objects '
+                         '(collection TEXT, position INTEGER, key BLOB, '
+                         'id TEXT, tenant_id TEXT, data BLOB, '
+                         'PRIMARY KEY (collection, position))')
+            conn.execute('CREATE INDEX IF NOT EXISTS objects_by_id ON '
+                         'objects (collection, id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS objects_by_tenant ON '
+                         'objects (collection, tenant_id)')
+            conn.execute('INSERT OR REPLACE INTO metadata VALUES '
+                         "('schema_version', ?)", (str(self.SCHEMA_VERSION),))
+        self._checked = True
+        return conn
+
+    def exists(self, name):
+        """Check if the collection is stored
+
+        :param name: the name of the collection
+        :return: True if the collection is stored
+        """
+        if not os.path.exists(self.path):
+            return False
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT 1 FROM collections WHERE name = ?',
+                               (name,)).fetchone()
+        finally:
+            conn.close()
+        return row is not None
+
+    def get_timestamp(self, name):
+        """Return when the saved version of the collection was obtained
+
+        :param name: the name of the collection
+        :return: the time in seconds since the epoch, or None if unknown
+        """
+        if not os.path.exists(self.path):
+            return None
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT timestamp FROM collections WHERE '
+                               'name = ?', (name,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return row[0]
+
+    def _query(self, name, condition='', params=()):
+        """Return the collection with the rows that match the condition
+
+        :param name: the name of the collection
+        :param condition: a SQL condition over the objects table
+        :param params: the parameters of the condition
+        :return: a dictionary or a list, as the saved collection
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT is_dict FROM collections WHERE '
+                               'name = ?', (name,)).fetchone()
+            if row is None:
+                raise Exception('Collection {0} is not in {1}'.format(
+                    name, self.path))
+            rows = conn.execute(
+                'SELECT key, data FROM objects WHERE collection = ? ' +
+                condition + ' ORDER BY position', (name,) + tuple(params))
+            if row[0]:
+                return dict((pickle.loads(str(key)), pickle.loads(str(data)))
+                            for key, data in rows)
+            else:
+                return list(pickle.loads(str(data)) for key, data in rows)
+        finally:
+            conn.close()
+
+    def load(self, name):
+        """Load a whole collection
+
+        :param name: the name of the collection
+        :return: the collection (usually a dictionary indexed by id)
+        """
+        return self._query(name)
+
+    def load_partial(self, name, ids=None, tenants=None):
+        """Load only some resources of a collection, using the indexes.
+
+        :param name: the name of the collection
+        :param ids: if not None, a collection with the ids to load
+        :param tenants: if not None, the tenants whose resources are loaded
+        :return: a dictionary with the resources indexed by id
+        """
+        # SQLite limits the number of parameters of a query
+        size = self.MAX_PARAMETERS
+        if ids is not None and len(ids) > size:
+            ids = list(ids)
+            result = dict()
+            for i in range(0, len(ids), size):
+                result.update(self.load_partial(name, ids[i:i + size], tenants))
+            return result
+        if tenants is not None and len(tenants) > size:
+            tenants = list(tenants)
+            result = dict()
+            for i in range(0, len(tenants), size):
+                result.update(self.load_partial(name, ids, tenants[i:i + size]))
+            return result
+
+        conditions = list()
+        params = list()
+        for column, values in (('id', ids), ('tenant_id', tenants)):
+            if values is None:
+                continue
+            values = list(values)
+            conditions.append('AND {0} IN ({1})'.format(
+                column, ', '.join('?' * len(values))))
+            params.extend(values)
+        return self._query(name, ' '.join(conditions), params)
+
+    def save(self, name, objects, timestamp=None):
+        """Save a collection, replacing the old version. All the rows are
+        replaced in a single transaction, so readers see either the old or
+        the new version.
+
+        :param name: the name of the collection
+        :param objects: the collection (usually a dictionary indexed by id)
+        :param timestamp: when the collection was obtained (seconds since the
+          epoch). Default is now.
+        :return: nothing
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        is_dict = isinstance(objects, dict)
+        if is_dict:
+            items = objects.iteritems()
+        else:
+            items = ((None, value) for value in objects)
+
+        def rows():
+            for position, (key, value) in enumerate(items):
+                if is_dict and isinstance(key, basestring):
+                    resource_id = key
+                else:
+                    resource_id = None
+                yield (name, position, sqlite3.Binary(pickle.dumps(key, -1)),
+                       resource_id, get_tenant_id(value),
+                       sqlite3.Binary(pickle.dumps(value, -1)))
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM objects WHERE collection = ?',
+                             (name,))
+                conn.execute('INSERT OR REPLACE INTO collections VALUES '
+                             '(?, ?, ?)', (name, int(is_dict), timestamp))
+                conn.executemany('INSERT INTO objects VALUES '
+                                 '(?, ?, ?, ?, ?, ?)', rows())
+        finally:
+            conn.close()
+
+
+# Available storage backends, by name
+STORES = {'pickle': PickleStore, 'sqlite': SQLiteStore}
@@ -29,8 +29,15 @@ from keystoneclient import session
 from keystoneclient.v2_0 import client as keystonev2
 from keystoneclient.v3 import client as keystonev3
 
+from fiwareskuld.utils.httpsession import get_http_session
+from fiwareskuld.conf import settings
+
 from importlib import import_module
+from collections import OrderedDict
+import copy
+import hashlib
 import sys
+import threading
 
 __author__ = 'chema'
 
@@ -43,6 +50,52 @@ modules_available = {
     'swift': 'swiftclient.client'
 }
 
+# Authentication plugins shared by all the OpenStackClients objects with the
+# same credential and scope (see get_auth)
+_auth_cache = OrderedDict()
+_auth_cache_lock = threading.Lock()
+
+
+def get_auth(auth_class, endpoints_to_override=(), **params):
+    """Get an authentication plugin (e.g. v3.Password). The same object is
+    returned for the same class and parameters, so the token (and its
+    catalog) obtained by an OpenStackClients object is reused by the others
+    with the same credential and scope. The plugin requests a new token when
+    the current one is near its expiration.
+
+    The overridden endpoints are applied to the catalog of the token (see
+    OpenStackClients.override_endpoint), so they are also part of the key:
+    only the objects with the same overrides share the catalog.
+
+    The last settings.AUTH_CACHE_SIZE plugins are kept.
+
+    :param auth_class: the class of the plugin
+    :param endpoints_to_override: the endpoints overridden by the object.
+    :param params: the parameters of the plugin (auth_url, username...)
+    :return: the authentication plugin
+    """
+    key = [auth_class]
+    key.append(tuple(tuple(sorted(override.items()))
+                     for override in endpoints_to_override))
+    for name in sorted(params):
+        value = params[name]
+        if name in ('password', 'token') and value:
+            # do not keep the secrets in the keys
+            if isinstance(value, unicode):
+                value = value.encode('utf-8')
+            value = hashlib.sha1(value).hexdigest()
+        key.append((name, value))
+    key = tuple(key)
+
+    with _auth_cache_lock:
+        auth = _auth_cache.pop(key, None)
+        if auth is None:
+            auth = auth_class(**params)
+        _auth_cache[key] = auth
+        while len(_auth_cache) > settings.AUTH_CACHE_SIZE:
+            _auth_cache.popitem(last=False)
+    return auth
+
 
 class OpenStackClients(object):
     """This class provides methods to obtains several openstack clients,
@@ -53,6 +106,10 @@ class OpenStackClients(object):
     call set_keystone_version
     """
 
+    # Share the authentication (and so the token) with the other objects
+    # with the same credential and scope. See get_auth.
+    cache_auth = True
+
     def __init__(self, auth_url=None, modules='auto'):
         """Constructor of the class. The Keystone URL may be provided,
         otherwise it is obtained from the environment (OS_AUTH_URL) or must
@@ -93,6 +150,12 @@ class OpenStackClients(object):
         self._saved_session_v2 = None
         self._saved_session_v3 = None
         self._token = None
+        self._catalog = None
+        self._catalog_session = None
+        self._endpoints_by_service = None
+        self._regions_by_service = None
+        self._url_by_endpoint = None
+        self._urls_by_interface = None
 
         if 'OS_USERNAME' in env:
             self.__username = env['OS_USERNAME']
@@ -190,11 +253,29 @@ class OpenStackClients(object):
     def _clear_sessions(self):
         """clear (invalidate) sessions"""
         if self._session_v2:
-            self._session_v2.invalidate()
+            self._discard_session(self._session_v2)
             self._session_v2 = None
         if self._session_v3:
-            self._session_v3.invalidate()
+            self._discard_session(self._session_v3)
             self._session_v3 = None
+        self._catalog_session = None
+
+    def _discard_session(self, session):
+        """Invalidate a session that is not used anymore. When the
+        authentication is shared with other objects (cache_auth), the token
+        is not invalidated because it is still in use.
+        :param session: the session to discard
+        :return: nothing
+        """
+        if not self.cache_auth:
+            session.invalidate()
+
+    def _get_auth(self, auth_class, **params):
+        """Get the authentication plugin; see get_auth"""
+        if self.cache_auth:
+            return get_auth(auth_class, self.endpoints_to_override, **params)
+        else:
+            return auth_class(**params)
 
     def set_credential(
             self, username=None, password=None, tenant_name=None, tenant_id=None,
@@ -297,6 +378,19 @@ class OpenStackClients(object):
         """
         self.region = region
 
+    def for_region(self, region):
+        """Return a copy of this object that works with other region. The
+        copy shares the session (and so the token) but not the region, so
+        both objects may be used at the same time (e.g. in different threads).
+        :param region: the region name
+        :return: an OpenStackClients object
+        """
+        clients = copy.copy(self)
+        clients.endpoints_to_override = list(self.endpoints_to_override)
+        clients._modules_imported = dict(self._modules_imported)
+        clients.set_region(region)
+        return clients
+
     def set_keystone_version(self, use_v3=True):
         """By default, get_session and get_keystoneclient use the version v3
         of the API. Call this method to use version v2
@@ -364,18 +458,19 @@ class OpenStackClients(object):
         elif self.__tenant_id:
             other_params['tenant_id'] = self.__tenant_id
 
-        auth = v2.Password(
+        auth = self._get_auth(
+            v2.Password,
             auth_url=auth_url,
             username=self.__username,
             password=self.__password,
             **other_params)
 
-        self._session_v2 = session.Session(auth=auth)
+        self._session_v2 = session.Session(
+            auth=auth, session=get_http_session())
 
         # apply override endpoints, if session version matches.
-        if not self.use_v3:
-            for override in self.endpoints_to_override:
-                self._apply_override_endpoint_v2(**override)
+        if not self.use_v3 and self.endpoints_to_override:
+            self.get_catalog()
 
         return self._session_v2
 
@@ -423,19 +518,19 @@ class OpenStackClients(object):
                 other_params['user_domain_name'] = self.__user_domain_name
             else:
                 other_params['user_domain_id'] = 'default'
-            auth = v3.Password(
-                auth_url=auth_url, username=self.__username,
+            auth = self._get_auth(
+                v3.Password, auth_url=auth_url, username=self.__username,
                 password=self.__password, **other_params)
         else:
-            auth = v3.Token(
-                auth_url=auth_url,
+            auth = self._get_auth(
+                v3.Token, auth_url=auth_url,
                 token=self._token)
 
-        self._session_v3 = session.Session(auth=auth)
+        self._session_v3 = session.Session(
+            auth=auth, session=get_http_session())
         # apply override endpoints
-        if self.use_v3:
-            for override in self.endpoints_to_override:
-                self._apply_override_endpoint(**override)
+        if self.use_v3 and self.endpoints_to_override:
+            self.get_catalog()
 
         return self._session_v3
 
@@ -589,7 +684,9 @@ class OpenStackClients(object):
         return keystonev3.Client(session=session)
 
     def get_catalog(self):
-        """Get the catalog from the credential
+        """Get the catalog from the credential. The catalog is parsed only
+        once for each session, applying the overridden endpoints (see
+        override_endpoint); the result is reused until the session changes.
         :return: a list of services. Each service is a dictionary with the
         following keys:
            * endpoints: the endpoints of the service. See get_endpoints
@@ -597,11 +694,66 @@ class OpenStackClients(object):
            * type: the type of the service (e.g. compute)
         """
         session = self.get_session()
+        if self._catalog_session is not session:
+            self._index_catalog(session)
+        return self._catalog
+
+    def _index_catalog(self, session):
+        """Parse the catalog of the session and build the indexes used to
+        resolve the endpoints without walking the catalog:
+          * service type -> endpoints
+          * service type -> regions
+          * (service type, region, interface) -> url
+          * (service type, interface) -> urls of all the regions
+        The overridden endpoints (see override_endpoint) are applied to the
+        catalog of the token before building the indexes of URLs, so the
+        clients that resolve their URL with session.get_endpoint (keystone,
+        nova, glance, cinder...) use them too.
+        :param session: the session
+        :return: nothing
+        """
         access = session.auth.get_access(session)
         if 'catalog' in access:
-            return access['catalog']
+            catalog = access['catalog']
         else:
-            return access['serviceCatalog']
+            catalog = access['serviceCatalog']
+        self._catalog = catalog
+        self._catalog_session = session
+
+        self._endpoints_by_service = dict()
+        for service in self._catalog:
+            self._endpoints_by_service.setdefault(
+                service['type'], service['endpoints'])
+
+        # apply override endpoints of the session version
+        for override in self.endpoints_to_override:
+            if override['service_type'] not in self._endpoints_by_service:
+                continue
+            if self.use_v3:
+                self._apply_override_endpoint(**override)
+            else:
+                self._apply_override_endpoint_v2(**override)
+
+        self._regions_by_service = dict()
+        self._url_by_endpoint = dict()
+        self._urls_by_interface = dict()
+        for service_type, endpoints in self._endpoints_by_service.items():
+            self._regions_by_service[service_type] = frozenset(
+                endpoint['region'] for endpoint in endpoints)
+            for endpoint in endpoints:
+                if 'interface' in endpoint:
+                    # v3
+                    urls = [(endpoint['interface'], endpoint['url'])]
+                else:
+                    # v2
+                    urls = list((interface, endpoint[interface + 'URL'])
+                                for interface in ('admin', 'internal', 'public')
+                                if interface + 'URL' in endpoint)
+                for (interface, url) in urls:
+                    self._url_by_endpoint.setdefault(
+                        (service_type, endpoint.get('region'), interface), url)
+                    self._urls_by_interface.setdefault(
+                        (service_type, interface), list()).append(url)
 
     def get_endpoints(self, service_type):
         """Get the endpoints for a service.
@@ -615,10 +767,10 @@ class OpenStackClients(object):
           *interface: this value usually is internal/external/admin
        interface (private, public, admin) and other fields
         """
-        for service in self.get_catalog():
-            if service['type'] == service_type:
-                return service['endpoints']
-        raise Exception('The endpoint of the service "{}" was not found.'.format(service_type))
+        self.get_catalog()
+        if service_type not in self._endpoints_by_service:
+            raise Exception('The endpoint of the service "{}" was not found.'.format(service_type))
+        return self._endpoints_by_service[service_type]
 
     def get_interface_endpoint(self, service_type, interface, region=None):
         """Get the URL of the region's public/internal/admin endpoint
@@ -630,34 +782,15 @@ class OpenStackClients(object):
 
         :return: a URL as a string
         """
-        endpoints = self.get_endpoints(service_type)
-        url = None
-        for endpoint in endpoints:
-            if 'interface' in endpoint:
-                # v3
-                if endpoint['interface'] != interface:
-                    continue
-                if not region:
-                    if url:
-                        raise Exception('A region must be specified')
-                    else:
-                        url = endpoint['url']
-                else:
-                    if endpoint['region'] == region:
-                        url = endpoint['url']
-                        break
-            else:
-                # v2
-                if not region:
-                    if url:
-                        raise Exception('A region must be specified')
-                    else:
-                        if interface == 'admin':
-                            url = endpoint['adminURL']
-                        elif interface == 'internal':
-                            url = endpoint['internalURL']
-                        else:
-                            url = endpoint['publicURL']
+        # check that the service exists
+        self.get_endpoints(service_type)
+        if region:
+            url = self._url_by_endpoint.get((service_type, region, interface))
+        else:
+            urls = self._urls_by_interface.get((service_type, interface), [])
+            if len(urls) > 1:
+                raise Exception('A region must be specified')
+            url = urls[0] if urls else None
 
         if not url:
             raise Exception('endpoint not found')
@@ -721,16 +854,21 @@ class OpenStackClients(object):
 
         The overrides are saved to be applied each time a new session is
         created. If a session already exists, the changes are also applied now.
+        Be aware that the session (and its catalog) is shared with the copies
+        created with for_region.
 
         Be aware that override endpoint only works when the session version
         match with self.use_v3."""
         endpoint = dict(service_type=service_type, region=region,
                         interface=interface, url=url)
+        if endpoint in self.endpoints_to_override:
+            # already applied
+            return
         self.endpoints_to_override.append(endpoint)
-        if self._session_v3 and self.use_v3:
-            self._apply_override_endpoint(**endpoint)
-        elif self._session_v2 and not self.use_v3:
-            self._apply_override_endpoint_v2(**endpoint)
+        # the catalog is parsed again, applying all the overrides
+        self._catalog_session = None
+        if (self.use_v3 and self._session_v3) or (not self.use_v3 and self._session_v2):
+            self.get_catalog()
 
     def get_regions(self, service_type):
         """Return a set of regions with endpoints in this service
@@ -738,10 +876,8 @@ class OpenStackClients(object):
         :param service_type: the service type (e.g. compute, network...)
         :return: a list of regions
         """
-        regions = set()
-        for endpoint in self.get_endpoints(service_type):
-            regions.add(endpoint['region'])
-        return regions
+        self.get_endpoints(service_type)
+        return set(self._regions_by_service[service_type])
 
     def get_token(self):
         """Get the token, useful if you connect with a no standard service
@@ -794,9 +930,9 @@ class OpenStackClients(object):
             self._session_v3 = tmp_v3
         else:
             if self._session_v2 and self._session_v2 != self._saved_session_v2:
-                self._session_v2.invalidate()
+                self._discard_session(self._session_v2)
             if self._session_v3 and self._session_v3 != self._saved_session_v3:
-                self._session_v3.invalidate()
+                self._discard_session(self._session_v3)
             self._session_v2 = self._saved_session_v2
             self._session_v3 = self._saved_session_v3
 
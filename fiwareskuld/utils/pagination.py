@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+import logging
+
+from fiwareskuld.conf import settings
+
+__author__ = 'chema'
+
+"""Iterators over big Keystone collections (users, projects, role
+assignments). Instead of a single request returning the whole collection,
+the elements are requested in pages of KEYSTONE_PAGE_SIZE elements, using the
+limit and marker parameters; the caller can process each element as soon as
+its page arrives, without keeping the whole collection in memory.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def iterate_pages(list_function, page_size=None, **filters):
+    """Iterate over the elements of a collection requested by pages. The
+    marker of each page is the id of the last element of the previous one.
+
+    If the server ignores the limit parameter, the first page is the whole
+    collection. If it ignores the marker (the same page is returned again),
+    the whole collection is requested and the elements not already returned
+    are produced.
+
+    :param list_function: the method that lists the collection (e.g.
+      keystone.users.list); it receives the filters and limit and marker.
+    :param page_size: the elements of each page. By default,
+      settings.KEYSTONE_PAGE_SIZE. With 0, the collection is requested at
+      once.
+    :param filters: other parameters of list_function.
+    :return: an iterator over the elements.
+    """
+    if page_size is None:
+        page_size = settings.KEYSTONE_PAGE_SIZE
+    if not page_size:
+        for element in list_function(**filters):
+            yield element
+        return
+
+    marker = None
+    first_page_ids = None
+    while True:
+        params = dict(filters)
+        params['limit'] = page_size
+        if marker:
+            params['marker'] = marker
+        page = list_function(**params)
+        if not page:
+            return
+
+        if first_page_ids is None:
+            first_page_ids = set(element.id for element in page)
+        elif page[0].id in first_page_ids:
+            logger.warning('The server does not support the marker parameter;'
+                           ' requesting the whole collection')
+            for element in list_function(**filters):
+                if element.id not in first_page_ids:
+                    yield element
+            return
+
+        for element in page:
+            yield element
+
+        # a shorter page is the last one. A longer one means that the server
+        # ignores limit and returns the whole collection.
+        if len(page) != page_size:
+            return
+        marker = page[-1].id
+
+
+def iterate_users(keystone, page_size=None, **filters):
+    """Iterate over the users, requested by pages.
+
+    :param keystone: a keystone v3 client
+    :param page_size: see iterate_pages
+    :param filters: filters of keystone.users.list
+    :return: an iterator over the users
+    """
+    return iterate_pages(keystone.users.list, page_size, **filters)
+
+
+def iterate_projects(keystone, page_size=None, **filters):
+    """Iterate over the projects, requested by pages.
+
+    :param keystone: a keystone v3 client
+    :param page_size: see iterate_pages
+    :param filters: filters of keystone.projects.list
+    :return: an iterator over the projects
+    """
+    return iterate_pages(keystone.projects.list, page_size, **filters)
+
+
+def iterate_role_assignments(keystone, page_size=None, **filters):
+    """Iterate over the role assignments. Keystone does not paginate the role
+    assignments and they have not an id to use as marker, so when paging is
+    enabled and no role is specified, the assignments are requested role by
+    role; the memory used is limited by the role with more users instead of
+    by the whole collection.
+
+    :param keystone: a keystone v3 client
+    :param page_size: see iterate_pages; only used to decide if requesting
+      the assignments role by role.
+    :param filters: filters of keystone.role_assignments.list
+    :return: an iterator over the role assignments
+    """
+    if page_size is None:
+        page_size = settings.KEYSTONE_PAGE_SIZE
+    if not page_size or filters.get('role'):
+        for assignment in keystone.role_assignments.list(**filters):
+            yield assignment
+        return
+
+    for role in keystone.roles.list():
+        for assignment in keystone.role_assignments.list(role=role.id,
+                                                         **filters):
+            yield assignment
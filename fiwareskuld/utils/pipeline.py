@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+import json
+import logging
+import os
+import threading
+import time
+
+from fiwareskuld.utils.workers import run_concurrently
+
+__author__ = 'chema'
+
+"""A runner of phases (e.g. generate the lists of users, stop their VMs,
+delete their resources...) that records in a durable checkpoint which phases
+and which items (usually users) of each phase are completed. When the
+process is interrupted and run again, the work already done is skipped.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStore(object):
+    """A durable record of the completed phases and items. It is a file with
+    a JSON object per line; each line is written and synced as soon as an
+    item is completed, so a crash loses at most the items in progress.
+
+    Each completed item may have a value (anything that can be serialised to
+    JSON), e.g. the trust id generated for a user.
+    """
+
+    def __init__(self, path):
+        """Constructor. The completed items recorded in the file, if it
+        exists, are loaded.
+        :param path: the path of the file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._completed = dict()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a line truncated by a crash
+                        continue
+                    self._completed.setdefault(record['phase'], dict())[
+                        record['item']] = record.get('value')
+        self._file = None
+
+    def is_done(self, phase, item=None):
+        """Check if an item of a phase (or the whole phase) is completed.
+        :param phase: the name of the phase
+        :param item: the item; None to check the whole phase.
+        :return: True if completed.
+        """
+        with self._lock:
+            return item in self._completed.get(phase, dict())
+
+    def get(self, phase):
+        """Return the completed items of the phase.
+        :param phase: the name of the phase
+        :return: a dictionary item -> value
+        """
+        with self._lock:
+            items = dict(self._completed.get(phase, dict()))
+        items.pop(None, None)
+        return items
+
+    def mark_done(self, phase, item=None, value=None):
+        """Record that an item of a phase (or the whole phase) is completed.
+        It is safe to call this method from several threads.
+        :param phase: the name of the phase
+        :param item: the item; None for the whole phase.
+        :param value: an optional value to save with the item.
+        :return: nothing
+        """
+        line = json.dumps({'phase': phase, 'item': item, 'value': value})
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a')
+            self._file.write(line + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._completed.setdefault(phase, dict())[item] = value
+
+    def close(self):
+        """Close the file"""
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def remove(self):
+        """Remove the checkpoint (e.g. when all the phases are completed), so
+        the next run starts from the beginning.
+        :return: nothing
+        """
+        self.close()
+        with self._lock:
+            self._completed = dict()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class PipelineRunner(object):
+    """Run phases, skipping the phases and the items already completed
+    according to a CheckpointStore."""
+
+    def __init__(self, checkpoint):
+        """Constructor.
+        :param checkpoint: a CheckpointStore object
+        """
+        self.checkpoint = checkpoint
+        # (phase, item) not completed in this invocation; item is None for
+        # a whole phase
+        self.incomplete = list()
+
+    def run_phase(self, phase, function):
+        """Run a phase that is not divided in items, unless it is already
+        completed. The phase is marked as completed only if the function
+        does not raise an exception.
+        :param phase: the name of the phase
+        :param function: the function that implements the phase, without
+          parameters.
+        :return: True if the phase was run, False if skipped.
+        """
+        if self.checkpoint.is_done(phase):
+            logger.info('Skipping phase {0}: already completed'.format(phase))
+            return False
+        logger.info('Running phase ' + phase)
+        start = time.time()
+        function()
+        self.checkpoint.mark_done(phase)
+        logger.info('Phase {0} completed in {1:.1f} seconds'.format(
+            phase, time.time() - start))
+        return True
+
+    def run_items(self, phase, items, function, max_workers=1):
+        """Run function(item) for each item not completed in the phase. The
+        items are processed concurrently (see run_concurrently) and each one
+        is marked as completed, with the value returned by the function, as
+        soon as it finishes. An item whose function raises an exception is
+        not marked (it is added to incomplete), so it is processed again in
+        the next run.
+        :param phase: the name of the phase
+        :param items: the items (e.g. user ids)
+        :param function: the function to call with each item
+        :param max_workers: the items processed simultaneously
+        :return: a dictionary item -> value with all the completed items of
+          the phase (also those of previous runs).
+        """
+        items = list(items)
+        pending = list(item for item in items
+                       if not self.checkpoint.is_done(phase, item))
+        msg = 'Running phase {0}: {1} items ({2} already completed)'
+        logger.info(msg.format(phase, len(pending), len(items) - len(pending)))
+
+        def run_item(item):
+            value = function(item)
+            self.checkpoint.mark_done(phase, item, value)
+            return value
+
+        run_concurrently(run_item, pending, max_workers,
+                         'Phase ' + phase + ': {0} completed ({1}/{2})',
+                         logger)
+        self.incomplete.extend((phase, item) for item in pending
+                               if not self.checkpoint.is_done(phase, item))
+        return self.checkpoint.get(phase)
+
+    def run_overlapped(self, phases):
+        """Run several independent phases (see run_phase) at the same time.
+        An error in a phase is logged and the phase is not marked (it is
+        added to incomplete), but it does not stop the others.
+        :param phases: a list of tuples (phase name, function)
+        :return: nothing
+        """
+        run_concurrently(lambda phase: self.run_phase(*phase), phases,
+                         len(phases), logger=logger)
+        self.incomplete.extend((phase, None) for (phase, function) in phases
+                               if not self.checkpoint.is_done(phase))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+import re
+
+__author__ = 'chema'
+
+"""Compact records for the resources of OpenStackMap. A record keeps only
+some fields of a resource, in __slots__, so it uses much less memory than a
+dictionary with all the fields returned by the API. The fields are available
+both as attributes (port.device_id) and as items (port['device_id']).
+"""
+
+# The record classes already created, by resource type and fields
+_record_classes = dict()
+
+
+class Record(object):
+    """Base class of the records. The subclasses define __slots__ and
+    _keys (the original name of each slot; the names that are not valid
+    identifiers, as os-vol-tenant-attr:tenant_id, are converted). A field
+    not present in the resource is not set, so 'field' in record is False and
+    record.field raises AttributeError, as with a dictionary."""
+
+    __slots__ = ()
+    _keys = dict()
+
+    def __init__(self, resource=dict()):
+        """Constructor
+
+        :param resource: a dictionary; the fields not in the record are
+          discarded.
+        """
+        for key, slot in self._keys.items():
+            if key in resource:
+                setattr(self, slot, resource[key])
+
+    def _slot(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return self._keys[key]
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self._slot(key))
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        setattr(self, self._slot(key), value)
+
+    def __contains__(self, key):
+        return key in self._keys and hasattr(self, self._keys[key])
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def keys(self):
+        return list(key for key in self._keys if key in self)
+
+    def values(self):
+        return list(self[key] for key in self.keys())
+
+    def items(self):
+        return list((key, self[key]) for key in self.keys())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        return isinstance(other, (dict, Record)) and \
+            dict(self.items()) == dict(other.items())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def to_dict(self):
+        """Return a dictionary with the fields of the record"""
+        return dict(self.items())
+
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__, self.to_dict())
+
+
+def record_class(resource_type, fields):
+    """Return the record class for a type of resources. The class is created
+    the first time and reused after.
+
+    :param resource_type: the type of resource (vms, ports...), used to name
+      the class.
+    :param fields: the fields kept by the records.
+    :return: a subclass of Record
+    """
+    fields = tuple(fields)
+    if (resource_type, fields) not in _record_classes:
+        keys = dict((field, re.sub(r'\W', '_', field)) for field in fields)
+        name = 'Record_' + re.sub(r'\W', '_', resource_type)
+        _record_classes[(resource_type, fields)] = type(
+            name, (Record,), {'__slots__': tuple(set(keys.values())),
+                              '_keys': keys})
+    return _record_classes[(resource_type, fields)]
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+import random
+import time
+
+__author__ = 'chema'
+
+
+def wait_until(condition, timeout, initial_delay=1, max_delay=30,
+               backoff=2, jitter=0):
+    """Wait until condition() returns True or the deadline is reached.
+
+    The condition is evaluated immediately, so there is no pause at all when
+    it is already satisfied, and then after each pause; the pauses start at
+    initial_delay seconds and grow multiplying by backoff, up to max_delay.
+    The last pause is truncated to not exceed the deadline.
+
+    :param condition: a callable without parameters returning a boolean
+    :param timeout: maximum number of seconds to wait
+    :param initial_delay: seconds of the first pause
+    :param max_delay: upper bound of each pause
+    :param backoff: factor applied to the pause after each evaluation
+    :param jitter: fraction of each pause that is randomly added or
+      subtracted, to avoid concurrent waiters checking at the same time
+    :return: True if the condition was met, False if the deadline expired.
+    """
+    deadline = time.time() + timeout
+    delay = initial_delay
+    while not condition():
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        pause = min(delay, max_delay)
+        if jitter:
+            pause *= 1 + random.uniform(-jitter, jitter)
+        time.sleep(min(pause, remaining))
+        delay *= backoff
+    return True
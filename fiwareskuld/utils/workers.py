@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+from multiprocessing.pool import ThreadPool
+import logging
+import threading
+
+__author__ = 'chema'
+
+
+def run_concurrently(function, items, max_workers=1, description=None,
+                     logger=None):
+    """
+    Invoke function(item) for each item, using a bounded pool of threads.
+    This is useful with operations that spend most of the time waiting the
+    answer of the OpenStack servers (e.g. freeing the resources of a list of
+    users).
+
+    An exception raised by an invocation is logged and does not affect the
+    other items; the result of that item is None.
+
+    :param function: the function to call; it receives an item as parameter.
+    :param items: a list with the items to process.
+    :param max_workers: the maximum number of simultaneous invocations. If it
+      is 1 (or less), the items are processed sequentially in the calling
+      thread.
+    :param description: if provided, a progress message is logged each time
+      an item is completed. It is formatted with the item, the number of items
+      completed and the total, e.g. 'Freed resources of {0} ({1}/{2})'
+    :param logger: the logger to use; by default the logger of this module.
+    :return: a list with the results, in the same order than items.
+    """
+    if not logger:
+        logger = logging.getLogger(__name__)
+
+    items = list(items)
+    total = len(items)
+    results = [None] * total
+    progress = {'count': 0}
+    lock = threading.Lock()
+
+    def invoke(index):
+        item = items[index]
+        try:
+            results[index] = function(item)
+        except Exception, e:
+            msg = 'Processing {0} failed. Cause: {1}'
+            logger.error(msg.format(item, str(e)))
+        with lock:
+            progress['count'] += 1
+            count = progress['count']
+        if description:
+            logger.info(description.format(item, count, total))
+
+    if max_workers <= 1 or total <= 1:
+        for index in range(total):
+            invoke(index)
+        return results
+
+    pool = ThreadPool(min(max_workers, total))
+    try:
+        # map blocks until all the items are processed; invoke never raises
+        pool.map(invoke, range(total), chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return results
@@ -50,7 +50,7 @@ class TestClassifyResources(unittest.TestCase):
     def testConstructorBasic(self, mock):
         """check constructor without parameters"""
         classify = ClassifyResources('/fakedir')
-        mock.assert_called_with('/fakedir', objects_strategy=mock.USE_CACHE_OBJECTS)
+        mock.assert_called_with('/fakedir', objects_strategy=mock.USE_CACHE_OBJECTS, lazy_load=True)
 
         self.assertFalse(mock.return_value.preload_regions.called)
         self.assertTrue(mock.return_value.filters.values.called)
@@ -61,7 +61,7 @@ class TestClassifyResources(unittest.TestCase):
     def testConstructorOfflineMode(self, mock):
         """check constructor with offline_mode=True"""
         classify = ClassifyResources('/fakedir', offline_mode=True)
-        mock.assert_called_with('/fakedir', objects_strategy=mock.USE_CACHE_OBJECTS_ONLY)
+        mock.assert_called_with('/fakedir', objects_strategy=mock.USE_CACHE_OBJECTS_ONLY, lazy_load=True)
         self.assertFalse(mock.return_value.preload_regions.called)
         self.assertTrue(mock.return_value.filters.values.called)
         self.assertTrue(mock.return_value.users.values.called)
@@ -76,6 +76,15 @@ class TestClassifyResources(unittest.TestCase):
         self.assertTrue(mock.return_value.users.values.called)
         self.assertTrue(mock.return_value.tenants.keys.called)
 
+    @patch('fiwareskuld.scripts.classify_resources_by_owners.OpenStackMap', auto_spec=True)
+    def testConstructorSnapshot(self, mock):
+        """check constructor with a columnar snapshot"""
+        classify = ClassifyResources('/fakedir', snapshot_dir='/fakesnapshot')
+        mock.assert_called_with('/fakedir', objects_strategy=mock.USE_CACHE_OBJECTS_ONLY, auto_load=False)
+        mock.return_value.load_snapshot.assert_called_once_with('/fakesnapshot')
+        self.assertFalse(mock.return_value.preload_regions.called)
+        self.assertTrue(mock.return_value.users.values.called)
+
     def init_filters(self, mock):
         """Method to configure in the mock the filters by region"""
         filters = list()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from fiwareskuld.utils.columnar import ColumnarMap, ColumnarTable, write_collection, write_table
+
+__author__ = 'chema'
+
+ROWS = [
+    {'id': 'p1', 'tenant_id': 't1', 'fixed_ips': [{'subnet_id': 's1'}]},
+    {'id': 'p2', 'tenant_id': 't2', 'admin_state_up': True},
+    {'id': 'p3', 'tenant_id': u't1', 'name': u'espa\xf1a'}]
+
+
+class TestColumnarTable(TestCase):
+    def setUp(self):
+        """write a table with some ports"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'ports.columns')
+        write_table(self.path, ROWS, ['id', 'tenant_id', 'fixed_ips', 'name'])
+        self.table = ColumnarTable(self.path)
+
+    def tearDown(self):
+        self.table.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_read(self):
+        """test reading the values of the columns"""
+        self.assertEquals(len(self.table), 3)
+        self.assertEquals(self.table.columns, ['id', 'tenant_id', 'fixed_ips', 'name'])
+        self.assertEquals(self.table.column('id'), ['p1', 'p2', 'p3'])
+        self.assertEquals(self.table.get('fixed_ips', 0), [{'subnet_id': 's1'}])
+        self.assertEquals(self.table.get('name', 2), u'espa\xf1a')
+
+    def test_missing_values(self):
+        """test that missing values and columns not saved are not returned"""
+        self.assertEquals(self.table.row(1), {'id': 'p2', 'tenant_id': 't2'})
+        self.assertEquals(self.table.get('fixed_ips', 2), None)
+
+    def test_interning(self):
+        """test that each distinct value is stored once"""
+        with open(self.path, 'rb') as f:
+            self.assertEquals(f.read().count('t1'), 1)
+        self.assertTrue(self.table.get('tenant_id', 0) is self.table.get('tenant_id', 2))
+
+    def test_empty_table(self):
+        """test a table without rows"""
+        path = os.path.join(self.tmpdir, 'empty.columns')
+        write_table(path, [], ['id'])
+        table = ColumnarTable(path)
+        self.assertEquals(len(table), 0)
+        self.assertEquals(table.column('id'), [])
+        table.close()
+
+    def test_invalid_file(self):
+        """test that a file with other format is rejected"""
+        path = os.path.join(self.tmpdir, 'invalid.columns')
+        with open(path, 'wb') as f:
+            f.write('not a columnar table')
+        with self.assertRaises(Exception):
+            ColumnarTable(path)
+
+
+class TestColumnarMap(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_resources(self):
+        """test a collection of resources"""
+        path = os.path.join(self.tmpdir, 'images.columns')
+        images = {'i1': {'id': 'i1', 'owner': 't1', 'size': 3}, 'i2': {'id': 'i2', 'owner': 't2'}}
+        write_collection(path, images, ['id', 'owner'], {'region': 'region1'})
+        objects = ColumnarMap(ColumnarTable(path))
+        self.assertEquals(len(objects), 2)
+        self.assertTrue('i1' in objects)
+        self.assertFalse('i3' in objects)
+        self.assertEquals(objects['i1'], {'id': 'i1', 'owner': 't1', 'tenant_id': 't1', 'region': 'region1'})
+        self.assertEquals(sorted(objects.keys()), ['i1', 'i2'])
+        self.assertEquals(objects.get('i3'), None)
+
+    def test_values(self):
+        """test a collection whose values are not resources"""
+        path = os.path.join(self.tmpdir, 'roles_by_user.columns')
+        write_collection(path, {'u1': [['r1', 'p1']], 'u2': []}, None)
+        objects = ColumnarMap(ColumnarTable(path))
+        self.assertEquals(objects['u1'], [['r1', 'p1']])
+        self.assertEquals(dict(objects.items()), {'u1': [['r1', 'p1']], 'u2': []})
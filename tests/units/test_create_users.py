@@ -25,7 +25,7 @@
 from unittest import TestCase
 import requests_mock
 from fiwareskuld.users_management import UserManager
-from mock import patch
+from mock import MagicMock, patch
 
 from test_openstackmap import MySessionMock
 from os import environ as environ
@@ -110,6 +110,31 @@ class TestCreateUsers(TestCase):
         name, trustid, id = createusers.generate_trust_id("user_trial1")
         self.assertEquals(trustid, "trustid")
 
+    @patch('fiwareskuld.utils.osclients.session', mock_session)
+    def testTrustIdCache(self, m):
+        """It tests that the trust id of a user is reused until it is
+        released or near its expiration"""
+        createusers = UserManager()
+        factory = createusers.get_trust_factory()
+        factory.create_trust_admin = MagicMock(side_effect=lambda user, trustee: ('name', 'trust_' + user, user))
+        self.assertEquals(createusers.generate_trust_id('user1'), ('name', 'trust_user1', 'user1'))
+        createusers.generate_trust_id('user1')
+        self.assertEquals(factory.create_trust_admin.call_count, 1)
+
+        with patch('fiwareskuld.users_management.UserResources') as user_resources:
+            self.assertTrue(createusers._get_user_resources('user1') is createusers._get_user_resources('user1'))
+            self.assertEquals(user_resources.call_count, 1)
+            createusers.release_trust('user1')
+            user_resources.return_value.free_trust_id.assert_called_once_with()
+
+        createusers.generate_trust_id('user1')
+        self.assertEquals(factory.create_trust_admin.call_count, 2)
+
+        # a trust near its expiration is not reused
+        createusers.trust_expiration_margin = factory.trustid_validity + 1
+        createusers.generate_trust_id('user1')
+        self.assertEquals(factory.create_trust_admin.call_count, 3)
+
     @patch('fiwareskuld.utils.osclients.session', mock_session)
     def testChangeToBasicUser(self, m):
 
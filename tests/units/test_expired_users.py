@@ -23,11 +23,11 @@
 
 
 from unittest import TestCase
-from datetime import datetime
+from datetime import datetime, date
 import requests_mock
-from fiwareskuld.expired_users import ExpiredUsers
+from fiwareskuld.expired_users import ExpiredUsers, parse_date
 from fiwareskuld.users_management import UserManager
-from mock import patch
+from mock import MagicMock, patch
 from test_openstackmap import MySessionMock
 from os import environ as environ
 
@@ -162,3 +162,69 @@ class TestExpiredUsers(TestCase):
 
         result = expiredusers.get_users()
         self.assertEqual(len(result), 4)
+
+    @patch('fiwareskuld.utils.osclients.session', mock_session)
+    def test_roles_by_user(self, m):
+        """Test that the roles of all the users are obtained with a single
+        request of roles and of role assignments"""
+        expiredusers = ExpiredUsers('any tenant id', 'any username', 'any password')
+        keystone = MagicMock()
+        expiredusers.keystoneclient = keystone
+        keystone.roles.list.return_value = [MagicMock(id='t_id'), MagicMock(id='c_id')]
+        keystone.roles.list.return_value[0].name = 'trial'
+        keystone.roles.list.return_value[1].name = 'community'
+        keystone.role_assignments.list.return_value = [
+            MagicMock(user={'id': 'u1'}, role={'id': 't_id'}),
+            MagicMock(user={'id': 'u2'}, role={'id': 'c_id'}),
+            MagicMock(user=None, role={'id': 'c_id'})]
+        users = [MagicMock(id='u1', trial_started_at='2015-01-01', spec=['id', 'trial_started_at', 'name']),
+                 MagicMock(id='u2', community_started_at='2015-01-01',
+                           spec=['id', 'community_started_at', 'name']),
+                 MagicMock(id='u3')]
+        yellow, red = expiredusers._get_red_yellow(users)
+
+        self.assertEqual(expiredusers.get_roles_by_user(), {'u1': ['trial'], 'u2': ['community']})
+        self.assertEqual(list(user.id for user in red), ['u1', 'u2'])
+        self.assertEqual(yellow, [])
+        keystone.roles.list.assert_called_once_with()
+        keystone.role_assignments.list.assert_called_once_with()
+
+    @patch('fiwareskuld.utils.osclients.session', mock_session)
+    def test_classify_users(self, m):
+        """Test the classification of the users by remaining days"""
+        expiredusers = ExpiredUsers('any tenant id', 'any username', 'any password')
+        expiredusers.get_roles_by_user = MagicMock(return_value={
+            'u1': ['trial'], 'u2': ['trial'], 'u3': ['community'], 'u4': ['basic'], 'u5': ['trial']})
+        trial_fields = ['id', 'trial_started_at', 'trial_duration']
+        users = [MagicMock(id='u1', trial_started_at='2016-01-01', trial_duration=10, spec=trial_fields),
+                 MagicMock(id='u2', trial_started_at='2016-01-30', spec=['id', 'trial_started_at']),
+                 MagicMock(id='u3', community_started_at='2015-03-01', spec=['id', 'community_started_at']),
+                 MagicMock(id='u4'),
+                 MagicMock(id='u5', trial_started_at=None, spec=['id', 'trial_started_at'])]
+        expiredusers.TRIAL_MAX_NUMBER_OF_DAYS = 14
+        expiredusers.COMMUNITY_MAX_NUMBER_OF_DAYS = 365
+        red, yellow, green, remaining = expiredusers.classify_users(users, date(2016, 2, 1))
+
+        self.assertEqual(list(user.id for user in red), ['u1'])
+        self.assertEqual(list(user.id for user in yellow), ['u3'])
+        self.assertEqual(list(user.id for user in green), ['u2'])
+        self.assertEqual(remaining, {'u1': -21, 'u2': 12, 'u3': 28})
+
+    @patch('fiwareskuld.utils.osclients.session', mock_session)
+    def test_get_yellow_red_users_by_role(self, m):
+        """Test that the trial and community users are obtained in a single request"""
+        expiredusers = ExpiredUsers('any tenant id', 'any username', 'any password')
+        expiredusers.get_roles_by_user = MagicMock(return_value={
+            'u1': ['trial', 'community'], 'u2': ['community'], 'u3': ['basic']})
+        expiredusers._get_red_yellow = MagicMock(side_effect=lambda users: (users, []))
+        users = [MagicMock(id='u1'), MagicMock(id='u2'), MagicMock(id='u3'), MagicMock(id='u4')]
+        with patch('fiwareskuld.expired_users.iterate_users', return_value=iter(users)) as iterate:
+            result = expiredusers.get_yellow_red_users_by_role()
+
+        self.assertEqual(iterate.call_count, 1)
+        self.assertEqual(result, {'trial': ([users[0]], []), 'community': ([users[1]], [])})
+
+    def test_parse_date(self, m):
+        """Test that the dates are parsed only once"""
+        self.assertEqual(parse_date('2016-02-25'), date(2016, 2, 25))
+        self.assertTrue(parse_date('2016-02-25') is parse_date('2016-02-25'))
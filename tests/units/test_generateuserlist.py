@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+from importlib import import_module
+import os
+import shutil
+import sys
+import tempfile
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from fiwareskuld.conf import settings
+
+# the phase scripts are not a package: they import each other as modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'fiwareskuld', 'phase'))
+phase0 = import_module('phase0_generateuserlist')
+
+__author__ = 'chema'
+
+
+class TestUsersExpired(TestCase):
+    """class for testing the lists of users generated by phase0"""
+
+    def setUp(self):
+        """create a temporal working directory and the object with mocks"""
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+        for name in ('osclients', 'ExpiredUsers'):
+            patcher = patch.object(phase0, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.users_expired = phase0.UsersExpired()
+
+    def tearDown(self):
+        """restore the working directory and remove the temporal one"""
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def get_users(self, *ids):
+        """return mocks of users"""
+        return list(MagicMock(id=user_id, spec=['id', 'name']) for user_id in ids)
+
+    @patch.object(settings, 'STOP_BEFORE_DELETE', 2)
+    def test_stop_before_delete(self):
+        """test that the list of users to stop is rotated until it becomes the
+        list of phase3, keeping only the users that are still basic"""
+        expiredusers = self.users_expired.expiredusers
+        expiredusers.get_basic_users_ids.return_value = set(['u1'])
+        self.users_expired._save_lists([], self.get_users('u1', 'u2'), 'trial', cron_daily=True)
+        self.assertFalse(os.path.exists('trial_users_to_delete_phase3.txt'))
+
+        self.users_expired._save_lists([], self.get_users('u3'), 'trial', cron_daily=True)
+        self.users_expired._save_lists([], [], 'trial', cron_daily=True)
+        with open('trial_users_to_delete_phase3.txt') as f:
+            self.assertEquals(f.read(), 'u1\n')
+        with open('trial_users_to_delete.txt.001') as f:
+            self.assertEquals(f.read(), 'u3\n')
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+from unittest import TestCase
+
+from mock import patch
+
+from fiwareskuld.utils.httpsession import create_http_session, get_http_session, reset_http_session
+from fiwareskuld.utils.osclients import OpenStackClients
+
+__author__ = 'chema'
+
+
+class TestHttpSession(TestCase):
+    def setUp(self):
+        reset_http_session()
+        self.addCleanup(reset_http_session)
+
+    def test_create_http_session(self):
+        """test that the http and https adapters are pooled"""
+        http_session = create_http_session(pool_size=5, pool_hosts=3)
+        for scheme in ('http://', 'https://'):
+            adapter = http_session.get_adapter(scheme + 'host')
+            self.assertEqual(adapter._pool_maxsize, 5)
+            self.assertEqual(adapter._pool_connections, 3)
+
+    def test_get_http_session_shared(self):
+        """test that the same session is returned until it is reset"""
+        http_session = get_http_session()
+        self.assertTrue(get_http_session() is http_session)
+        reset_http_session()
+        self.assertFalse(get_http_session() is http_session)
+
+    @patch('fiwareskuld.utils.osclients.session')
+    def test_osclients_share_session(self, mock_session):
+        """test that the keystone sessions of different clients use the
+        shared requests session"""
+        for i in range(2):
+            clients = OpenStackClients('http://cloud.host.fi-ware.org:4731/v3')
+            clients.set_credential('user', 'password', tenant_name='tenant')
+            clients.get_session()
+        for call in mock_session.Session.call_args_list:
+            self.assertTrue(call[1]['session'] is get_http_session())
+        self.assertEqual(mock_session.Session.call_count, 2)
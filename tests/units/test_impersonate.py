@@ -217,3 +217,31 @@ class TestTrustFactory(unittest.TestCase):
         from fiwareskuld.impersonate import TRUSTID_VALIDITY
 
         self.assertEqual(TRUSTID_VALIDITY, 36000)
+
+    def test_create_trusts_admin(self):
+        """check that the trustee and the trustors are requested only once
+        and that a trust is created for each trustor"""
+        resp = MagicMock()
+        body_response = {'trust': {'id': 'generatedtrustid'}}
+        trustors = list(MagicMock(id='trustor{0}'.format(i), cloud_project_id='tenant{0}'.format(i))
+                        for i in range(5))
+        config = {
+            'trusts.client.post.return_value': (resp, body_response),
+            'users.list.return_value': trustors + [MagicMock(id='other')],
+            'users.find.return_value': MagicMock(id='trustee_id')
+        }
+        self.trustfactory.keystone.configure_mock(**config)
+        callback = MagicMock()
+        trustor_ids = list(trustor.id for trustor in trustors)
+
+        results = self.trustfactory.create_trusts_admin(
+            trustor_ids, 'trustee_name', max_workers=3, callback=callback)
+
+        for (result, trustor) in zip(results, trustors):
+            self.assertCreateResult(result, trustor)
+        self.assertEquals(self.trustfactory.keystone.trusts.client.post.call_count, 5)
+        self.trustfactory.keystone.users.find.assert_called_once_with(name='trustee_name')
+        self.trustfactory.keystone.users.list.assert_called_once_with()
+        self.assertFalse(self.trustfactory.keystone.users.get.called)
+        self.assertEquals(callback.call_count, 5)
+        callback.assert_any_call('trustor3', results[3])
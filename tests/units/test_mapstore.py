@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import TestCase
+
+from fiwareskuld.utils.mapstore import PickleStore, SQLiteStore, get_tenant_id
+
+__author__ = 'chema'
+
+PORTS = {
+    'p1': {'id': 'p1', 'tenant_id': 't1'},
+    'p2': {'id': 'p2', 'tenant_id': 't2'},
+    'p3': {'id': 'p3', 'tenant_id': 't1'}}
+
+
+class TestPickleStore(TestCase):
+    """class for testing PickleStore"""
+
+    store_class = PickleStore
+
+    def setUp(self):
+        """create a temporal directory for the store"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = self.store_class(self.tmpdir)
+
+    def tearDown(self):
+        """remove the temporal directory"""
+        shutil.rmtree(self.tmpdir)
+
+    def test_save_and_load(self):
+        """check that a collection is the same after saving and loading it"""
+        self.assertFalse(self.store.exists('ports'))
+        self.store.save('ports', PORTS)
+        self.assertTrue(self.store.exists('ports'))
+        self.assertEquals(self.store.load('ports'), PORTS)
+
+    def test_save_list(self):
+        """check that list collections keep the order"""
+        roles_a = [{'role': 'r2'}, {'role': 'r1'}]
+        self.store.save('roles_a', roles_a)
+        self.assertEquals(self.store.load('roles_a'), roles_a)
+
+    def test_save_replaces(self):
+        """check that saving a collection replaces the old version"""
+        self.store.save('ports', PORTS)
+        self.store.save('ports', {'p4': {'id': 'p4', 'tenant_id': 't4'}})
+        self.assertEquals(self.store.load('ports').keys(), ['p4'])
+        temporal = list(f for f in os.listdir(self.tmpdir) if f.endswith('.tmp'))
+        self.assertEquals(temporal, [])
+
+    def test_timestamp(self):
+        """check that the time when the collection was obtained is saved"""
+        self.assertIsNone(self.store.get_timestamp('ports'))
+        self.store.save('ports', PORTS, 1000.5)
+        self.assertEquals(self.store.get_timestamp('ports'), 1000.5)
+
+    def test_load_partial_by_id(self):
+        """check loading only some ids"""
+        self.store.save('ports', PORTS)
+        result = self.store.load_partial('ports', ids=['p2', 'p5'])
+        self.assertEquals(result, {'p2': PORTS['p2']})
+
+    def test_load_partial_by_tenant(self):
+        """check loading only the resources of some tenants"""
+        self.store.save('ports', PORTS)
+        result = self.store.load_partial('ports', tenants=['t1'])
+        self.assertEquals(sorted(result.keys()), ['p1', 'p3'])
+
+
+class TestSQLiteStore(TestPickleStore):
+    """class for testing SQLiteStore. It runs also the tests of
+    TestPickleStore"""
+
+    store_class = SQLiteStore
+
+    def test_single_file(self):
+        """check that all the collections are in the same file"""
+        self.store.save('ports', PORTS)
+        self.store.save('networks', {'n1': {'id': 'n1', 'tenant_id': 't1'}})
+        self.assertEquals(os.listdir(self.tmpdir), [SQLiteStore.FILE_NAME])
+
+    def test_load_partial_many_ids(self):
+        """check a partial load with more ids than parameters allowed in a
+        query"""
+        ports = dict(('p' + str(i), {'tenant_id': 't' + str(i % 3)})
+                     for i in range(1000))
+        self.store.save('ports', ports)
+        ids = list('p' + str(i) for i in range(0, 1000, 2))
+        result = self.store.load_partial('ports', ids=ids, tenants=['t0'])
+        self.assertEquals(len(result), 167)
+
+    def test_schema_version_changed(self):
+        """check that a database with another schema version is emptied"""
+        self.store.save('ports', PORTS)
+        conn = sqlite3.connect(self.store.path)
+        with conn:
+            conn.execute("UPDATE metadata SET value = '0' WHERE "
+                         "key = 'schema_version'")
+        conn.close()
+        store = SQLiteStore(self.tmpdir)
+        self.assertFalse(store.exists('ports'))
+        store.save('ports', PORTS)
+        self.assertEquals(store.load('ports'), PORTS)
+
+
+class TestGetTenantId(TestCase):
+    """class for testing get_tenant_id"""
+
+    def test_get_tenant_id(self):
+        """check the different fields that identify the owner"""
+        self.assertEquals(get_tenant_id({'tenant_id': 't1'}), 't1')
+        self.assertEquals(get_tenant_id({'owner': 't2'}), 't2')
+        self.assertEquals(
+            get_tenant_id({'os-vol-tenant-attr:tenant_id': 't3'}), 't3')
+        self.assertIsNone(get_tenant_id({'name': 'n'}))
+        self.assertIsNone(get_tenant_id([('role', 'user')]))
@@ -23,7 +23,8 @@
 # contact with opensource@tid.es
 #
 import unittest
-from mock import MagicMock
+from mock import MagicMock, patch
+from novaclient.exceptions import NotFound
 
 from fiwareskuld.nova_resources import NovaResources
 
@@ -86,6 +87,14 @@ class TestNovaResources(unittest.TestCase):
         self.assertEquals(result[3][1], 'userid')
         self.assertEquals(result[3][2], 'OTHER')
 
+    def test_get_tenant_vms_already_listed(self):
+        """test get_tenant_vms method with a list of servers already
+        obtained. Check that servers are not listed again"""
+        vms = self.prepare_vms(MagicMock())
+        result = self.nova_resources.get_tenant_vms(vms)
+        self.assertEquals(len(result), 4)
+        self.assertFalse(self.nova_resources.novaclient.servers.list.called)
+
     def test_stop_tenant_vms(self):
         """test stop_tenant_vms. If checks that the stop method of the mock
         is called for all the VMs in ACTIVE state"""
@@ -100,7 +109,46 @@ class TestNovaResources(unittest.TestCase):
         """Check that the delete method of each VM is invoked"""
         config = {'servers.list.return_value': []}
         self.nova_resources.novaclient.configure_mock(**config)
-        self.nova_resources.delete_tenant_vms()
+        self.assertTrue(self.nova_resources.delete_tenant_vms())
+
+    @patch('fiwareskuld.utils.wait.time')
+    def test_delete_tenant_vms_single_wait(self, mock_time):
+        """Check that all the VMs are deleted before waiting and that only a
+        servers list is requested for each check, whatever the number of VMs
+        """
+        mock_time.time.return_value = 0
+        vms = self.prepare_vms(self.nova_resources.novaclient)
+        self.nova_resources.novaclient.servers.list.side_effect = [
+            vms, vms[1:], vms[3:], []]
+        self.assertTrue(self.nova_resources.delete_tenant_vms())
+        for vm in vms:
+            vm.delete.assert_called_once_with()
+        self.assertEquals(
+            self.nova_resources.novaclient.servers.list.call_count, 4)
+        pauses = [c[0][0] for c in mock_time.sleep.call_args_list]
+        self.assertEquals(pauses, [1, 2])
+
+    @patch('fiwareskuld.utils.wait.time')
+    def test_delete_tenant_vms_already_deleted(self, mock_time):
+        """Check that a VM already deleted (e.g. by its blueprint instance)
+        does not stop the deletion of the others"""
+        mock_time.time.return_value = 0
+        vms = self.prepare_vms(MagicMock())
+        vms[0].delete.side_effect = NotFound(404)
+        self.nova_resources.novaclient.servers.list.return_value = []
+        self.assertTrue(self.nova_resources.delete_tenant_vms(vms))
+        for vm in vms:
+            vm.delete.assert_called_once_with()
+
+    @patch('fiwareskuld.utils.wait.time')
+    def test_wait_for_vms_deleted_timeout(self, mock_time):
+        """Check that the wait finishes when the deadline expires"""
+        mock_time.time.side_effect = [0, 1, 3, 7, 15, 31]
+        self.prepare_vms(self.nova_resources.novaclient)
+        result = self.nova_resources.wait_for_vms_deleted([0, 1], timeout=20)
+        self.assertFalse(result)
+        pauses = [c[0][0] for c in mock_time.sleep.call_args_list]
+        self.assertEquals(pauses, [1, 2, 4, 5])
 
     def prepare_keypairs(self, mock):
         """create mock to check operatios with keypairs"""
@@ -30,7 +30,9 @@ from mock import patch, MagicMock
 from collections import defaultdict
 from requests import Response
 from httplib import OK, NOT_FOUND
+import shutil
 import tempfile
+import time
 import cPickle as pickle
 from tests_constants import UNIT_TEST_RESOURCES_FOLDER, LIST_SERVERS_RESPONSE_FILE, LIST_VOLUMES_RESPONSE_FILE, \
     LIST_SNAPSHOTS_RESPONSE_FILE, LIST_ROLES_RESPONSE_FILE, LIST_BACKUPS_RESPONSE_FILE, LIST_USERS_RESPONSE_FILE, \
@@ -41,6 +43,7 @@ from tests_constants import UNIT_TEST_RESOURCES_FOLDER, LIST_SERVERS_RESPONSE_FI
     LIST_ROLES_ID_BASIC_RESPONSE_FILE, GET_TRUST_RESPONSE_FILE
 
 from fiwareskuld.openstackmap import OpenStackMap
+from fiwareskuld.utils.mapstore import SQLiteStore, PickleStore
 
 OS_TENANT_ID = 'user_trial1'
 OS_TENANT_ID2 = 'user_trial2'
@@ -454,6 +457,68 @@ class TestOpenstackMapCacheOnly(TestCase):
             data = getattr(self.map, resource)
             self.assertTrue(data)
 
+    def test_load_all_parallel(self):
+        """test the load_all method using several workers"""
+        self.map.load_workers = 3
+        self.map.load_all()
+        for resource in OpenStackMap.resources_region + self.keystone_objects:
+            data = getattr(self.map, resource)
+            self.assertTrue(data)
+
+    def test_load_all_compact_records(self):
+        """test the load_all method using compact records"""
+        with open(self.tmpdir + '/region1/ports.pickle', 'wb') as f:
+            pickle.dump({'p1': {'id': 'p1', 'tenant_id': 't1', 'binding:profile': {}}}, f, protocol=-1)
+        self.map.compact_records = True
+        self.map.load_all()
+        self.assertEquals(self.map.ports['p1'].tenant_id, 't1')
+        self.assertEquals(self.map.ports['p1']['id'], 'p1')
+        self.assertFalse('binding:profile' in self.map.ports['p1'])
+        self.assertEquals(self.map.get_objects('ports', tenants=['t1']).keys(), ['p1'])
+        # the resources without compact fields use the wrapper
+        self.assertTrue(self.map.roles)
+
+    def test_snapshot(self):
+        """test exporting and loading a columnar snapshot"""
+        self.map.vms = {'v1': {'id': 'v1', 'tenant_id': 't1', 'status': 'ACTIVE', 'flavor': {'id': 'f1'}}}
+        self.map.users = {'u1': {'id': 'u1', 'name': 'user1', 'cloud_project_id': 't1', 'email': 'a@b.c'}}
+        self.map.roles_by_user = {'u1': [('r1', 't1')]}
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshot_dir)
+        self.map.export_snapshot(snapshot_dir, regions=['region1'])
+        self.assertEquals(sorted(os.listdir(snapshot_dir)), ['keystone', 'region1'])
+
+        osmap = OpenStackMap(
+            self.tmpdir, region='region1', auto_load=False, objects_strategy=OpenStackMap.USE_CACHE_OBJECTS_ONLY)
+        osmap.load_snapshot(snapshot_dir)
+        self.assertEquals(osmap.vms['v1'], {'id': 'v1', 'tenant_id': 't1', 'status': 'ACTIVE', 'region': 'region1'})
+        self.assertEquals(osmap.users['u1'].cloud_project_id, 't1')
+        self.assertFalse('email' in osmap.users['u1'])
+        self.assertEquals(osmap.roles_by_user['u1'][0][0], 'r1')
+        self.assertTrue(osmap.region_map['region1']['vms'])
+        self.assertFalse(osmap.networks)
+
+    def test_lazy_load(self):
+        """test that only the resources accessed are loaded"""
+        osmap = OpenStackMap(
+            self.tmpdir, region='region1', lazy_load=True, objects_strategy=OpenStackMap.USE_CACHE_OBJECTS_ONLY)
+        self.assertFalse('vms' in osmap.__dict__)
+        self.assertTrue(osmap.ports)
+        self.assertTrue(osmap.users)
+        self.assertFalse('vms' in osmap.__dict__)
+        self.assertFalse('routers' in osmap.__dict__)
+        with self.assertRaises(AttributeError):
+            osmap.unknown_resource
+
+    def test_lazy_load_region2(self):
+        """test that the resources not available in the region are empty"""
+        osmap = OpenStackMap(
+            self.tmpdir, region='region1', lazy_load=True, objects_strategy=OpenStackMap.USE_CACHE_OBJECTS_ONLY)
+        osmap.change_region('region2')
+        self.assertTrue(osmap.vms)
+        self.assertFalse(osmap.networks)
+        self.assertFalse(osmap.floatingips_by_ip)
+
     def test_load_nova_region2(self):
         """test the load_nova in region2"""
         self.map.change_region('region2', False)
@@ -478,3 +543,263 @@ class TestOpenstackMapCacheOnly(TestCase):
         self.map.preload_regions()
         self.assertEquals(len(self.map.region_map), 2)
         self.assertTrue(self.map.region_map['region2']['vms'])
+
+    def test_preload_regions_current_region(self):
+        """test that the last region is the current one after the preload"""
+        self.map.preload_regions(['region1', 'region2'])
+        self.assertEquals(self.map.osclients.region, 'region2')
+        self.assertEquals(self.map.vms, self.map.region_map['region2']['vms'])
+        self.assertFalse(self.map.networks)
+        self.assertTrue(self.map.region_map['region1']['networks'])
+
+    def test_preload_regions_failed_region(self):
+        """test that the failure of a region does not affect the others"""
+        with open(self.tmpdir + '/region2/vms.pickle', 'wb') as f:
+            f.write('corrupted')
+        self.map.preload_regions(['region1', 'region2'])
+        self.assertEquals(self.map.region_map.keys(), ['region1'])
+
+
+class TestOpenstackMapSQLite(TestCase):
+    """test the partial loads of the cache using the sqlite storage"""
+
+    def setUp(self):
+        """Create a sqlite cache with users and ports"""
+        self.tmpdir = tempfile.mkdtemp()
+        os.mkdir(self.tmpdir + os.path.sep + 'keystone')
+        os.mkdir(self.tmpdir + os.path.sep + 'region1')
+        users = {'u1': {'id': 'u1', 'cloud_project_id': 't1'},
+                 'u2': {'id': 'u2', 'cloud_project_id': 't2'}}
+        SQLiteStore(self.tmpdir + '/keystone').save('users', users)
+        ports = {'p1': {'id': 'p1', 'tenant_id': 't1'},
+                 'p2': {'id': 'p2', 'tenant_id': 't2'}}
+        SQLiteStore(self.tmpdir + '/region1').save('ports', ports)
+        self.map = OpenStackMap(
+            self.tmpdir, region='region1', auto_load=False, objects_strategy=OpenStackMap.USE_CACHE_OBJECTS_ONLY,
+            storage='sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_storage_by_instance(self):
+        """test that the storage of an object does not change the others"""
+        self.assertTrue(isinstance(self.map.region_store, SQLiteStore))
+        self.assertEquals(OpenStackMap.storage, 'pickle')
+        other_map = OpenStackMap(
+            self.tmpdir, region='region1', auto_load=False, objects_strategy=OpenStackMap.USE_CACHE_OBJECTS_ONLY)
+        self.assertFalse(isinstance(other_map.region_store, SQLiteStore))
+
+    def test_get_objects(self):
+        """test that only the requested resources are loaded"""
+        users = self.map.get_objects('users', ids=['u2'])
+        self.assertEquals(users.keys(), ['u2'])
+        self.assertEquals(users['u2'].cloud_project_id, 't2')
+        ports = self.map.get_objects('ports', tenants=['t1'])
+        self.assertEquals(ports.keys(), ['p1'])
+        # the maps are not loaded
+        self.assertFalse(self.map.users)
+        self.assertFalse(self.map.ports)
+
+    def test_get_objects_loaded(self):
+        """test that the resources already loaded are filtered in memory"""
+        self.map.load_neutron = MagicMock()
+        self.map.ports = {'p3': {'id': 'p3', 'tenant_id': 't1'}}
+        ports = self.map.get_objects('ports', tenants=['t1'])
+        self.assertEquals(ports.keys(), ['p3'])
+        self.assertFalse(self.map.load_neutron.called)
+
+    def test_get_objects_loaded_empty(self):
+        """test that an empty resource already loaded is not loaded again"""
+        self.map = OpenStackMap(
+            self.tmpdir, region='region1', objects_strategy=OpenStackMap.USE_CACHE_OBJECTS_ONLY,
+            lazy_load=True, storage='sqlite')
+        self.map.load_neutron = MagicMock()
+        self.map.routers = {}
+        self.assertEquals(self.map.get_objects('routers'), {})
+        self.assertFalse(self.map.load_neutron.called)
+
+    def test_get_objects_not_cached(self):
+        """test that the resources not cached are loaded"""
+        with self.assertRaises(Exception):
+            self.map.get_objects('routers')
+
+
+class TestOpenstackMapDeltaRefresh(TestCase):
+    """test the strategy DELTA_REFRESH_OBJECTS"""
+
+    def setUp(self):
+        """Create a cache with vms and networks and a map with mocked
+        clients"""
+        self.tmpdir = tempfile.mkdtemp()
+        os.mkdir(self.tmpdir + os.path.sep + 'keystone')
+        os.mkdir(self.tmpdir + os.path.sep + 'region1')
+        self.store = PickleStore(self.tmpdir + '/region1')
+        self.timestamp = time.time() - 100
+        vms = {'v1': {'id': 'v1', 'status': 'ACTIVE'},
+               'v2': {'id': 'v2', 'status': 'ACTIVE'}}
+        self.store.save('vms', vms, self.timestamp)
+        for name in ('networks', 'subnets', 'routers', 'floatingips', 'security_groups', 'ports'):
+            self.store.save(name, {name + '1': {'id': name + '1'}, name + '2': {'id': name + '2'}}, self.timestamp)
+        self.map = OpenStackMap(
+            self.tmpdir, region='region1', auto_load=False, objects_strategy=OpenStackMap.DELTA_REFRESH_OBJECTS)
+        self.map.osclients = MagicMock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_refresh_nova(self):
+        """test that only the changes are requested and merged"""
+        nova = self.map.osclients.get_novaclient.return_value
+        changed = MagicMock(id='v3', status='ACTIVE')
+        changed.to_dict.return_value = {'id': 'v3', 'status': 'ACTIVE'}
+        nova.servers.list.return_value = [MagicMock(id='v2', status='DELETED'), changed]
+        self.map.load_nova()
+        search_opts = nova.servers.list.call_args[1]['search_opts']
+        self.assertTrue('changes-since' in search_opts)
+        self.assertEquals(sorted(self.map.vms.keys()), ['v1', 'v3'])
+        self.assertEquals(sorted(self.store.load('vms').keys()), ['v1', 'v3'])
+        self.assertTrue(self.store.get_timestamp('vms') > self.timestamp)
+
+    def test_refresh_nova_old_cache(self):
+        """test that all the vms are obtained if the cache is too old"""
+        self.store.save('vms', dict(), time.time() - OpenStackMap.delta_max_age - 1)
+        nova = self.map.osclients.get_novaclient.return_value
+        nova.servers.list.return_value = []
+        self.map.load_nova()
+        nova.servers.list.assert_called_once_with(search_opts={'all_tenants': 1})
+
+    def test_refresh_neutron(self):
+        """test that changes are merged and deleted resources removed"""
+        neutron = self.map.osclients.get_neutronclient.return_value
+        neutron.list_extensions.return_value = {'extensions': [{'alias': 'timestamp_core'}]}
+
+        def list_ports(**kwargs):
+            if 'changed_since' in kwargs:
+                return {'ports': [{'id': 'ports2', 'name': 'new'}, {'id': 'ports3'}]}
+            return {'ports': [{'id': 'ports2'}, {'id': 'ports3'}]}
+        neutron.list_ports.side_effect = list_ports
+        self.map.load_neutron()
+        self.assertEquals(sorted(self.map.ports.keys()), ['ports2', 'ports3'])
+        self.assertEquals(self.map.ports['ports2']['name'], 'new')
+        self.assertFalse(neutron.list_ports.call_args_list[0][1].get('fields'))
+
+    def test_refresh_neutron_without_timestamps(self):
+        """test that all the resources are obtained if neutron does not
+        support filtering by time"""
+        neutron = self.map.osclients.get_neutronclient.return_value
+        neutron.list_extensions.return_value = {'extensions': []}
+        neutron.list_ports.return_value = {'ports': [{'id': 'ports5'}]}
+        self.map.load_neutron()
+        neutron.list_ports.assert_called_once_with()
+        self.assertEquals(self.map.ports.keys(), ['ports5'])
+
+
+class TestOpenstackMapParallelLoad(TestCase):
+    """test the load of the map using several workers"""
+
+    def setUp(self):
+        """Create a map with mocked clients"""
+        self.map = OpenStackMap(
+            region='region1', auto_load=False, objects_strategy=OpenStackMap.NO_CACHE_OBJECTS)
+        self.map.load_workers = 4
+        self.map.osclients = MagicMock()
+
+    def test_load_neutron(self):
+        """test that all the neutron resources are obtained"""
+        neutron = self.map.osclients.get_neutronclient.return_value
+        for name in ('networks', 'subnets', 'routers', 'security_groups', 'floatingips', 'ports'):
+            method = getattr(neutron, 'list_' + name)
+            method.return_value = {name: [{'id': name + '1'}]}
+        self.map.load_neutron()
+        self.assertEquals(self.map.networks.keys(), ['networks1'])
+        self.assertEquals(self.map.security_groups.keys(), ['security_groups1'])
+        self.assertEquals(self.map.ports.keys(), ['ports1'])
+
+    def test_load_cinder(self):
+        """test that the volumes, snapshots and backups are obtained"""
+        cinder = self.map.osclients.get_cinderclientv1.return_value
+        cinder.volumes.list.return_value = [MagicMock(id='vol1')]
+        cinder.volume_snapshots.list.return_value = [MagicMock(id='snap1')]
+        cinder.backups.list.return_value = []
+        self.map.load_cinder()
+        self.assertEquals(self.map.volumes.keys(), ['vol1'])
+        self.assertEquals(self.map.volume_snapshots.keys(), ['snap1'])
+        self.assertFalse(self.map.volume_backups)
+        cinder.backups.list.assert_called_once_with(search_opts={'all_tenants': 1})
+
+    def test_lazy_load(self):
+        """test that the service is loaded when a resource is accessed"""
+        self.map = OpenStackMap(
+            region='region1', lazy_load=True, objects_strategy=OpenStackMap.NO_CACHE_OBJECTS)
+        self.map.osclients = MagicMock()
+        self.map.osclients.region = 'region1'
+        self.map.osclients.get_regions.return_value = set(['region1'])
+        neutron = self.map.osclients.get_neutronclient.return_value
+        for name in ('networks', 'subnets', 'routers', 'security_groups', 'floatingips', 'ports'):
+            method = getattr(neutron, 'list_' + name)
+            method.return_value = {name: [{'id': name + '1'}]}
+        self.assertEquals(self.map.routers.keys(), ['routers1'])
+        self.assertEquals(self.map.ports.keys(), ['ports1'])
+        neutron.list_ports.assert_called_once_with()
+        self.assertFalse(self.map.osclients.get_novaclient.called)
+
+    def test_load_neutron_failed(self):
+        """test that the error of a call is raised"""
+        neutron = self.map.osclients.get_neutronclient.return_value
+        neutron.list_routers.side_effect = Exception('unavailable')
+        with self.assertRaises(Exception):
+            self.map.load_neutron()
+
+
+class TestOpenstackMapIndexes(TestCase):
+    """test the secondary indexes of the resources"""
+
+    def setUp(self):
+        """Create a cache with ports and vms"""
+        self.tmpdir = tempfile.mkdtemp()
+        os.mkdir(self.tmpdir + os.path.sep + 'keystone')
+        os.mkdir(self.tmpdir + os.path.sep + 'region1')
+        self.store = PickleStore(self.tmpdir + '/region1')
+        self.store.save('vms', {
+            'v1': {'id': 'v1', 'tenant_id': 't1', 'image': {'id': 'i1'}},
+            'v2': {'id': 'v2', 'tenant_id': 't2', 'image': ''}}, 1000)
+        ports = {
+            'p1': {'id': 'p1', 'tenant_id': 't1', 'device_id': 'r1', 'device_owner': 'network:router_interface'},
+            'p2': {'id': 'p2', 'tenant_id': 't1', 'device_id': 'v1', 'device_owner': 'compute:nova'},
+            'p3': {'id': 'p3', 'tenant_id': 't2', 'device_id': 'r1', 'device_owner': 'network:router_gateway'}}
+        for name in ('networks', 'subnets', 'routers', 'floatingips', 'security_groups'):
+            self.store.save(name, dict(), 1000)
+        self.store.save('ports', ports, 1000)
+        self.map = OpenStackMap(
+            self.tmpdir, region='region1', auto_load=False, objects_strategy=OpenStackMap.USE_CACHE_OBJECTS)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_build_indexes(self):
+        """test the indexes built at loading the resources"""
+        self.map.load_nova()
+        self.map.load_neutron()
+        self.assertEquals(self.map.vms_by_image, {'i1': ['v1']})
+        self.assertEquals(sorted(self.map.ports_by_tenant['t1']), ['p1', 'p2'])
+        self.assertEquals(sorted(self.map.ports_by_device['r1']), ['p1', 'p3'])
+        self.assertEquals(self.map.ports_by_device_owner['compute:nova'], ['p2'])
+        self.assertEquals(self.map.get_tenant_resources('vms', 't2').keys(), ['v2'])
+        self.assertEquals(self.map.get_tenant_resources('vms', 't3'), {})
+
+    def test_saved_indexes(self):
+        """test that the indexes are saved and loaded with the cache"""
+        self.map.load_neutron()
+        self.assertEquals(self.store.load('ports_by_tenant'), self.map.ports_by_tenant)
+        self.assertEquals(self.store.get_timestamp('ports_by_tenant'), 1000)
+        self.store.save('ports_by_tenant', {'t5': ['p5']}, 1000)
+        osmap = OpenStackMap(
+            self.tmpdir, region='region1', lazy_load=True, objects_strategy=OpenStackMap.USE_CACHE_OBJECTS)
+        self.assertEquals(osmap.ports_by_tenant, {'t5': ['p5']})
+        self.assertFalse('ports' in osmap.__dict__)
+
+    def test_outdated_indexes(self):
+        """test that an index older than the resources is built again"""
+        self.store.save('ports_by_tenant', {'t5': ['p5']}, 900)
+        self.map.load_neutron()
+        self.assertEquals(sorted(self.map.ports_by_tenant.keys()), ['t1', 't2'])
@@ -33,6 +33,9 @@ import novaclient.v2.client
 import glanceclient.v1.client
 import keystoneclient.v2_0.client
 import keystoneclient.session
+from keystoneclient import access
+from keystoneclient.auth.identity import v3
+import copy
 
 from swiftclient.client import Connection
 from collections import defaultdict
@@ -496,3 +499,187 @@ class TestOSClientsOverrideEndpoint(TestCase):
 
         # check again
         self.assertOverrideEndpoint()
+
+
+@patch('fiwareskuld.utils.osclients.session')
+class TestOSClientsAuthCache(TestCase):
+    """Class to test the reuse of the authentication and the catalog"""
+
+    def setUp(self):
+        d = defaultdict(list)
+        d['catalog'].append(service)
+        self.access = d
+        self.auth_url = 'http://cloud.lab.fi-ware.org:4731/v3'
+
+    def get_clients(self, tenant_name='tenant'):
+        clients = OpenStackClients(self.auth_url)
+        clients.set_credential('user', 'password', tenant_name=tenant_name)
+        return clients
+
+    def test_auth_shared(self, mock):
+        """test that the objects with the same credential and scope share the
+        authentication"""
+        clients1 = self.get_clients()
+        clients2 = self.get_clients()
+        clients3 = self.get_clients('other tenant')
+        clients1.get_session()
+        clients2.get_session()
+        clients3.get_session()
+        auth1, auth2, auth3 = list(call[1]['auth'] for call in mock.Session.call_args_list)
+        self.assertTrue(auth1 is auth2)
+        self.assertFalse(auth1 is auth3)
+
+    def test_auth_not_shared(self, mock):
+        """test that the authentication is not shared without cache_auth"""
+        clients1 = self.get_clients()
+        clients2 = self.get_clients()
+        clients1.cache_auth = clients2.cache_auth = False
+        clients1.get_session()
+        clients2.get_session()
+        auth1, auth2 = list(call[1]['auth'] for call in mock.Session.call_args_list)
+        self.assertFalse(auth1 is auth2)
+
+    def test_catalog_parsed_once(self, mock):
+        """test that the catalog and the endpoint lookups are reused while the
+        session does not change"""
+        config = {'Session.return_value.auth.get_access.return_value': self.access}
+        mock.configure_mock(**config)
+        get_access = mock.Session.return_value.auth.get_access
+        clients = self.get_clients()
+        for i in range(3):
+            self.assertEquals(clients.get_admin_endpoint('object-store', 'Spain2'), 'http://172.0.0.1:8080')
+            self.assertEquals(clients.get_regions('object-store'), set(['Spain2']))
+        self.assertEquals(get_access.call_count, 1)
+
+        # a new session parses the catalog again
+        clients.set_credential('user', 'password', tenant_name='other tenant')
+        clients.get_catalog()
+        self.assertEquals(get_access.call_count, 2)
+
+    def test_override_applied_to_token_catalog(self, mock):
+        """test that the override is applied to the catalog of the token, so
+        the clients that use session.get_endpoint see it too"""
+        config = {'Session.return_value.auth.get_access.return_value': self.access}
+        mock.configure_mock(**config)
+        clients = self.get_clients()
+        clients.get_session()
+        try:
+            clients.override_endpoint('object-store', 'Spain2', 'admin', 'http://fake.org:9090')
+            self.assertEquals(clients.get_admin_endpoint('object-store', 'Spain2'), 'http://fake.org:9090')
+            self.assertEquals(service['endpoints'][1]['url'], 'http://fake.org:9090')
+        finally:
+            service['endpoints'][1]['url'] = 'http://172.0.0.1:8080'
+
+    def test_auth_not_shared_with_other_overrides(self, mock):
+        """test that the objects with different overrides do not share the
+        authentication (and so the catalog of the token)"""
+        clients1 = self.get_clients()
+        clients2 = self.get_clients()
+        clients2.override_endpoint('object-store', 'Spain2', 'admin', 'http://fake.org:9090')
+        clients1.get_session()
+        clients2.get_session()
+        auth1, auth2 = list(call[1]['auth'] for call in mock.Session.call_args_list)
+        self.assertFalse(auth1 is auth2)
+
+
+class TestOSClientsCatalogIndex(TestCase):
+    """Class to test the resolution of endpoints with the indexed catalog"""
+
+    def setUp(self):
+        compute = {u'type': u'compute', u'endpoints': [
+            {u'url': u'http://spain2:8774', u'interface': u'public', u'region': u'Spain2'},
+            {u'url': u'http://spain2-admin:8774', u'interface': u'admin', u'region': u'Spain2'},
+            {u'url': u'http://lannion:8774', u'interface': u'public', u'region': u'Lannion2'}]}
+        identity = {u'type': u'identity', u'endpoints': [
+            {u'url': u'http://keystone:5000', u'interface': u'public', u'region': u'Spain2'}]}
+        self.osclients = OpenStackClients()
+        self.osclients._session_v3 = MagicMock()
+        self.osclients._session_v3.auth.get_access.return_value = {'catalog': [compute, identity]}
+
+    def test_get_interface_endpoint(self):
+        """test the resolution of endpoints by service, region and interface"""
+        self.assertEquals(self.osclients.get_public_endpoint('compute', 'Lannion2'), 'http://lannion:8774')
+        self.assertEquals(self.osclients.get_admin_endpoint('compute', 'Spain2'), 'http://spain2-admin:8774')
+        self.assertEquals(self.osclients.get_public_endpoint('identity'), 'http://keystone:5000')
+        self.assertEquals(self.osclients.get_regions('compute'), set(['Spain2', 'Lannion2']))
+
+    def test_get_interface_endpoint_errors(self):
+        """test the errors resolving endpoints"""
+        self.assertRaises(Exception, self.osclients.get_public_endpoint, 'compute')
+        self.assertRaises(Exception, self.osclients.get_admin_endpoint, 'compute', 'Lannion2')
+        self.assertRaises(Exception, self.osclients.get_public_endpoint, 'network', 'Spain2')
+
+    def test_override_endpoint_indexed(self):
+        """test that the overrides are merged into the index"""
+        self.assertEquals(self.osclients.get_public_endpoint('compute', 'Spain2'), 'http://spain2:8774')
+        self.osclients.override_endpoint('compute', 'Spain2', 'public', 'http://tunnel:8774')
+        self.osclients.override_endpoint('network', 'Spain2', 'public', 'http://tunnel:9696')
+        self.assertEquals(self.osclients.get_public_endpoint('compute', 'Spain2'), 'http://tunnel:8774')
+        self.assertEquals(self.osclients.get_public_endpoint('compute', 'Lannion2'), 'http://lannion:8774')
+
+    def test_for_region(self):
+        """test that the copy for other region shares the session (and so the
+        catalog of the token) but not the region nor the list of overrides"""
+        clients = self.osclients.for_region('Lannion2')
+        clients.override_endpoint('compute', 'Lannion2', 'public', 'http://tunnel:8774')
+        self.assertEquals(clients.region, 'Lannion2')
+        self.assertEquals(self.osclients.region, 'Spain2')
+        self.assertTrue(clients.get_session() is self.osclients.get_session())
+        self.assertEquals(clients.get_public_endpoint('compute', 'Lannion2'), 'http://tunnel:8774')
+        self.assertEquals(self.osclients.endpoints_to_override, [])
+
+    def test_get_interface_endpoint_v2(self):
+        """test the resolution of endpoints of a v2 catalog"""
+        self.osclients.use_v3 = False
+        self.osclients._session_v2 = MagicMock()
+        self.osclients._session_v2.auth.get_access.return_value = {'serviceCatalog': [
+            {u'type': u'compute', u'endpoints': [
+                {u'region': u'Spain2', u'publicURL': u'http://spain2:8774', u'adminURL': u'http://admin:8774'}]}]}
+        self.assertEquals(self.osclients.get_admin_endpoint('compute', 'Spain2'), 'http://admin:8774')
+        self.assertEquals(self.osclients.get_public_endpoint('compute'), 'http://spain2:8774')
+        self.assertRaises(Exception, self.osclients.get_internal_endpoint, 'compute')
+
+
+class FakePassword(v3.Password):
+    """A v3.Password plugin that does not contact keystone: the token has a
+    catalog with the admin endpoint of keystone as an internal address"""
+
+    body = {'token': {
+        'catalog': [{'type': 'identity', 'endpoints': [
+            {'url': 'http://internal-admin:35357/v3', 'interface': 'admin', 'region': 'Spain2',
+             'region_id': 'Spain2'}]}],
+        'expires_at': '2099-01-01T00:00:00.000000Z', 'methods': ['password'],
+        'user': {'id': 'user_id', 'name': 'user'}}}
+
+    def get_auth_ref(self, session, **kwargs):
+        return access.AccessInfo.factory(body=copy.deepcopy(self.body), auth_token='token')
+
+
+class TestOSClientsSessionEndpoint(TestCase):
+    """Class to test that the overridden endpoints are used by the clients
+    that resolve their URL with the keystone session"""
+
+    tunnel = 'http://tunnel:35357/v3'
+
+    def get_session_endpoint(self, clients):
+        session = clients.get_session()
+        return session.get_endpoint(service_type='identity', interface='admin', region_name='Spain2')
+
+    @patch('fiwareskuld.utils.osclients.v3.Password', FakePassword)
+    def test_override_before_session(self):
+        """test an override registered before creating the session"""
+        clients = OpenStackClients('http://keystone:5000/v3')
+        clients.set_credential('user', 'password', tenant_name='tenant')
+        clients.override_endpoint('identity', 'Spain2', 'admin', self.tunnel)
+        self.assertEquals(self.get_session_endpoint(clients), self.tunnel)
+        self.assertEquals(clients.get_admin_endpoint('identity', 'Spain2'), self.tunnel)
+
+    @patch('fiwareskuld.utils.osclients.v3.Password', FakePassword)
+    def test_override_after_session(self):
+        """test an override registered with the session already created"""
+        clients = OpenStackClients('http://keystone:5000/v3')
+        clients.set_credential('user', 'password', tenant_name='other tenant')
+        self.assertEquals(self.get_session_endpoint(clients), 'http://internal-admin:35357/v3')
+        clients.override_endpoint('identity', 'Spain2', 'admin', self.tunnel)
+        self.assertEquals(self.get_session_endpoint(clients), self.tunnel)
+        self.assertEquals(clients.get_admin_endpoint('identity', 'Spain2'), self.tunnel)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from fiwareskuld.utils.pagination import iterate_pages, iterate_role_assignments
+
+__author__ = 'chema'
+
+
+def make_elements(count):
+    return list(MagicMock(id='id{0:03d}'.format(i)) for i in range(count))
+
+
+class TestPagination(TestCase):
+    def setUp(self):
+        self.elements = make_elements(7)
+
+    def list_function(self, limit=None, marker=None, **filters):
+        """a list function that supports limit and marker"""
+        ids = list(element.id for element in self.elements)
+        start = ids.index(marker) + 1 if marker else 0
+        return self.elements[start:start + limit] if limit else list(self.elements)
+
+    def test_pages(self):
+        """test that all the elements are obtained using pages"""
+        function = MagicMock(side_effect=self.list_function)
+        result = list(iterate_pages(function, 3, domain='default'))
+        self.assertEquals(result, self.elements)
+        self.assertEquals(function.call_count, 3)
+        function.assert_called_with(domain='default', limit=3, marker='id005')
+
+    def test_exact_pages(self):
+        """test a collection with a size multiple of the page size"""
+        self.elements = make_elements(6)
+        function = MagicMock(side_effect=self.list_function)
+        self.assertEquals(list(iterate_pages(function, 3)), self.elements)
+        self.assertEquals(function.call_count, 3)
+
+    def test_limit_ignored(self):
+        """test a server that ignores the limit parameter"""
+        function = MagicMock(return_value=self.elements)
+        self.assertEquals(list(iterate_pages(function, 3)), self.elements)
+        function.assert_called_once_with(limit=3)
+
+    def test_marker_ignored(self):
+        """test a server that ignores the marker parameter"""
+        function = MagicMock(side_effect=lambda limit=None, marker=None: self.list_function(limit))
+        self.assertEquals(list(iterate_pages(function, 3)), self.elements)
+        function.assert_called_with()
+
+    @patch('fiwareskuld.utils.pagination.settings')
+    def test_not_paginated(self, settings):
+        """test that by default the collection is requested at once"""
+        settings.KEYSTONE_PAGE_SIZE = 0
+        function = MagicMock(return_value=self.elements)
+        self.assertEquals(list(iterate_pages(function, name='user')), self.elements)
+        function.assert_called_once_with(name='user')
+
+    def test_role_assignments_by_role(self):
+        """test that the assignments are requested role by role"""
+        keystone = MagicMock()
+        keystone.roles.list.return_value = [MagicMock(id='r1'), MagicMock(id='r2')]
+        keystone.role_assignments.list.side_effect = lambda role=None, **filters: [str(role) + '_a']
+        self.assertEquals(list(iterate_role_assignments(keystone, 100)), ['r1_a', 'r2_a'])
+        self.assertEquals(list(iterate_role_assignments(keystone, 100, role='r3')), ['r3_a'])
+        self.assertEquals(list(iterate_role_assignments(keystone, 0)), ['None_a'])
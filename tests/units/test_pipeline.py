@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+from importlib import import_module
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from fiwareskuld.conf import settings
+from fiwareskuld.utils.pipeline import CheckpointStore, PipelineRunner
+
+# the phase scripts are not a package: they import each other as modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'fiwareskuld', 'phase'))
+phase_pipeline = import_module('phase_pipeline')
+
+__author__ = 'chema'
+
+
+class TestCheckpointStore(TestCase):
+    """class for testing CheckpointStore"""
+
+    def setUp(self):
+        """create a temporal directory for the checkpoint"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'checkpoint.jsonl')
+
+    def tearDown(self):
+        """remove the temporal directory"""
+        shutil.rmtree(self.tmpdir)
+
+    def test_mark_done(self):
+        """check that the completed phases and items are recorded"""
+        checkpoint = CheckpointStore(self.path)
+        checkpoint.mark_done('phase0')
+        checkpoint.mark_done('phase1', 'user1', ['name', 'trust'])
+
+        self.assertTrue(checkpoint.is_done('phase0'))
+        self.assertFalse(checkpoint.is_done('phase0', 'user1'))
+        self.assertTrue(checkpoint.is_done('phase1', 'user1'))
+        self.assertFalse(checkpoint.is_done('phase1'))
+        self.assertEquals(checkpoint.get('phase1'), {'user1': ['name', 'trust']})
+        self.assertEquals(checkpoint.get('phase0'), {})
+
+    def test_load(self):
+        """check that the items are loaded by a new object (i.e. after a
+        restart), ignoring a line truncated by a crash"""
+        checkpoint = CheckpointStore(self.path)
+        checkpoint.mark_done('phase0')
+        checkpoint.mark_done('phase3', 'user1', True)
+        checkpoint.close()
+        with open(self.path, 'a') as f:
+            f.write('{"phase": "phase3", "ite')
+
+        checkpoint = CheckpointStore(self.path)
+        self.assertTrue(checkpoint.is_done('phase0'))
+        self.assertEquals(checkpoint.get('phase3'), {'user1': True})
+
+    def test_remove(self):
+        """check that remove deletes the file and the completed items"""
+        checkpoint = CheckpointStore(self.path)
+        checkpoint.mark_done('phase0')
+        checkpoint.remove()
+
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(checkpoint.is_done('phase0'))
+        self.assertFalse(CheckpointStore(self.path).is_done('phase0'))
+
+
+class TestPipelineRunner(TestCase):
+    """class for testing PipelineRunner"""
+
+    def setUp(self):
+        """create a temporal directory for the checkpoint"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'checkpoint.jsonl')
+
+    def tearDown(self):
+        """remove the temporal directory"""
+        shutil.rmtree(self.tmpdir)
+
+    def test_run_phase(self):
+        """check that a completed phase is not run again, and that a failed
+        phase is not marked"""
+        runner = PipelineRunner(CheckpointStore(self.path))
+        function = MagicMock()
+        self.assertTrue(runner.run_phase('phase0', function))
+        self.assertFalse(runner.run_phase('phase0', function))
+        function.assert_called_once_with()
+
+        failed = MagicMock(side_effect=Exception('error'))
+        self.assertRaises(Exception, runner.run_phase, 'phase1', failed)
+        self.assertFalse(runner.checkpoint.is_done('phase1'))
+
+    def test_run_items_resume(self):
+        """check that a new run, with a new checkpoint object, only processes
+        the items not completed or failed in the previous one"""
+        def interrupted(item):
+            if item == 'u3':
+                raise Exception('interrupted')
+            return item.upper()
+
+        runner = PipelineRunner(CheckpointStore(self.path))
+        result = runner.run_items('phase3', ['u1', 'u2', 'u3'], interrupted, 2)
+        self.assertEquals(result, {'u1': 'U1', 'u2': 'U2'})
+        runner.checkpoint.close()
+
+        function = MagicMock(return_value='ok')
+        runner = PipelineRunner(CheckpointStore(self.path))
+        result = runner.run_items('phase3', ['u1', 'u2', 'u3'], function, 2)
+        function.assert_called_once_with('u3')
+        self.assertEquals(result, {'u1': 'U1', 'u2': 'U2', 'u3': 'ok'})
+        self.assertEquals(runner.incomplete, [])
+
+    def test_run_items_incomplete(self):
+        """check that the items that failed are reported as incomplete"""
+        runner = PipelineRunner(CheckpointStore(self.path))
+        runner.run_items('phase3', ['u1', 'u2'], MagicMock(side_effect=[None, Exception('error')]))
+        self.assertEquals(runner.incomplete, [('phase3', 'u2')])
+
+    def test_run_overlapped(self):
+        """check that the phases are run simultaneously and that an error in
+        a phase does not affect the other"""
+        threads = set()
+
+        def phase():
+            threads.add(threading.current_thread())
+            time.sleep(0.02)
+
+        runner = PipelineRunner(CheckpointStore(self.path))
+        runner.run_overlapped([('phase2b', phase), ('phase2c', phase),
+                               ('phase2d', MagicMock(side_effect=Exception('error')))])
+        self.assertEquals(len(threads), 2)
+        self.assertTrue(runner.checkpoint.is_done('phase2b'))
+        self.assertTrue(runner.checkpoint.is_done('phase2c'))
+        self.assertFalse(runner.checkpoint.is_done('phase2d'))
+        self.assertEquals(runner.incomplete, [('phase2d', None)])
+
+
+class TestSkuldPipeline(TestCase):
+    """class for testing the phases run by phase_pipeline.py, with the
+    objects that contact the servers mocked"""
+
+    def setUp(self):
+        """create a temporal working directory and mock the phase objects"""
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+        self.checkpoint = CheckpointStore('checkpoint.jsonl')
+
+        self.mocks = dict()
+        for name in ('Notifier', 'SpecialPortsRemover', 'UserManager', 'Queries', 'UsersExpired'):
+            patcher = patch.object(phase_pipeline, name)
+            self.mocks[name] = patcher.start()
+            self.addCleanup(patcher.stop)
+        self.change_category = MagicMock()
+        self.change_category.ChangeCategory.return_value.change_user_via_idm.return_value = None
+        patcher = patch.dict(sys.modules, {'phase0c_change_category': self.change_category})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(settings, 'STOP_BEFORE_DELETE', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.mocks['Queries'].return_value.get_imageset_othertenants.return_value = set(['image1'])
+        self.user_manager = self.mocks['UserManager'].return_value
+        self.user_manager.generate_trust_ids.side_effect = lambda users: list(
+            ('name', 'trust_' + user, user) for user in users)
+        self.user_resources = dict()
+        self.user_manager._get_user_resources.side_effect = self.get_user_resources
+        self.pipeline = phase_pipeline.SkuldPipeline(self.checkpoint, ('trial',))
+
+    def tearDown(self):
+        """restore the working directory and remove the temporal one"""
+        self.checkpoint.close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def get_user_resources(self, user):
+        """return a mock of UserResources for each user"""
+        if user not in self.user_resources:
+            user_resources = MagicMock()
+            user_resources.stop_tenant_vms.return_value = 1
+            user_resources.get_resources_dict.side_effect = [{'vms': set(['vm'])}, {'vms': set()}]
+            self.user_resources[user] = user_resources
+        return self.user_resources[user]
+
+    def write_list(self, name, users):
+        """write a list of users like phase0"""
+        with open(name, 'w') as f:
+            for user in users:
+                f.write(user + '\n')
+
+    def changed_users(self):
+        """return the users whose category was changed in phase0c"""
+        change_user = self.change_category.ChangeCategory.return_value.change_user_via_idm
+        return sorted(call[0][0] for call in change_user.call_args_list)
+
+    def test_delete_without_stop(self):
+        """test that without STOP_BEFORE_DELETE the users of the phase3 list
+        change their category and their resources are freed"""
+        self.write_list('trial_users_to_delete_phase3.txt', ['u1,name1', 'u2,name2'])
+        self.pipeline.run_role('trial')
+
+        self.mocks['Notifier'].return_value.notify_trial_users.assert_called_once_with()
+        self.assertEquals(self.changed_users(), ['u1', 'u2'])
+        remover = self.mocks['SpecialPortsRemover'].return_value
+        remover.special_port.delete_special_ports.assert_called_once_with(['u1', 'u2'])
+        for user in ('u1', 'u2'):
+            user_resources = self.user_resources[user]
+            self.assertEquals(user_resources.imagesinuse, set(['image1']))
+            user_resources.delete_tenant_resources.assert_called_once_with()
+            self.assertFalse(user_resources.stop_tenant_vms.called)
+        self.assertEquals(self.checkpoint.get('trial:phase3'), {'u1': True, 'u2': True})
+        self.assertEquals(sorted(call[0][0] for call in self.user_manager.release_trust.call_args_list),
+                          ['u1', 'u2'])
+
+    def test_stop_before_delete(self):
+        """test that with STOP_BEFORE_DELETE the VMs of the newly expired
+        users are stopped and the resources of the phase3 users are freed"""
+        settings.STOP_BEFORE_DELETE = 7
+        self.write_list('trial_users_to_delete.txt', ['u1', 'u2'])
+        self.write_list('trial_users_to_delete_phase3.txt', ['u3,name3'])
+        self.pipeline.run_role('trial')
+
+        self.assertEquals(self.changed_users(), ['u1', 'u2'])
+        for user in ('u1', 'u2'):
+            self.user_resources[user].stop_tenant_vms.assert_called_once_with()
+            self.user_resources[user].unshare_images.assert_called_once_with(detect_images=False)
+            self.assertFalse(self.user_resources[user].delete_tenant_resources.called)
+        self.assertEquals(sorted(self.checkpoint.get('trial:phase2')), ['u1', 'u2'])
+        self.user_resources['u3'].delete_tenant_resources.assert_called_once_with()
+        self.assertFalse(self.user_resources['u3'].stop_tenant_vms.called)
+        # the images in use are detected only once
+        self.assertEquals(self.mocks['Queries'].return_value.get_imageset_othertenants.call_count, 1)
+
+    def test_deletion_always_requested(self):
+        """test that the deletion is requested even if the listing is empty,
+        because some resources (e.g. swift containers) are not listed"""
+        self.write_list('trial_users_to_delete_phase3.txt', ['u1,name1'])
+        self.get_user_resources('u1').get_resources_dict.side_effect = [{}, {}]
+        self.pipeline.run_role('trial')
+
+        self.user_resources['u1'].delete_tenant_resources.assert_called_once_with()
+        self.user_resources['u1'].get_resources_dict.assert_called_with(raise_errors=True)
+        self.assertEquals(self.checkpoint.get('trial:phase3'), {'u1': True})
+
+    def test_failed_listing(self):
+        """test that a user whose resources cannot be listed is not marked as
+        completed"""
+        self.write_list('trial_users_to_delete_phase3.txt', ['u1,name1'])
+        self.get_user_resources('u1').get_resources_dict.side_effect = Exception('error')
+        self.pipeline.run_role('trial')
+
+        self.assertFalse(self.user_resources['u1'].delete_tenant_resources.called)
+        self.assertFalse(self.checkpoint.is_done('trial:phase3', 'u1'))
+        self.assertEquals(self.pipeline.runner.incomplete, [('trial:phase3', 'u1')])
+
+    def test_failed_user_keeps_checkpoint(self):
+        """test that the checkpoint is kept when a user fails (e.g. its trust
+        id cannot be generated), and that the next run only retries it"""
+        self.write_list('trial_users_to_delete_phase3.txt', ['u1,name1', 'u2,name2'])
+        self.user_manager._get_user_resources.side_effect = lambda user: (
+            None if user == 'u2' else self.get_user_resources(user))
+        self.assertFalse(self.pipeline.run())
+        self.assertTrue(os.path.exists('checkpoint.jsonl'))
+        self.assertTrue(self.checkpoint.is_done('trial:phase3', 'u1'))
+        self.assertFalse(self.checkpoint.is_done('trial:phase3', 'u2'))
+
+        self.checkpoint.close()
+        self.user_manager._get_user_resources.side_effect = self.get_user_resources
+        self.user_manager.generate_trust_ids.reset_mock()
+        self.checkpoint = CheckpointStore('checkpoint.jsonl')
+        self.pipeline = phase_pipeline.SkuldPipeline(self.checkpoint, ('trial',))
+        self.assertTrue(self.pipeline.run())
+        self.user_manager.generate_trust_ids.assert_called_once_with(['u2'])
+        self.user_resources['u2'].delete_tenant_resources.assert_called_once_with()
+        self.assertEquals(self.user_resources['u1'].delete_tenant_resources.call_count, 1)
+        self.assertFalse(os.path.exists('checkpoint.jsonl'))
+
+    def test_resume(self):
+        """test that the phases and users already completed are skipped"""
+        self.write_list('trial_users_to_delete_phase3.txt', ['u1,name1', 'u2,name2'])
+        for phase in ('trial:phase0b', 'trial:phase2c'):
+            self.checkpoint.mark_done(phase)
+        self.checkpoint.mark_done('trial:phase0c', 'u1')
+        self.checkpoint.mark_done('trial:phase3', 'u1', True)
+        self.pipeline.run_role('trial')
+
+        self.assertFalse(self.mocks['Notifier'].return_value.notify_trial_users.called)
+        self.assertEquals(self.changed_users(), ['u2'])
+        self.assertFalse(self.mocks['SpecialPortsRemover'].return_value.special_port.delete_special_ports.called)
+        self.user_manager.generate_trust_ids.assert_called_once_with(['u2'])
+        self.assertEquals(self.user_resources.keys(), ['u2'])
+
+    def test_abort_without_images_in_use(self):
+        """test that the resources are not freed if the images in use are
+        unknown"""
+        self.write_list('trial_users_to_delete_phase3.txt', ['u1,name1'])
+        self.mocks['Queries'].return_value.get_imageset_othertenants.side_effect = Exception('error')
+        self.assertRaises(Exception, self.pipeline.run_role, 'trial')
+
+        self.assertTrue(self.checkpoint.is_done('trial:phase2c'))
+        self.assertFalse(self.checkpoint.is_done('phase2b'))
+        self.assertFalse(self.user_manager.generate_trust_ids.called)
+        self.assertEquals(self.checkpoint.get('trial:phase3'), {})
+
+    def test_run_removes_checkpoint(self):
+        """test that the checkpoint is removed when all the phases are
+        completed, and kept if a phase fails"""
+        self.mocks['UsersExpired'].return_value.save_all_lists.side_effect = [Exception('error'), None]
+        self.assertRaises(Exception, self.pipeline.run)
+        self.checkpoint.mark_done('other')
+        self.assertTrue(os.path.exists('checkpoint.jsonl'))
+
+        self.pipeline.run()
+        self.mocks['UsersExpired'].return_value.save_all_lists.assert_called_with(cron_daily=True)
+        self.assertFalse(os.path.exists('checkpoint.jsonl'))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+from unittest import TestCase
+
+from fiwareskuld.utils.records import Record, record_class
+from fiwareskuld.utils.mapstore import get_tenant_id
+
+__author__ = 'chema'
+
+VOLUME = {'id': 'v1', 'size': 10, 'os-vol-tenant-attr:tenant_id': 't1',
+          'metadata': {'key': 'value'}}
+
+
+class TestRecords(TestCase):
+    def setUp(self):
+        """create a record class for volumes"""
+        self.cls = record_class('volumes', ('id', 'size', 'status', 'os-vol-tenant-attr:tenant_id'))
+        self.record = self.cls(VOLUME)
+
+    def test_record_class_reused(self):
+        """test that the class is created only once for the same fields"""
+        self.assertTrue(record_class('volumes', ['id', 'size', 'status', 'os-vol-tenant-attr:tenant_id']) is self.cls)
+        self.assertTrue(issubclass(self.cls, Record))
+        self.assertFalse(hasattr(self.record, '__dict__'))
+
+    def test_access(self):
+        """test the access to the fields as items and as attributes"""
+        self.assertEquals(self.record['id'], 'v1')
+        self.assertEquals(self.record.size, 10)
+        self.assertEquals(self.record['os-vol-tenant-attr:tenant_id'], 't1')
+        self.assertEquals(self.record.os_vol_tenant_attr_tenant_id, 't1')
+        self.assertEquals(get_tenant_id(self.record), 't1')
+
+    def test_missing_fields(self):
+        """test that the fields not kept or not present are missing"""
+        self.assertFalse('metadata' in self.record)
+        self.assertFalse('status' in self.record)
+        self.assertEquals(self.record.get('status', 'none'), 'none')
+        with self.assertRaises(KeyError):
+            self.record['status']
+        with self.assertRaises(KeyError):
+            self.record['metadata']
+        with self.assertRaises(AttributeError):
+            self.record.status
+        self.assertEquals(sorted(self.record.keys()), ['id', 'os-vol-tenant-attr:tenant_id', 'size'])
+
+    def test_set_item(self):
+        """test setting fields"""
+        self.record['status'] = 'available'
+        self.assertEquals(self.record.status, 'available')
+        expected = {'id': 'v1', 'size': 10, 'status': 'available', 'os-vol-tenant-attr:tenant_id': 't1'}
+        self.assertEquals(self.record.to_dict(), expected)
+        with self.assertRaises(KeyError):
+            self.record['metadata'] = dict()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+import unittest
+from mock import MagicMock
+
+from fiwareskuld.tenant_inventory import TenantInventory, NeutronTenantIndex
+
+__author__ = 'chema'
+
+
+class TestTenantInventory(unittest.TestCase):
+    """class for testing TenantInventory"""
+
+    def setUp(self):
+        """create a mock of UserResources with all the services"""
+        self.user_resources = MagicMock()
+        neutron = self.user_resources.neutron.neutron
+        neutron.list_ports.return_value = {'ports': [{'id': 'port1'}]}
+        nova = self.user_resources.nova.novaclient
+        nova.servers.list.return_value = ['vm1', 'vm2']
+
+    def test_load(self):
+        """check that each collection is listed only once"""
+        inventory = TenantInventory(self.user_resources, 4).load()
+        self.assertEquals(inventory.get('ports'), [{'id': 'port1'}])
+        self.assertEquals(inventory.get('servers'), ['vm1', 'vm2'])
+        nova = self.user_resources.nova.novaclient
+        nova.servers.list.assert_called_once_with()
+        nova.keypairs.list.assert_called_once_with()
+        self.user_resources.neutron.neutron.list_ports.assert_called_once_with()
+        self.user_resources.swift.get_tenant_objects.assert_called_once_with()
+        self.assertEquals(len(inventory.collections), 16)
+
+    def test_load_without_services(self):
+        """check that the collections of the services not available in the
+        region are not listed"""
+        self.user_resources.neutron = None
+        self.user_resources.cinder = None
+        self.user_resources.blueprints = None
+        self.user_resources.swift = None
+        inventory = TenantInventory(self.user_resources, 4).load()
+        self.assertEquals(
+            sorted(inventory.collections.keys()),
+            ['images', 'keypairs', 'security_groups', 'servers'])
+        self.assertIsNone(inventory.get('ports'))
+
+    def test_load_failed_collection(self):
+        """check that a collection that can not be obtained is None, without
+        affecting the others"""
+        nova = self.user_resources.nova.novaclient
+        nova.keypairs.list.side_effect = Exception('failed')
+        inventory = TenantInventory(self.user_resources, 4).load()
+        self.assertIsNone(inventory.get('keypairs'))
+        self.assertEquals(inventory.get('servers'), ['vm1', 'vm2'])
+
+    def test_load_preloaded(self):
+        """check that the preloaded collections are not listed"""
+        preloaded = {'ports': [], 'networks': [{'id': 'net1'}]}
+        inventory = TenantInventory(self.user_resources, 4, preloaded)
+        inventory.load()
+        self.assertEquals(inventory.get('ports'), [])
+        self.assertEquals(inventory.get('networks'), [{'id': 'net1'}])
+        neutron = self.user_resources.neutron.neutron
+        self.assertFalse(neutron.list_ports.called)
+        self.assertFalse(neutron.list_networks.called)
+        neutron.list_routers.assert_called_once_with()
+
+
+class TestNeutronTenantIndex(unittest.TestCase):
+    """class for testing NeutronTenantIndex"""
+
+    def setUp(self):
+        """create a mock of OpenStackMap with neutron resources of two
+        tenants"""
+        self.osmap = MagicMock()
+        self.osmap.ports = {
+            'p1': {'id': 'p1', 'tenant_id': 't1'},
+            'p2': {'id': 'p2', 'tenant_id': 't2'},
+            'p3': {'id': 'p3', 'tenant_id': 't1'}}
+        self.osmap.security_groups = {
+            's1': {'id': 's1', 'tenant_id': 't2'}}
+        for attribute in ('floatingips', 'networks', 'routers', 'subnets'):
+            setattr(self.osmap, attribute, dict())
+
+    def test_load(self):
+        """check that the map is loaded and indexed by tenant"""
+        index = NeutronTenantIndex(self.osmap).load()
+        self.osmap.load_neutron.assert_called_once_with()
+        collections = index.get_tenant_collections('t1')
+        self.assertEquals(sorted(p['id'] for p in collections['ports']),
+                          ['p1', 'p3'])
+        self.assertEquals(collections['nsecuritygroups'], [])
+        self.assertEquals(len(collections), 6)
+        collections = index.get_tenant_collections('t2')
+        self.assertEquals(collections['nsecuritygroups'],
+                          [{'id': 's1', 'tenant_id': 't2'}])
+
+    def test_tenant_without_resources(self):
+        """check that a tenant without resources gets empty collections"""
+        index = NeutronTenantIndex(self.osmap).load()
+        collections = index.get_tenant_collections('t3')
+        self.assertEquals(collections['ports'], [])
+        self.assertEquals(len(collections), 6)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+import unittest
+from mock import MagicMock, patch
+
+from fiwareskuld.user_resources import UserResources
+
+__author__ = 'chema'
+
+
+class TestUserResources(unittest.TestCase):
+    """class for testing the lazy creation of the wrappers of UserResources"""
+
+    def setUp(self):
+        """create the object with mocks of the clients and the wrappers"""
+        patcher = patch('fiwareskuld.user_resources.OpenStackClients')
+        self.clients = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.clients.region = 'Spain2'
+        self.clients.set_region.side_effect = lambda region: setattr(self.clients, 'region', region)
+        self.classes = dict((name, MagicMock()) for name in UserResources.wrapper_classes)
+        self.classes['swift'].side_effect = Exception('no swift endpoint')
+        patcher = patch.dict(UserResources.wrapper_classes, self.classes)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user_resources = UserResources('user', 'password', trust_id='trust')
+
+    def test_no_wrappers_at_construction(self):
+        """test that the constructor does not create any wrapper"""
+        for wrapper_class in self.classes.values():
+            self.assertFalse(wrapper_class.called)
+
+    def test_wrapper_created_once_by_region(self):
+        """test that a wrapper is created on first use in each region"""
+        nova = self.user_resources.nova
+        self.assertTrue(self.user_resources.nova is nova)
+        self.user_resources.change_region('Lannion2')
+        self.user_resources.stop_tenant_vms()
+        self.user_resources.change_region('Spain2')
+        self.assertTrue(self.user_resources.nova is nova)
+        self.assertEqual(self.classes['nova'].call_count, 2)
+        self.assertFalse(self.classes['glance'].called)
+
+    def test_optional_wrapper(self):
+        """test that an optional wrapper is None when it cannot be created,
+        and that a wrapper may be replaced"""
+        self.assertIsNone(self.user_resources.swift)
+        self.assertIsNone(self.user_resources.swift)
+        self.assertEqual(self.classes['swift'].call_count, 1)
+        self.user_resources.neutron = None
+        self.assertIsNone(self.user_resources.neutron)
+        self.assertFalse(self.classes['neutron'].called)
+
+    def test_mandatory_wrapper_error(self):
+        """test that the errors creating the mandatory wrappers are raised"""
+        self.classes['nova'].side_effect = Exception('no nova endpoint')
+        self.assertRaises(Exception, getattr, self.user_resources, 'nova')
+
+    def test_servers_listed_again_after_blueprints(self):
+        """test that the VMs are listed again after deleting the blueprint
+        instances, because they delete their own VMs"""
+        self.user_resources.inventory = MagicMock()
+        self.user_resources.wait_until_deleted = MagicMock()
+        self.user_resources.delete_tenant_resources_pri_2()
+        self.user_resources.nova.delete_tenant_vms.assert_called_once_with(None)
+
+        self.user_resources.blueprints = None
+        self.user_resources.nova.delete_tenant_vms.reset_mock()
+        self.user_resources.delete_tenant_resources_pri_2()
+        self.user_resources.nova.delete_tenant_vms.assert_called_once_with(
+            self.user_resources.inventory.get.return_value)
+
+    def test_resources_dict_objects_not_listed(self):
+        """test that the objects are listed again when they are not in the
+        inventory (e.g. the listing failed)"""
+        self.classes['swift'].side_effect = None
+        self.user_resources.load_inventory = MagicMock()
+        self.user_resources.inventory = MagicMock()
+        self.user_resources.inventory.get.side_effect = lambda name: None if name == 'objects' else []
+        self.user_resources.swift.get_tenant_objects.return_value = ['o1']
+        resources = self.user_resources.get_resources_dict()
+        self.assertEqual(resources['objects'], set(['o1']))
+
+    def test_resources_dict_errors(self):
+        """test that an error listing the resources is raised only with
+        raise_errors"""
+        self.user_resources.load_inventory = MagicMock(side_effect=Exception('error'))
+        self.assertEqual(self.user_resources.get_resources_dict(), {})
+        self.assertRaises(Exception, self.user_resources.get_resources_dict, raise_errors=True)
+
+    def test_for_region(self):
+        """test that the copy of other region has its own clients and
+        wrappers"""
+        self.clients.for_region.side_effect = lambda region: MagicMock(region=region)
+        nova = self.user_resources.nova
+        lannion = self.user_resources.for_region('Lannion2')
+        self.assertEqual(lannion.clients.region, 'Lannion2')
+        lannion.nova
+        self.classes['nova'].assert_called_with(lannion.clients)
+        self.assertTrue(self.user_resources.nova is nova)
+        self.assertEqual(self.clients.region, 'Spain2')
+
+    def test_map_regions(self):
+        """test that the results of the regions are merged, and that an error
+        in a region does not affect the others"""
+        self.clients.for_region.side_effect = lambda region: MagicMock(region=region)
+
+        def function(user_resources):
+            if user_resources.clients.region == 'Trento':
+                raise Exception('region down')
+            return user_resources.clients.region.lower()
+
+        result = self.user_resources.map_regions(function, ['Spain2', 'Lannion2', 'Trento'], max_workers=3)
+        self.assertEqual(result, {'Spain2': 'spain2', 'Lannion2': 'lannion2', 'Trento': None})
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+import unittest
+from mock import MagicMock, patch
+
+from fiwareskuld.utils.wait import wait_until
+
+__author__ = 'chema'
+
+
+@patch('fiwareskuld.utils.wait.time')
+class TestWaitUntil(unittest.TestCase):
+    """class for testing the function wait_until"""
+
+    def test_condition_already_met(self, mock_time):
+        """check that there is no pause when the condition is already met"""
+        mock_time.time.return_value = 0
+        condition = MagicMock(return_value=True)
+        self.assertTrue(wait_until(condition, 120))
+        condition.assert_called_once_with()
+        self.assertFalse(mock_time.sleep.called)
+
+    def test_backoff_limited_by_max_delay(self, mock_time):
+        """check that pauses grow exponentially up to max_delay"""
+        mock_time.time.return_value = 0
+        condition = MagicMock(side_effect=[False] * 5 + [True])
+        self.assertTrue(wait_until(condition, 120, max_delay=5))
+        pauses = [c[0][0] for c in mock_time.sleep.call_args_list]
+        self.assertEquals(pauses, [1, 2, 4, 5, 5])
+
+    def test_deadline(self, mock_time):
+        """check that False is returned when the deadline expires"""
+        mock_time.time.side_effect = [0, 1, 3, 6]
+        condition = MagicMock(return_value=False)
+        self.assertFalse(wait_until(condition, 5))
+        pauses = [c[0][0] for c in mock_time.sleep.call_args_list]
+        self.assertEquals(pauses, [1, 2])
+
+    @patch('fiwareskuld.utils.wait.random')
+    def test_jitter(self, mock_random, mock_time):
+        """check that the jitter modifies each pause proportionally"""
+        mock_time.time.return_value = 0
+        mock_random.uniform.return_value = 0.5
+        condition = MagicMock(side_effect=[False, False, True])
+        self.assertTrue(wait_until(condition, 120, jitter=0.5))
+        mock_random.uniform.assert_called_with(-0.5, 0.5)
+        pauses = [c[0][0] for c in mock_time.sleep.call_args_list]
+        self.assertEquals(pauses, [1.5, 3.0])
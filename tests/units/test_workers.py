@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -- encoding: utf-8 --
+#
+# Copyright 2015 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FI-Core project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+#
+import threading
+import time
+from unittest import TestCase
+
+from fiwareskuld.utils.workers import run_concurrently
+
+__author__ = 'chema'
+
+
+class TestRunConcurrently(TestCase):
+    """class for testing the function run_concurrently"""
+
+    def test_results_in_order(self):
+        """check that results are returned in the order of the items, even
+        when the items complete in a different order"""
+        def function(item):
+            time.sleep(0.01 * (5 - item))
+            return item * 2
+
+        results = run_concurrently(function, range(5), max_workers=5)
+        self.assertEquals(results, [0, 2, 4, 6, 8])
+
+    def test_sequential(self):
+        """check that with max_workers=1 all the items are processed in the
+        calling thread, in order"""
+        threads = set()
+        processed = list()
+
+        def function(item):
+            threads.add(threading.current_thread())
+            processed.append(item)
+
+        run_concurrently(function, range(4), max_workers=1)
+        self.assertEquals(threads, set([threading.current_thread()]))
+        self.assertEquals(processed, range(4))
+
+    def test_max_workers(self):
+        """check that the number of simultaneous invocations is bounded"""
+        lock = threading.Lock()
+        state = {'running': 0, 'max': 0}
+
+        def function(item):
+            with lock:
+                state['running'] += 1
+                state['max'] = max(state['max'], state['running'])
+            time.sleep(0.02)
+            with lock:
+                state['running'] -= 1
+
+        run_concurrently(function, range(10), max_workers=3)
+        self.assertTrue(1 < state['max'] <= 3)
+
+    def test_exception_isolated(self):
+        """check that an exception only affects its own item"""
+        def function(item):
+            if item == 1:
+                raise Exception('error')
+            return item
+
+        results = run_concurrently(function, range(3), max_workers=2)
+        self.assertEquals(results, [0, None, 2])